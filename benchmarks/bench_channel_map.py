@@ -0,0 +1,66 @@
+"""Compare the columnar channel map loader with a naive row-by-row parse.
+
+Usage: python benchmarks/bench_channel_map.py [n_channels] [n_layers]
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from probe_library.channel_map import load_channel_map  # noqa: E402
+
+
+def write_synthetic_map(path, n_channels, n_layers, seed=0):
+    rng = np.random.default_rng(seed)
+    index = np.arange(n_channels)
+    geometry = np.stack(
+        [
+            np.tile([-14, 18, -30, 2], n_channels // 4 + 1)[:n_channels],
+            200 + 20 * (index // 2),
+            np.zeros(n_channels),
+            np.full(n_channels, 12),
+            np.full(n_channels, 12),
+            np.full(n_channels, 24),
+        ],
+        axis=1,
+    )
+    layers = rng.integers(0, 2, size=(n_channels, n_layers))
+    header = ["index", "x", "y", "z", "w", "h", "d"] + [f"layer{i}" for i in range(n_layers)]
+    with open(path, "w") as f:
+        f.write(",".join(header) + "\n")
+        np.savetxt(f, np.column_stack([index, geometry, layers]).astype(int), fmt="%d", delimiter=",")
+
+
+def load_row_by_row(path):
+    sites = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            sites.append({key: float(value) for key, value in row.items()})
+    return sites
+
+
+def main():
+    n_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    n_layers = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "channel_map.csv")
+        write_synthetic_map(path, n_channels, n_layers)
+
+        repeats = 5
+        naive = min(timeit.repeat(lambda: load_row_by_row(path), number=1, repeat=repeats))
+        columnar = min(timeit.repeat(lambda: load_channel_map(path), number=1, repeat=repeats))
+
+    print(f"{n_channels} channels x {n_layers} layers")
+    print(f"  row by row : {naive * 1e3:8.2f} ms")
+    print(f"  columnar   : {columnar * 1e3:8.2f} ms  ({naive / columnar:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compare the streaming OBJ parser with a line-by-line parser.
+
+Usage: python benchmarks/bench_obj.py [path/to/model.obj]
+
+Pass the largest holder model in the library (e.g. a probe folder's
+``sensapex_holder.obj``). Without an argument a synthetic tube mesh with
+about a million triangles is generated.
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from probe_library.obj import load_obj  # noqa: E402
+
+
+def write_synthetic_obj(path, rings=2000, segments=256):
+    theta = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    z = np.linspace(0, 50, rings)
+    vertices = np.stack(
+        [np.tile(np.cos(theta), rings), np.tile(np.sin(theta), rings), np.repeat(z, segments)], axis=1
+    )
+    normals = np.stack([np.cos(theta), np.sin(theta), np.zeros(segments)], axis=1)
+    ring = np.arange(rings - 1)[:, None] * segments
+    seg = np.arange(segments)[None, :]
+    a = (ring + seg).ravel()
+    b = (ring + (seg + 1) % segments).ravel()
+    quads = np.stack([a, b, b + segments, a + segments], axis=1) + 1
+    quad_normals = np.stack([a % segments, b % segments, b % segments, a % segments], axis=1) + 1
+    with open(path, "w") as f:
+        np.savetxt(f, vertices, fmt="v %.6f %.6f %.6f")
+        np.savetxt(f, normals, fmt="vn %.6f %.6f %.6f")
+        np.savetxt(
+            f,
+            np.stack([quads, quad_normals], axis=2).reshape(len(quads), 8),
+            fmt="f %d//%d %d//%d %d//%d %d//%d",
+        )
+
+
+def load_obj_line_by_line(path):
+    vertices, normals, faces = [], [], []
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "v":
+                vertices.append([float(p) for p in parts[1:4]])
+            elif parts[0] == "vn":
+                normals.append([float(p) for p in parts[1:4]])
+            elif parts[0] == "f":
+                polygon = []
+                for corner in parts[1:]:
+                    i = int(corner.split("/")[0])
+                    polygon.append(i - 1 if i > 0 else len(vertices) + i)
+                for j in range(1, len(polygon) - 1):
+                    faces.append([polygon[0], polygon[j], polygon[j + 1]])
+    return (
+        np.array(vertices, dtype=np.float32),
+        np.array(normals, dtype=np.float32),
+        np.array(faces, dtype=np.uint32),
+    )
+
+
+def run(path):
+    size = os.path.getsize(path) / 1e6
+    repeats = 3
+    naive = min(timeit.repeat(lambda: load_obj_line_by_line(path), number=1, repeat=repeats))
+    streaming = min(timeit.repeat(lambda: load_obj(path), number=1, repeat=repeats))
+    mesh = load_obj(path)
+    print(f"{os.path.basename(path)}: {size:.1f} MB, {mesh}")
+    print(f"  line by line : {naive * 1e3:8.1f} ms")
+    print(f"  streaming    : {streaming * 1e3:8.1f} ms  ({naive / streaming:.1f}x)")
+
+
+def main():
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic_holder.obj")
+        write_synthetic_obj(path)
+        run(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Tools for reading and using the probe library described in the README."""
+
+from .anatomical_data import ProbeAnatomy, decode, encode
+from .anatomical_delta import DeltaDecoder, DeltaEncoder
+from .atlas import AtlasLookup
+from .atlas_transform import AffineTransform, get_transform
+from .channel_map import ChannelMap, load_channel_map, save_channel_map
+from .channel_map_cache import load_cached_channel_map
+from .channel_neighbors import SiteNeighbors
+from .channel_selection import Selection, load_selection, site_scores, solve_selection, write_selection_layer
+from .collision import CollisionScene, MeshBVH
+from .deformation import DeformationField, write_deformation_field
+from .insertion_index import InsertionIndex
+from .insertion_table import InsertionTable, load_table, save_table
+from .lattice import SiteLattice
+from .layer_query import SiteSelector, compile_query
+from .library import Probe, ProbeEntry, ProbeLibrary
+from .mesh_cache import CompiledMesh, MeshCache
+from .obj import Mesh, load_obj
+from .scene import Scene
+from .schema import (
+    Insertion,
+    ProbeMetadata,
+    SchemaError,
+    SelectionConstraints,
+    load_insertions,
+    parse_insertions,
+    parse_metadata,
+    parse_selection,
+    parse_transform,
+)
+from .snapshot import SceneSnapshot, load_snapshot, save_snapshot
+from .surface import BrainSurface
+from .transforms import channel_positions, insertion_matrices
+
+__all__ = [
+    "AffineTransform",
+    "AtlasLookup",
+    "BrainSurface",
+    "ChannelMap",
+    "CollisionScene",
+    "CompiledMesh",
+    "DeformationField",
+    "DeltaDecoder",
+    "DeltaEncoder",
+    "Insertion",
+    "InsertionIndex",
+    "InsertionTable",
+    "Mesh",
+    "MeshBVH",
+    "MeshCache",
+    "Probe",
+    "ProbeAnatomy",
+    "ProbeEntry",
+    "ProbeLibrary",
+    "ProbeMetadata",
+    "Scene",
+    "SceneSnapshot",
+    "SchemaError",
+    "Selection",
+    "SelectionConstraints",
+    "SiteLattice",
+    "SiteNeighbors",
+    "SiteSelector",
+    "channel_positions",
+    "compile_query",
+    "decode",
+    "encode",
+    "get_transform",
+    "insertion_matrices",
+    "load_cached_channel_map",
+    "load_insertions",
+    "load_channel_map",
+    "load_obj",
+    "load_selection",
+    "load_snapshot",
+    "load_table",
+    "parse_insertions",
+    "parse_metadata",
+    "parse_selection",
+    "parse_transform",
+    "save_channel_map",
+    "save_snapshot",
+    "save_table",
+    "site_scores",
+    "solve_selection",
+    "write_deformation_field",
+    "write_selection_layer",
+]
@@ -0,0 +1,163 @@
+"""Minimal container format for named, memory-mapped NumPy arrays.
+
+Layout (little endian)::
+
+    magic       8 bytes
+    version     uint32
+    n_entries   uint32
+    entries     n_entries x ENTRY (name, dtype, ndim, shape[4], offset)
+    data        each array starts on a 64-byte boundary
+
+The header is fixed-width binary, so opening a file only unpacks a few
+structs; the arrays themselves are views into a single read-only memmap.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+from contextlib import contextmanager
+from typing import Iterator, Mapping
+
+import numpy as np
+
+_PREAMBLE = struct.Struct("<8sII")
+_ENTRY = struct.Struct("<32s8sI4QQ")
+_ALIGN = 64
+_MAX_NDIM = 4
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def _little_endian(dtype: np.dtype) -> np.dtype:
+    return dtype.newbyteorder("<") if dtype.byteorder == ">" else dtype
+
+
+def _layout(
+    magic: bytes, version: int, specs: Mapping[str, tuple[tuple[int, ...], np.dtype]]
+) -> tuple[bytes, dict[str, int], int]:
+    """Return the header bytes, array offsets and total file size."""
+    offset = _align(_PREAMBLE.size + _ENTRY.size * len(specs))
+    header = [_PREAMBLE.pack(magic, version, len(specs))]
+    offsets = {}
+    for name, (shape, dtype) in specs.items():
+        if len(shape) > _MAX_NDIM:
+            raise ValueError(f"array {name!r} has more than {_MAX_NDIM} dimensions")
+        padded = tuple(shape) + (0,) * (_MAX_NDIM - len(shape))
+        header.append(_ENTRY.pack(name.encode(), dtype.str.encode(), len(shape), *padded, offset))
+        offsets[name] = offset
+        offset = _align(offset + dtype.itemsize * int(np.prod(shape, dtype=np.int64)))
+    return b"".join(header), offsets, offset
+
+
+def write_arrays(
+    path: str | os.PathLike,
+    magic: bytes,
+    version: int,
+    arrays: Mapping[str, np.ndarray],
+) -> None:
+    """Atomically write ``arrays`` to ``path``."""
+    arrays = {
+        name: np.ascontiguousarray(array, dtype=_little_endian(np.asarray(array).dtype))
+        for name, array in arrays.items()
+    }
+    header, offsets, size = _layout(
+        magic, version, {name: (array.shape, array.dtype) for name, array in arrays.items()}
+    )
+    tmp = f"{os.fspath(path)}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(offsets[name])
+            f.write(array.tobytes())
+        f.truncate(size)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def create_arrays(
+    path: str | os.PathLike,
+    magic: bytes,
+    version: int,
+    specs: Mapping[str, tuple[tuple[int, ...], np.dtype]],
+) -> Iterator[dict[str, np.ndarray]]:
+    """Create zero-filled arrays for ``path`` and yield them memory-mapped read-write.
+
+    Used to write arrays too large to hold in memory. The file is built at
+    a temporary path, sparse until the arrays are filled in, and replaces
+    ``path`` only when the ``with`` block completes, so an interrupted
+    write never leaves a partial file at ``path``.
+    """
+    specs = {name: (tuple(shape), _little_endian(np.dtype(dtype))) for name, (shape, dtype) in specs.items()}
+    header, _, size = _layout(magic, version, specs)
+    tmp = f"{os.fspath(path)}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.truncate(size)
+        arrays = read_arrays(tmp, magic, version, mode="r+")[0]
+        yield arrays
+        for array in arrays.values():
+            array.flush()
+        del arrays
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def read_arrays(
+    path: str | os.PathLike,
+    magic: bytes,
+    version: int,
+    mode: str = "r",
+) -> tuple[dict[str, np.ndarray], dict[str, int]]:
+    """Memory-map the arrays in ``path``.
+
+    Returns the arrays keyed by name and their byte offsets in the file.
+    Raises ``ValueError`` if the magic or version do not match or the file
+    is truncated.
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode=mode)
+    if buffer.shape[0] < _PREAMBLE.size:
+        raise ValueError(f"{os.fspath(path)}: truncated header")
+    file_magic, file_version, n_entries = _PREAMBLE.unpack_from(buffer, 0)
+    if file_magic != magic or file_version != version:
+        raise ValueError(f"{os.fspath(path)}: unsupported format {file_magic!r} v{file_version}")
+
+    if buffer.shape[0] < _PREAMBLE.size + n_entries * _ENTRY.size:
+        raise ValueError(f"{os.fspath(path)}: truncated array table")
+
+    arrays = {}
+    offsets = {}
+    for i in range(n_entries):
+        name, dtype, ndim, *shape, offset = _ENTRY.unpack_from(
+            buffer, _PREAMBLE.size + i * _ENTRY.size
+        )
+        try:
+            name = name.rstrip(b"\0").decode()
+            dtype = np.dtype(dtype.rstrip(b"\0").decode())
+        except (UnicodeDecodeError, TypeError):
+            raise ValueError(f"{os.fspath(path)}: corrupt array table entry {i}") from None
+        shape = tuple(shape[:ndim])
+        nbytes = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        if offset + nbytes > buffer.shape[0]:
+            raise ValueError(f"{os.fspath(path)}: array {name!r} extends past end of file")
+        arrays[name] = buffer[offset : offset + nbytes].view(dtype).reshape(shape)
+        offsets[name] = offset
+    return arrays, offsets
+
+
+def encode_strings(strings) -> np.ndarray:
+    """Pack strings into a NUL-separated uint8 array."""
+    return np.frombuffer("\0".join(strings).encode(), dtype=np.uint8)
+
+
+def decode_strings(blob: np.ndarray, count: int) -> list[str]:
+    """Inverse of :func:`encode_strings`."""
+    if count == 0:
+        return []
+    return blob.tobytes().decode().split("\0")
@@ -0,0 +1,196 @@
+"""Codec for the anatomical data message format (README "Anatomical data API").
+
+A probe message is ``"probe-name;channel-data"``. In the uncompressed form
+every channel is listed as ``index,acronym,hex-color``; in the compressed
+form runs of channels with the same acronym and color are written as
+``indexFirst-indexLast,acronym,hex-color``. Several probes are sent as
+``[probe-string-0,probe-string-1,...]``.
+
+Encoding works on integer label arrays: runs are found for all probes at
+once with array comparisons, and the acronym/color tables are only
+consulted once per run.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+UNLABELED = -1
+
+
+@dataclass
+class ProbeAnatomy:
+    """Per-channel anatomical labels of one probe.
+
+    ``labels`` indexes ``acronyms`` and ``colors``; channels absent from a
+    message are :data:`UNLABELED`.
+    """
+
+    name: str
+    labels: np.ndarray
+    acronyms: np.ndarray
+    colors: np.ndarray
+
+    def channel_acronyms(self, missing: str = "-") -> np.ndarray:
+        return np.where(self.labels >= 0, self.acronyms[self.labels], missing)
+
+    def channel_colors(self, missing: str = "000000") -> np.ndarray:
+        return np.where(self.labels >= 0, self.colors[self.labels], missing)
+
+
+def factorize(acronyms: np.ndarray, colors: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Turn per-channel acronym/color arrays into labels plus lookup tables."""
+    acronyms = np.asarray(acronyms, dtype=str)
+    colors = np.asarray(colors, dtype=str)
+    keys = np.char.add(np.char.add(acronyms, ","), colors)
+    table, labels = np.unique(keys, return_inverse=True)
+    pairs = np.char.partition(table, ",")
+    return labels.reshape(acronyms.shape), pairs[:, 0], pairs[:, 2]
+
+
+def _runs(labels: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (probe, first, last) for every run in a (P, n) label array."""
+    n = labels.shape[1]
+    if labels.size == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    change = np.ones(labels.shape, dtype=bool)
+    change[:, 1:] = labels[:, 1:] != labels[:, :-1]
+    flat = np.flatnonzero(change)
+    probe, first = np.divmod(flat, n)
+    last = np.empty_like(first)
+    last[:-1] = first[1:] - 1
+    last[-1:] = n - 1
+    # A run that ends a row is cut at the row end, not the next row's start.
+    row_end = np.r_[probe[1:] != probe[:-1], True]
+    last[row_end] = n - 1
+    return probe, first, last
+
+
+def encode_labels(
+    names: Sequence[str],
+    labels: np.ndarray,
+    acronyms: Sequence[str],
+    colors: Sequence[str],
+    compressed: bool = True,
+) -> list[str]:
+    """Encode a (P, n) array of table labels into one message per probe."""
+    labels = np.atleast_2d(np.asarray(labels))
+    if labels.shape[0] != len(names):
+        raise ValueError(f"got {len(names)} names for {labels.shape[0]} probes")
+    if labels.shape[1] == 0:
+        return [f"{name};" for name in names]
+    if compressed:
+        probe, first, last = _runs(labels)
+    else:
+        probe, first = np.divmod(np.arange(labels.size), labels.shape[1])
+        last = first
+    run_labels = labels[probe, first]
+
+    entries = [[] for _ in names]
+    for p, a, b, label in zip(probe.tolist(), first.tolist(), last.tolist(), run_labels.tolist()):
+        span = f"{a}-{b}" if compressed else str(a)
+        entries[p].append(f"{span},{acronyms[label]},{colors[label]}")
+    return [f"{name};" + ";".join(channel_data) for name, channel_data in zip(names, entries)]
+
+
+def encode_probe(name: str, acronyms: np.ndarray, colors: np.ndarray, compressed: bool = True) -> str:
+    """Encode one probe from per-channel acronym and color arrays."""
+    labels, acronym_table, color_table = factorize(acronyms, colors)
+    return encode_labels([name], labels[None], acronym_table, color_table, compressed)[0]
+
+
+def join_probes(messages: Sequence[str]) -> str:
+    """Combine probe messages into the ``[probe-string-0,...]`` array form."""
+    return "[" + ",".join(messages) + "]"
+
+
+def encode(
+    names: Sequence[str],
+    labels: np.ndarray,
+    acronyms: Sequence[str],
+    colors: Sequence[str],
+    compressed: bool = True,
+) -> str:
+    """Encode several probes into one multi-probe message."""
+    return join_probes(encode_labels(names, labels, acronyms, colors, compressed))
+
+
+def split_probes(message: str) -> list[str]:
+    """Split a single- or multi-probe message into probe messages.
+
+    Accepts the README array form, where probe strings are separated by the
+    comma that follows the last channel entry, as well as a JSON array of
+    strings. A probe without channel data ends in ``;``, so in the array
+    form the next probe starts right after a ``;,``.
+    """
+    message = message.strip()
+    if not message.startswith("["):
+        return [message] if message else []
+    body = message[1:-1].strip() if message.endswith("]") else message[1:].strip()
+    if body.startswith('"'):
+        return json.loads(message)
+    if not body:
+        return []
+
+    probes = []
+    current: list[str] = []
+    for segment in body.split(";"):
+        if current and segment.startswith(","):
+            # The previous probe has no channel data.
+            probes.append(";".join(current) + ";")
+            current = [segment[1:]]
+            continue
+        if current:
+            # A channel entry has three fields; a fourth starts the next probe.
+            fields = segment.split(",", 3)
+            if len(fields) == 4:
+                current.append(",".join(fields[:3]))
+                probes.append(";".join(current))
+                current = [fields[3]]
+                continue
+        current.append(segment)
+    probes.append(";".join(current))
+    return probes
+
+
+def _expand_spans(spans: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Expand (first, last) rows into channel indices; also return run lengths."""
+    lengths = spans[:, 1] - spans[:, 0] + 1
+    if np.any(lengths < 1):
+        raise ValueError("empty channel range in anatomical data message")
+    channel = np.repeat(spans[:, 0], lengths) + (
+        np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    )
+    return channel, lengths
+
+
+def decode_probe(message: str) -> ProbeAnatomy:
+    """Parse one compressed or uncompressed probe message."""
+    name, _, channel_data = message.partition(";")
+    entries = [entry.split(",") for entry in channel_data.split(";") if entry]
+    if any(len(entry) != 3 for entry in entries):
+        raise ValueError(f"malformed channel entry in message for {name!r}")
+
+    spans = np.array(
+        [entry[0].split("-", 1) if "-" in entry[0] else (entry[0], entry[0]) for entry in entries],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    keys = np.array([f"{entry[1]},{entry[2]}" for entry in entries], dtype=str)
+    table, entry_labels = np.unique(keys, return_inverse=True)
+    pairs = np.char.partition(table, ",") if table.size else np.empty((0, 3), dtype=str)
+
+    n = int(spans[:, 1].max()) + 1 if len(spans) else 0
+    labels = np.full(n, UNLABELED, dtype=np.int32)
+    channel, lengths = _expand_spans(spans)
+    labels[channel] = np.repeat(entry_labels, lengths)
+    return ProbeAnatomy(name, labels, pairs[:, 0], pairs[:, 2])
+
+
+def decode(message: str) -> list[ProbeAnatomy]:
+    """Parse a single- or multi-probe message."""
+    return [decode_probe(probe) for probe in split_probes(message)]
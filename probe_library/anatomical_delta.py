@@ -0,0 +1,205 @@
+"""Incremental (delta) anatomical data messages.
+
+Delta messages extend the compressed anatomical data format with a
+per-probe sequence number so that only channels whose label changed are
+sent::
+
+    "~ProbeA@7;0-27,ACAv,40A666;28-959,-,000000"    full state, sequence 7
+    "~ProbeA@8<7;412-415,ACAd,40A666"               changes since state 7
+
+A delta is always relative to the last state the receiver acknowledged.
+The :class:`DeltaEncoder` falls back to a full message when it has no
+acknowledged state, when too many deltas are unacknowledged, or when the
+delta would be longer than the full message. The :class:`DeltaDecoder`
+keeps a short history of states so it can apply any delta whose base it
+still has; otherwise it records the probe in ``resync_requests``. Several
+probes are combined with the usual ``[...]`` array form, and plain
+(non-delta) messages are accepted as full states without a sequence.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Sequence
+
+import numpy as np
+
+from .anatomical_data import UNLABELED, ProbeAnatomy, _expand_spans, _runs, join_probes, split_probes
+
+DELTA_PREFIX = "~"
+_UNCHANGED = -2
+
+
+def _format_runs(first, last, labels, acronyms, colors) -> str:
+    return ";".join(
+        f"{a}-{b},{acronyms[label]},{colors[label]}"
+        for a, b, label in zip(first.tolist(), last.tolist(), labels.tolist())
+    )
+
+
+class DeltaEncoder:
+    """Stateful encoder producing full or delta messages per probe.
+
+    ``acronyms`` and ``colors`` are the label tables used by every call to
+    :meth:`encode`, e.g. from an atlas lookup.
+    """
+
+    def __init__(self, acronyms: Sequence[str], colors: Sequence[str], max_pending: int = 8):
+        self.acronyms = acronyms
+        self.colors = colors
+        self.max_pending = max_pending
+        self._sequence: dict[str, int] = {}
+        self._acknowledged: dict[str, tuple[int, np.ndarray]] = {}
+        self._pending: dict[str, OrderedDict[int, np.ndarray]] = {}
+        # Newest message per probe, resent while it is unacknowledged.
+        self._last_message: dict[str, tuple[int, str]] = {}
+
+    def _full(self, name: str, sequence: int, labels: np.ndarray) -> str:
+        _, first, last = _runs(labels[None])
+        return f"{DELTA_PREFIX}{name}@{sequence};" + _format_runs(
+            first, last, labels[first], self.acronyms, self.colors
+        )
+
+    def encode(self, name: str, labels: np.ndarray) -> str | None:
+        """Encode the current (n,) ``labels`` of probe ``name``.
+
+        Returns None if the labels equal the acknowledged state and nothing
+        newer is pending; if a newer state is pending, a full message returns
+        the receiver to those labels. If the labels equal the newest message
+        that has not been acknowledged yet, that message is sent again, so a
+        lost message is recovered without a change of state.
+        """
+        labels = np.asarray(labels)
+        pending = self._pending.setdefault(name, OrderedDict())
+        if pending:
+            newest, newest_labels = next(reversed(pending.items()))
+            if np.array_equal(newest_labels, labels) and self._last_message.get(name, (None,))[0] == newest:
+                return self._last_message[name][1]
+        elif name in self._acknowledged and np.array_equal(self._acknowledged[name][1], labels):
+            return None
+
+        sequence = self._sequence.get(name, 0) + 1
+        self._sequence[name] = sequence
+        pending[sequence] = labels.copy()
+        while len(pending) > self.max_pending:
+            pending.popitem(last=False)
+
+        message = self._encode(name, sequence, labels, len(pending))
+        self._last_message[name] = (sequence, message)
+        return message
+
+    def _encode(self, name: str, sequence: int, labels: np.ndarray, n_pending: int) -> str:
+        full = self._full(name, sequence, labels)
+        base = self._acknowledged.get(name)
+        if base is None or base[1].shape != labels.shape or n_pending >= self.max_pending:
+            return full
+        base_sequence, base_labels = base
+        key = np.where(labels != base_labels, labels, _UNCHANGED)
+        _, first, last = _runs(key[None])
+        keep = key[first] != _UNCHANGED
+        if not keep.any():
+            # Back to the acknowledged state while a newer state is pending:
+            # an empty delta would not tell the receiver to revert.
+            return full
+        first, last = first[keep], last[keep]
+        delta = f"{DELTA_PREFIX}{name}@{sequence}<{base_sequence};" + _format_runs(
+            first, last, labels[first], self.acronyms, self.colors
+        )
+        return delta if len(delta) < len(full) else full
+
+    def encode_many(self, names: Sequence[str], labels: np.ndarray) -> str | None:
+        """Encode a (P, n) label array; unchanged probes are left out."""
+        messages = [self.encode(name, row) for name, row in zip(names, labels)]
+        messages = [message for message in messages if message is not None]
+        return join_probes(messages) if messages else None
+
+    def acknowledge(self, name: str, sequence: int) -> None:
+        """Record that the receiver holds state ``sequence`` of probe ``name``."""
+        pending = self._pending.get(name, {})
+        if sequence not in pending:
+            return
+        self._acknowledged[name] = (sequence, pending[sequence])
+        for old in [s for s in pending if s <= sequence]:
+            del pending[old]
+
+    def resync(self, name: str | None = None) -> None:
+        """Forget acknowledged state so the next message is a full one."""
+        names = [name] if name is not None else list(self._pending)
+        for probe in names:
+            self._acknowledged.pop(probe, None)
+            self._pending.pop(probe, None)
+            self._last_message.pop(probe, None)
+
+
+class DeltaDecoder:
+    """Stateful decoder for full and delta messages.
+
+    After :meth:`decode`, ``acknowledgements`` maps each updated probe to
+    the sequence number to acknowledge, and ``resync_requests`` holds the
+    probes whose delta could not be applied.
+    """
+
+    def __init__(self, max_history: int = 8):
+        self.max_history = max_history
+        self.acknowledgements: dict[str, int] = {}
+        self.resync_requests: set[str] = set()
+        self._history: dict[str, OrderedDict[int, np.ndarray]] = {}
+        self._table: dict[str, int] = {}
+        self._acronyms: list[str] = []
+        self._colors: list[str] = []
+
+    def _label(self, acronym: str, color: str) -> int:
+        key = f"{acronym},{color}"
+        label = self._table.get(key)
+        if label is None:
+            label = self._table[key] = len(self._acronyms)
+            self._acronyms.append(acronym)
+            self._colors.append(color)
+        return label
+
+    def _apply(self, labels: np.ndarray | None, channel_data: str) -> np.ndarray:
+        spans, entry_labels = [], []
+        for entry in filter(None, channel_data.split(";")):
+            index, acronym, color = entry.split(",")
+            first, _, last = index.partition("-")
+            spans.append((int(first), int(last or first)))
+            entry_labels.append(self._label(acronym, color))
+        spans = np.array(spans, dtype=np.int64).reshape(-1, 2)
+        if labels is None:
+            size = int(spans[:, 1].max()) + 1 if len(spans) else 0
+            labels = np.full(size, UNLABELED, dtype=np.int32)
+        channel, lengths = _expand_spans(spans)
+        labels[channel] = np.repeat(np.array(entry_labels, dtype=np.int32), lengths)
+        return labels
+
+    def decode(self, message: str) -> list[ProbeAnatomy]:
+        """Apply a message and return the updated probes' current state."""
+        updated = []
+        for probe_message in split_probes(message):
+            header, _, channel_data = probe_message.partition(";")
+            if not header.startswith(DELTA_PREFIX):
+                name, sequence, base = header, None, None
+            else:
+                name, _, sequence = header[len(DELTA_PREFIX):].rpartition("@")
+                sequence, _, base = sequence.partition("<")
+                sequence, base = int(sequence), (int(base) if base else None)
+
+            history = self._history.setdefault(name, OrderedDict())
+            if base is None:
+                labels = self._apply(None, channel_data)
+            elif base in history:
+                labels = self._apply(history[base].copy(), channel_data)
+            else:
+                self.resync_requests.add(name)
+                continue
+
+            self.resync_requests.discard(name)
+            if sequence is not None:
+                history[sequence] = labels
+                while len(history) > self.max_history:
+                    history.popitem(last=False)
+                self.acknowledgements[name] = sequence
+            updated.append(
+                ProbeAnatomy(name, labels.copy(), np.array(self._acronyms), np.array(self._colors))
+            )
+        return updated
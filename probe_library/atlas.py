@@ -0,0 +1,190 @@
+"""Batched region lookup in BrainGlobe annotation volumes.
+
+:class:`AtlasLookup` memory-maps an annotation volume and maps batches of
+(N, 3) positions to region ids, and from there to rows of precomputed
+acronym and color tables. The table rows are what
+:func:`probe_library.anatomical_data.encode` expects as labels, so lookups
+can be sent as anatomical data messages directly. Row 0 of the tables is
+"outside the brain" (``-``, ``000000``).
+
+Positions are (AP, ML, DV) in mm relative to the reference coordinate, in
+atlas axes, or in a transformed space if an atlas transform is given.
+"""
+
+from __future__ import annotations
+
+import glob
+import json
+import os
+from typing import Any, Sequence
+
+import numpy as np
+
+from .atlas_transform import IDENTITY, AffineTransform, voxel_matrix
+from .transforms import apply_matrix
+
+# README atlas names -> (BrainGlobe atlas name, default resolution in µm).
+ATLASES = {
+    "CCF": ("allen_mouse", 25),
+    "Waxholm": ("whs_sd_rat", 39),
+}
+
+OUTSIDE_ACRONYM = "-"
+OUTSIDE_COLOR = "000000"
+
+# BrainGlobe volumes are stored anterior->posterior, superior->inferior,
+# right->left ("asr").
+BRAINGLOBE_AXES = ("ap", "dv", "ml")
+
+
+def brainglobe_dir() -> str:
+    return os.environ.get("BRAINGLOBE_DIR") or os.path.join(os.path.expanduser("~"), ".brainglobe")
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "probe_library", "atlases")
+
+
+def _memmap_tiff(path: str, cache_dir: str | os.PathLike | None = None) -> np.ndarray:
+    try:
+        import tifffile
+    except ImportError:
+        raise ImportError("reading BrainGlobe annotation volumes requires tifffile") from None
+    try:
+        return tifffile.memmap(path, mode="r")
+    except ValueError:
+        pass
+    # Compressed or non-contiguous TIFF: convert once to a .npy in our own
+    # cache, keyed by the atlas folder (which includes its version), so the
+    # BrainGlobe directory is never written to.
+    directory = os.fspath(cache_dir or default_cache_dir())
+    atlas = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    cached = os.path.join(directory, f"{atlas}_{os.path.splitext(os.path.basename(path))[0]}.npy")
+    if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{cached}.{os.getpid()}.tmp.npy"
+        np.save(tmp, tifffile.imread(path))
+        os.replace(tmp, cached)
+    return np.load(cached, mmap_mode="r")
+
+
+class AtlasLookup:
+    """Region lookup over an annotation volume.
+
+    Parameters
+    ----------
+    annotation : (X, Y, Z) integer array
+        Region id per voxel, typically memory-mapped. 0 is outside the brain.
+    structures : sequence of dict
+        BrainGlobe structure records with ``id``, ``acronym`` and
+        ``rgb_triplet``.
+    resolution_um : float or sequence of float
+        Voxel size along the (AP, ML, DV) axes.
+    reference : sequence of float
+        Reference coordinate (e.g. Bregma) in atlas mm, (AP, ML, DV).
+    axis_order : sequence of str
+        Which of ``"ap"``, ``"ml"``, ``"dv"`` each volume axis holds.
+    name : str
+        Atlas name and resolution, e.g. ``"allen_mouse_25um"``; used to key
+        per-atlas caches.
+    """
+
+    def __init__(
+        self,
+        annotation: np.ndarray,
+        structures: Sequence[dict[str, Any]],
+        resolution_um: float | Sequence[float],
+        reference: Sequence[float] = (0.0, 0.0, 0.0),
+        axis_order: Sequence[str] = BRAINGLOBE_AXES,
+        name: str = "",
+    ):
+        self.annotation = annotation
+        self.name = name
+        self.resolution_um = resolution_um
+        self.reference = tuple(float(v) for v in reference)
+        self.axis_order = tuple(axis_order)
+        self._shape = np.array(annotation.shape)
+        self._voxel_matrix = voxel_matrix(self.reference, resolution_um, self.axis_order)
+        self._matrices: dict[AffineTransform, np.ndarray] = {}
+
+        records = [s for s in sorted(structures, key=lambda s: int(s["id"])) if int(s["id"]) != 0]
+        self.structure_ids = np.array([0] + [int(s["id"]) for s in records], dtype=np.int64)
+        self.acronyms = np.array([OUTSIDE_ACRONYM] + [s["acronym"] for s in records])
+        self.colors = np.array(
+            [OUTSIDE_COLOR] + ["%02X%02X%02X" % tuple(s["rgb_triplet"]) for s in records]
+        )
+
+    @classmethod
+    def from_brainglobe(
+        cls,
+        atlas: str = "CCF",
+        resolution_um: int | None = None,
+        reference: Sequence[float] = (0.0, 0.0, 0.0),
+        directory: str | os.PathLike | None = None,
+        cache_dir: str | os.PathLike | None = None,
+    ) -> "AtlasLookup":
+        """Open a downloaded BrainGlobe atlas, memory-mapping its annotation.
+
+        ``atlas`` is a README atlas name (``"CCF"``, ``"Waxholm"``) or a
+        BrainGlobe atlas name such as ``"allen_mouse"``. A compressed
+        annotation volume is converted once to a ``.npy`` file in
+        ``cache_dir`` (default :func:`default_cache_dir`).
+        """
+        name, default_resolution = ATLASES.get(atlas, (atlas, None))
+        resolution_um = resolution_um or default_resolution
+        if resolution_um is None:
+            raise ValueError(f"no default resolution for atlas {atlas!r}")
+        root = os.fspath(directory or brainglobe_dir())
+        pattern = os.path.join(root, f"{name}_{resolution_um}um_v*")
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise FileNotFoundError(f"BrainGlobe atlas not found: {pattern}")
+        path = matches[-1]
+        with open(os.path.join(path, "structures.json")) as f:
+            structures = json.load(f)
+        with open(os.path.join(path, "metadata.json")) as f:
+            metadata = json.load(f)
+        axis_names = {"a": "ap", "p": "ap", "s": "dv", "i": "dv", "r": "ml", "l": "ml"}
+        axes = tuple(axis_names[c] for c in metadata.get("orientation", "asr"))
+        # BrainGlobe lists the resolution in volume axis order.
+        resolution = np.broadcast_to(metadata.get("resolution", resolution_um), (3,))
+        resolution = [resolution[axes.index(axis)] for axis in ("ap", "ml", "dv")]
+        annotation = _memmap_tiff(os.path.join(path, "annotation.tiff"), cache_dir)
+        return cls(annotation, structures, resolution, reference, axes, f"{name}_{resolution_um}um")
+
+    def voxel_transform(self, transform: AffineTransform = IDENTITY) -> np.ndarray:
+        """4 x 4 matrix from positions in ``transform`` space to voxel indices (cached)."""
+        matrix = self._matrices.get(transform)
+        if matrix is None:
+            matrix = self._matrices[transform] = self._voxel_matrix @ transform.inverse
+        return matrix
+
+    def voxels(self, points: np.ndarray, transform: AffineTransform = IDENTITY) -> np.ndarray:
+        """Nearest voxel index of each (..., 3) point; -1 rows for points outside the volume."""
+        voxels = np.rint(apply_matrix(self.voxel_transform(transform), points)).astype(np.int64)
+        outside = np.any((voxels < 0) | (voxels >= self._shape), axis=-1)
+        voxels[outside] = -1
+        return voxels
+
+    def ids_at_voxels(self, voxels: np.ndarray) -> np.ndarray:
+        """Region ids at (..., 3) voxel indices; rows of -1 give 0."""
+        inside = voxels[..., 0] >= 0
+        flat = voxels[inside]
+        ids = np.zeros(voxels.shape[:-1], dtype=np.int64)
+        ids[inside] = self.annotation[flat[:, 0], flat[:, 1], flat[:, 2]]
+        return ids
+
+    def region_ids(self, points: np.ndarray, transform: AffineTransform = IDENTITY) -> np.ndarray:
+        """Region id at each (..., 3) point (0 outside the brain)."""
+        return self.ids_at_voxels(self.voxels(points, transform))
+
+    def labels_for_ids(self, ids: np.ndarray) -> np.ndarray:
+        """Map region ids to rows of :attr:`acronyms` / :attr:`colors`."""
+        rows = np.searchsorted(self.structure_ids, ids)
+        rows = np.minimum(rows, len(self.structure_ids) - 1)
+        return np.where(self.structure_ids[rows] == ids, rows, 0).astype(np.int32)
+
+    def labels(self, points: np.ndarray, transform: AffineTransform = IDENTITY) -> np.ndarray:
+        """Table row (acronym/color label) at each (..., 3) point."""
+        return self.labels_for_ids(self.region_ids(points, transform))
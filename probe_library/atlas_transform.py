@@ -0,0 +1,150 @@
+"""Affine atlas transforms compiled to 4 x 4 homogeneous matrices.
+
+An affine transform (README "Affine Transform") rotates by yaw, then pitch,
+then roll around Bregma and then scales and flips each axis; the scale goes
+from the atlas to the transformed space. Coordinates are (AP, ML, DV) in mm
+relative to the reference coordinate, as produced by
+:func:`~probe_library.transforms.insertion_matrices`.
+
+Each transform is compiled once into a forward (atlas -> transformed)
+matrix and its inverse; compilation is cached on the transform parameters.
+:func:`channel_voxel_matrices` fuses insertion, inverse transform and atlas
+voxel grid into one matrix per insertion, so channel positions go from the
+probe to atlas voxel indices in a single pass over the data.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Sequence
+
+import numpy as np
+
+from .transforms import UM_PER_MM, apply_matrix, rotation_ap, rotation_dv, rotation_ml
+
+AXES = ("ap", "ml", "dv")
+
+
+@lru_cache(maxsize=256)
+def _compile(yaw: float, pitch: float, roll: float, scale: tuple, sign: tuple) -> tuple[np.ndarray, np.ndarray]:
+    forward = np.eye(4)
+    rotation = rotation_ap(roll) @ rotation_ml(pitch) @ rotation_dv(yaw)
+    forward[:3, :3] = (np.asarray(scale) * np.asarray(sign))[:, None] * rotation
+    inverse = np.linalg.inv(forward)
+    forward.flags.writeable = False
+    inverse.flags.writeable = False
+    return forward, inverse
+
+
+@dataclass(frozen=True, slots=True)
+class AffineTransform:
+    """An affine atlas transform, e.g. Qiu2018.
+
+    ``scale`` and ``sign`` are (AP, ML, DV) triples.
+    """
+
+    name: str
+    yaw: float = 0.0
+    pitch: float = 0.0
+    roll: float = 0.0
+    scale: tuple[float, float, float] = (1.0, 1.0, 1.0)
+    sign: tuple[int, int, int] = (1, 1, 1)
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "AffineTransform":
+        """Build a transform from the README JSON layout; see :func:`~probe_library.schema.parse_transform`."""
+        from .schema import parse_transform
+
+        return parse_transform(data)
+
+    def to_json(self) -> dict[str, str]:
+        data = {
+            "Name": self.name,
+            "Yaw": repr(self.yaw),
+            "Pitch": repr(self.pitch),
+            "Roll": repr(self.roll),
+        }
+        for axis, scale, sign in zip(AXES, self.scale, self.sign):
+            data[f"Scale{axis.upper()}"] = repr(scale)
+            data[f"Sign{axis.upper()}"] = str(sign)
+        return data
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Read-only 4 x 4 matrix mapping atlas to transformed coordinates."""
+        return _compile(self.yaw, self.pitch, self.roll, tuple(self.scale), tuple(self.sign))[0]
+
+    @property
+    def inverse(self) -> np.ndarray:
+        """Read-only 4 x 4 matrix mapping transformed to atlas coordinates."""
+        return _compile(self.yaw, self.pitch, self.roll, tuple(self.scale), tuple(self.sign))[1]
+
+    def to_transformed(self, points: np.ndarray) -> np.ndarray:
+        """Map (..., 3) atlas coordinates into the transformed space."""
+        return apply_matrix(self.matrix, points)
+
+    def to_atlas(self, points: np.ndarray) -> np.ndarray:
+        """Map (..., 3) transformed coordinates back into atlas space."""
+        return apply_matrix(self.inverse, points)
+
+
+IDENTITY = AffineTransform("")
+
+QIU2018 = AffineTransform(
+    "Qiu2018",
+    pitch=-5.0,
+    scale=(1.031, 0.952, 0.885),
+    sign=(-1, 1, -1),
+)
+
+_TRANSFORMS: dict[str, AffineTransform] = {"": IDENTITY, QIU2018.name: QIU2018}
+
+
+def register_transform(transform: AffineTransform) -> None:
+    """Make ``transform`` available to :func:`get_transform` by name."""
+    _TRANSFORMS[transform.name] = transform
+
+
+def get_transform(name: str | None) -> AffineTransform:
+    """Return a registered transform; a blank name means no transform."""
+    try:
+        return _TRANSFORMS[name or ""]
+    except KeyError:
+        raise KeyError(f"unknown atlas transform {name!r}, known: {sorted(_TRANSFORMS)}") from None
+
+
+def voxel_matrix(
+    reference: Sequence[float],
+    resolution_um: float | Sequence[float],
+    axis_order: Sequence[str] = AXES,
+) -> np.ndarray:
+    """Matrix from reference-relative atlas mm to fractional voxel indices.
+
+    ``reference`` is the reference coordinate (RefAP, RefML, RefDV) in atlas
+    mm and ``axis_order`` names the (AP, ML, DV) axis stored along each
+    volume dimension, e.g. ``("ap", "dv", "ml")`` for BrainGlobe atlases.
+    """
+    permutation = np.zeros((3, 3))
+    for row, axis in enumerate(axis_order):
+        permutation[row, AXES.index(axis)] = 1.0
+    scale = UM_PER_MM / np.broadcast_to(np.asarray(resolution_um, dtype=np.float64), (3,))
+    matrix = np.eye(4)
+    matrix[:3, :3] = permutation @ np.diag(scale)
+    matrix[:3, 3] = permutation @ (scale * np.asarray(reference, dtype=np.float64))
+    return matrix
+
+
+def channel_voxel_matrices(
+    insertions: np.ndarray,
+    transform: AffineTransform,
+    voxels: np.ndarray,
+) -> np.ndarray:
+    """Fuse insertion, inverse atlas transform and voxel grid matrices.
+
+    ``insertions`` is (..., 4, 4) from ``insertion_matrices`` in the
+    transformed space; ``voxels`` comes from :func:`voxel_matrix`. Pass the
+    result to ``apply_matrices`` to map channel map sites straight to voxel
+    indices.
+    """
+    return (voxels @ transform.inverse) @ insertions
@@ -0,0 +1,250 @@
+"""Columnar loading of ``channel_map.csv`` files.
+
+A channel map is held as a struct of arrays: one float32 row per geometry
+column (x, y, z, w, h, d) and one bit-packed row per selection layer
+(``default``, ``all``, ``bank0``, ...). The CSV is parsed in a single bulk
+call instead of row by row. Regular geometry can instead be held in
+parametric form by a :class:`~probe_library.lattice.SiteLattice`.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Sequence
+
+import numpy as np
+
+from .channel_neighbors import SiteNeighbors
+from .lattice import SiteLattice
+
+GEOMETRY_COLUMNS = ("x", "y", "z", "w", "h", "d")
+REQUIRED_COLUMNS = ("index",) + GEOMETRY_COLUMNS
+
+
+class ChannelMap:
+    """Struct-of-arrays representation of a probe channel map.
+
+    Parameters
+    ----------
+    index : (n,) int32 array or None
+        Channel indices, in file order.
+    geometry : (6, n) float32 array or None
+        Rows x, y, z, w, h, d in µm, relative to the probe tip.
+    layer_names : sequence of str
+        Names of the selection layers, in file order.
+    layer_bits : (n_layers, ceil(n / 8)) uint8 array
+        Selection layers packed with ``np.packbits(..., bitorder="little")``.
+    neighbors : SiteNeighbors, optional
+        Neighbor structure over the site positions; built on first use if
+        not given.
+    lattice : SiteLattice, optional
+        Parametric form of ``index`` and ``geometry``. Either may then be
+        None and is expanded from the lattice on first access.
+    """
+
+    __slots__ = ("_index", "_geometry", "layer_names", "layer_bits", "_layer_rows", "_neighbors", "lattice")
+
+    def __init__(
+        self,
+        index: np.ndarray | None,
+        geometry: np.ndarray | None,
+        layer_names: Sequence[str],
+        layer_bits: np.ndarray,
+        neighbors: SiteNeighbors | None = None,
+        lattice: SiteLattice | None = None,
+    ):
+        if (index is None or geometry is None) and lattice is None:
+            raise ValueError("index and geometry are required without a lattice")
+        self._index = index
+        self._geometry = geometry
+        self.layer_names = tuple(layer_names)
+        self.layer_bits = layer_bits
+        self._layer_rows = {name: row for row, name in enumerate(self.layer_names)}
+        self._neighbors = neighbors
+        self.lattice = lattice
+
+    @classmethod
+    def from_lattice(cls, lattice: SiteLattice, layer_names: Sequence[str], layer_bits: np.ndarray) -> "ChannelMap":
+        """A channel map whose index and geometry are expanded from ``lattice`` when used."""
+        return cls(None, None, layer_names, layer_bits, lattice=lattice)
+
+    def __len__(self) -> int:
+        return len(self.lattice) if self._index is None else self._index.shape[0]
+
+    def __repr__(self) -> str:
+        return f"ChannelMap({len(self)} channels, layers={list(self.layer_names)})"
+
+    @property
+    def index(self) -> np.ndarray:
+        if self._index is None:
+            self._index = self.lattice.site_index(np.arange(len(self.lattice)))
+        return self._index
+
+    @property
+    def geometry(self) -> np.ndarray:
+        if self._geometry is None:
+            self._geometry = self.lattice.expand()[1]
+        return self._geometry
+
+    def compressed(self) -> "ChannelMap":
+        """This map backed by a :class:`SiteLattice` fitted to its geometry."""
+        lattice = self.lattice if self.lattice is not None else SiteLattice.fit(self.index, self.geometry)
+        return ChannelMap.from_lattice(lattice, self.layer_names, self.layer_bits)
+
+    def site_geometry(self, sites: np.ndarray) -> np.ndarray:
+        """(k, 6) geometry rows of ``sites``, from the lattice parameters if there is one."""
+        if self.lattice is not None and self._geometry is None:
+            return self.lattice.site_geometry(sites)
+        return self.geometry[:, sites].T
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.geometry[0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.geometry[1]
+
+    @property
+    def z(self) -> np.ndarray:
+        return self.geometry[2]
+
+    @property
+    def w(self) -> np.ndarray:
+        return self.geometry[3]
+
+    @property
+    def h(self) -> np.ndarray:
+        return self.geometry[4]
+
+    @property
+    def d(self) -> np.ndarray:
+        return self.geometry[5]
+
+    @property
+    def position(self) -> np.ndarray:
+        """(n, 3) view of the site centers (x, y, z)."""
+        return self.geometry[:3].T
+
+    @property
+    def size(self) -> np.ndarray:
+        """(n, 3) view of the site extents (w, h, d)."""
+        return self.geometry[3:].T
+
+    @property
+    def neighbors(self) -> SiteNeighbors:
+        """Spatial hash and cached adjacency graphs over the site positions."""
+        if self._neighbors is None:
+            self._neighbors = SiteNeighbors(self.position)
+        return self._neighbors
+
+    def packed_layer(self, name: str) -> np.ndarray:
+        """Return the bit-packed row for layer ``name``."""
+        try:
+            return self.layer_bits[self._layer_rows[name]]
+        except KeyError:
+            raise KeyError(f"unknown layer {name!r}, available: {list(self.layer_names)}") from None
+
+    def layer(self, name: str) -> np.ndarray:
+        """Return layer ``name`` as an (n,) boolean mask."""
+        bits = np.unpackbits(self.packed_layer(name), count=len(self), bitorder="little")
+        return bits.view(bool)
+
+    def layers(self) -> dict[str, np.ndarray]:
+        """Return every layer as an (n,) boolean mask, keyed by name."""
+        return {name: self.layer(name) for name in self.layer_names}
+
+    def with_layer(self, name: str, mask: np.ndarray) -> "ChannelMap":
+        """A copy with boolean ``mask`` as layer ``name``, added or replaced."""
+        mask = np.asarray(mask, dtype=bool)
+        if mask.shape != (len(self),):
+            raise ValueError(f"layer {name!r} has {mask.size} values for {len(self)} channels")
+        bits = pack_layers(mask)
+        if name in self._layer_rows:
+            layer_bits = np.array(self.layer_bits)
+            layer_bits[self._layer_rows[name]] = bits
+            return ChannelMap(self._index, self._geometry, self.layer_names, layer_bits, lattice=self.lattice)
+        layer_bits = np.concatenate([self.layer_bits, bits[None]]) if len(self.layer_names) else bits[None]
+        return ChannelMap(self._index, self._geometry, (*self.layer_names, name), layer_bits, lattice=self.lattice)
+
+    def shank_ids(self, n_shanks: int) -> np.ndarray:
+        """Assign each site to one of ``n_shanks`` shanks, numbered by x.
+
+        ``channel_map.csv`` has no shank column, so shanks are separated at
+        the ``n_shanks - 1`` widest gaps between site x positions.
+        """
+        if n_shanks <= 1 or len(self) == 0:
+            return np.zeros(len(self), dtype=np.int32)
+        xs = np.unique(self.x)
+        if len(xs) < n_shanks:
+            raise ValueError(f"cannot split {len(xs)} distinct x positions into {n_shanks} shanks")
+        gaps = np.argsort(np.diff(xs), kind="stable")[-(n_shanks - 1):]
+        edges = np.sort(xs[gaps + 1])
+        return np.searchsorted(edges, self.x, side="right").astype(np.int32)
+
+
+def pack_layers(masks: np.ndarray) -> np.ndarray:
+    """Bit-pack an (n_layers, n) boolean array into rows of uint8."""
+    masks = np.asarray(masks, dtype=bool)
+    return np.packbits(masks, axis=-1, bitorder="little")
+
+
+def from_columns(
+    table: np.ndarray,
+    header: Sequence[str],
+) -> ChannelMap:
+    """Build a :class:`ChannelMap` from an (n, n_columns) numeric table."""
+    header = [name.strip() for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"channel map is missing required columns {missing}")
+    columns = {name: col for col, name in enumerate(header)}
+
+    index = table[:, columns["index"]].astype(np.int32)
+    geometry = np.ascontiguousarray(
+        table[:, [columns[name] for name in GEOMETRY_COLUMNS]].T, dtype=np.float32
+    )
+    layer_names = [name for name in header if name not in REQUIRED_COLUMNS]
+    layer_cols = [columns[name] for name in layer_names]
+    layer_bits = pack_layers(table[:, layer_cols].T != 0)
+    return ChannelMap(index, geometry, layer_names, layer_bits)
+
+
+def load_channel_map(path: str | os.PathLike, lattice: bool = False) -> ChannelMap:
+    """Load a ``channel_map.csv`` file in one bulk parse.
+
+    With ``lattice=True`` the geometry is kept in parametric form (see
+    :meth:`ChannelMap.compressed`) and the explicit arrays are dropped.
+    """
+    with open(path, "r", newline="") as f:
+        header = [name.strip() for name in f.readline().split(",")]
+        table = np.loadtxt(f, delimiter=",", dtype=np.float64, ndmin=2)
+    if table.size == 0:
+        table = np.empty((0, len(header)))
+    if table.shape[1] != len(header):
+        raise ValueError(
+            f"{os.fspath(path)}: header has {len(header)} columns but rows have {table.shape[1]}"
+        )
+    channel_map = from_columns(table, header)
+    return channel_map.compressed() if lattice else channel_map
+
+
+def save_channel_map(path: str | os.PathLike, channel_map: ChannelMap) -> None:
+    """Atomically write ``channel_map`` as ``channel_map.csv``.
+
+    Integral values are written without a decimal point (``-14``, not
+    ``-14.0``) and layers as 0/1, so a loaded map is written back as it was.
+    """
+    header = [*REQUIRED_COLUMNS, *channel_map.layer_names]
+    layers = np.unpackbits(channel_map.layer_bits, axis=-1, count=len(channel_map), bitorder="little")
+    columns = [channel_map.index.astype(np.int64).astype(str)]
+    for row in channel_map.geometry:
+        # Shortest text that reads back as the same float32: "12", "0.1".
+        columns.append([np.format_float_positional(v, trim="-") for v in np.asarray(row, dtype=np.float32)])
+    columns.extend(layer.astype(str) for layer in layers)
+    lines = [",".join(header)]
+    lines.extend(",".join(values) for values in zip(*columns))
+    tmp = f"{os.fspath(path)}.{os.getpid()}.tmp"
+    with open(tmp, "w", newline="") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
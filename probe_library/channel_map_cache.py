@@ -0,0 +1,159 @@
+"""Compiled binary sidecars for ``channel_map.csv``.
+
+``load_cached_channel_map("np1/channel_map.csv")`` memory-maps
+``np1/channel_map.cmap`` when it is current and otherwise parses the CSV and
+(re)writes the sidecar. A sidecar is current when the CSV's mtime and size
+match the recorded values, or, if they do not, when the CSV's SHA-256 still
+matches; in that case only the recorded mtime is refreshed.
+
+The sidecar also keeps the channel map's neighbor structure
+(:class:`~probe_library.channel_neighbors.SiteNeighbors`): its grid and
+adjacency graphs are written into the sidecar as optional arrays when
+``channel_map.neighbors.save()`` is called, so later loads reuse them. When it is smaller, the
+parametric form of the geometry (:class:`~probe_library.lattice.SiteLattice`)
+is stored alongside the explicit arrays, which are kept for other readers;
+maps loaded from such a sidecar are backed by the lattice.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+from functools import partial
+
+import numpy as np
+
+from ._binary import decode_strings, encode_strings, read_arrays, write_arrays
+from .channel_map import ChannelMap, load_channel_map
+from .channel_neighbors import ARRAY_NAMES as NEIGHBOR_ARRAYS
+from .channel_neighbors import SiteNeighbors
+from .lattice import ARRAY_NAMES as LATTICE_ARRAYS
+from .lattice import SiteLattice
+
+MAGIC = b"PLCMAP\0\0"
+VERSION = 1
+SUFFIX = ".cmap"
+
+
+def sidecar_path(csv_path: str | os.PathLike) -> str:
+    """Return the sidecar path for ``csv_path``."""
+    return os.path.splitext(os.fspath(csv_path))[0] + SUFFIX
+
+
+def file_digest(path: str | os.PathLike) -> bytes:
+    """Return the SHA-256 digest of the file at ``path``."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").digest()
+
+
+def _source_stat(path: str | os.PathLike) -> np.ndarray:
+    st = os.stat(path)
+    return np.array([st.st_mtime_ns, st.st_size], dtype=np.uint64)
+
+
+def write_sidecar(
+    channel_map: ChannelMap,
+    path: str | os.PathLike,
+    source_stat: np.ndarray,
+    source_digest: bytes,
+) -> None:
+    """Write ``channel_map`` to the sidecar at ``path``.
+
+    The lattice arrays are included only when they are smaller than the
+    explicit ``index`` and ``geometry``.
+    """
+    lattice = channel_map.compressed().lattice
+    explicit_bytes = 4 * len(channel_map) * (1 + len(channel_map.geometry))
+    write_arrays(
+        path,
+        MAGIC,
+        VERSION,
+        {
+            "source_stat": source_stat,
+            "source_sha256": np.frombuffer(source_digest, dtype=np.uint8),
+            "index": channel_map.index.astype(np.int32, copy=False),
+            "geometry": channel_map.geometry.astype(np.float32, copy=False),
+            "layer_bits": channel_map.layer_bits,
+            "layer_names": encode_strings(channel_map.layer_names),
+            **(lattice.to_arrays() if lattice.nbytes < explicit_bytes else {}),
+        },
+    )
+
+
+def read_sidecar(path: str | os.PathLike) -> tuple[ChannelMap, dict[str, np.ndarray], dict[str, int]]:
+    """Memory-map the sidecar at ``path``.
+
+    Returns the channel map, the raw arrays and their byte offsets. If the
+    sidecar has lattice arrays the map is backed by the lattice and the
+    explicit ``index`` and ``geometry`` are not read.
+    """
+    arrays, offsets = read_arrays(path, MAGIC, VERSION)
+    lattice = SiteLattice.from_arrays(arrays) if LATTICE_ARRAYS[0] in arrays else None
+    channel_map = ChannelMap(
+        arrays["index"] if lattice is None else None,
+        arrays["geometry"] if lattice is None else None,
+        decode_strings(arrays["layer_names"], arrays["layer_bits"].shape[0]),
+        arrays["layer_bits"],
+        SiteNeighbors(arrays["geometry"][:3].T, arrays=arrays, store=partial(_store_neighbors, path)),
+        lattice,
+    )
+    return channel_map, arrays, offsets
+
+
+def _store_neighbors(path: str | os.PathLike, neighbors: SiteNeighbors) -> None:
+    """Rewrite the sidecar at ``path`` with the grid and adjacency of ``neighbors``."""
+    try:
+        arrays, _ = read_arrays(path, MAGIC, VERSION)
+    except (OSError, ValueError):
+        return
+    # The sidecar may have been rebuilt from an edited CSV since it was read.
+    if not np.array_equal(arrays["geometry"][:3].T, neighbors.positions):
+        return
+    arrays = {name: np.array(array) for name, array in arrays.items() if name not in NEIGHBOR_ARRAYS}
+    arrays.update(neighbors.to_arrays())
+    try:
+        write_arrays(path, MAGIC, VERSION, arrays)
+    except OSError:
+        pass
+
+
+def _refresh_stat(path: str, offset: int, stat: np.ndarray) -> None:
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(struct.pack("<2Q", *map(int, stat)))
+
+
+def load_cached_channel_map(csv_path: str | os.PathLike) -> ChannelMap:
+    """Load ``csv_path`` through its binary sidecar, rebuilding it if stale.
+
+    If the sidecar cannot be written (e.g. a read-only library checkout) the
+    CSV is parsed directly.
+    """
+    csv_path = os.fspath(csv_path)
+    cache_path = sidecar_path(csv_path)
+    stat = _source_stat(csv_path)
+
+    digest = None
+    if os.path.exists(cache_path):
+        try:
+            channel_map, arrays, offsets = read_sidecar(cache_path)
+        except (ValueError, KeyError):
+            pass
+        else:
+            if np.array_equal(arrays["source_stat"], stat):
+                return channel_map
+            digest = file_digest(csv_path)
+            if arrays["source_sha256"].tobytes() == digest:
+                try:
+                    _refresh_stat(cache_path, offsets["source_stat"], stat)
+                except OSError:
+                    pass
+                return channel_map
+
+    channel_map = load_channel_map(csv_path)
+    try:
+        write_sidecar(channel_map, cache_path, stat, digest or file_digest(csv_path))
+    except OSError:
+        return channel_map
+    return read_sidecar(cache_path)[0]
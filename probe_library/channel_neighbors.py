@@ -0,0 +1,246 @@
+"""Neighbor queries between the sites of a channel map.
+
+:class:`SiteNeighbors` answers "sites within r of a point" and "nearest
+sites to a point" in probe-local µm without all-pairs distances. Sites are
+bucketed in a uniform grid (a spatial hash on x/y/z): each site's cell is
+linearized to one integer key and the sites are sorted by key, so a cell's
+sites are a contiguous run found by binary search over the distinct keys. A
+batched query enumerates the cells overlapping each query's box, gathers
+their runs and keeps the candidates within the radius. Nearest-site
+queries double the radius until enough sites are found, which is exact.
+
+``adjacency(radius)`` gives the site graph at that radius in CSR form and
+is cached per radius. Queries never write to disk: for channel maps loaded
+through :func:`~probe_library.channel_map_cache.load_cached_channel_map`,
+:meth:`SiteNeighbors.save` stores the grid and the most recent
+:data:`MAX_SAVED_GRAPHS` adjacency graphs in the ``.cmap`` sidecar, where
+later loads reuse them.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Mapping
+
+import numpy as np
+
+# Adjacency graphs kept by save(), most recently built first.
+MAX_SAVED_GRAPHS = 8
+
+ARRAY_NAMES = (
+    "neighbor_grid",
+    "neighbor_order",
+    "neighbor_keys",
+    "neighbor_starts",
+    "adjacency_radii",
+    "adjacency_offsets",
+    "adjacency_indptr",
+    "adjacency_indices",
+    "adjacency_distances",
+)
+
+
+def _ranges(starts: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Owner and value of every element of the runs ``starts[i] + arange(counts[i])``."""
+    owner = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    return owner, starts[owner] + np.arange(counts.sum()) - first[owner]
+
+
+class SiteNeighbors:
+    """Uniform-grid spatial hash and cached CSR adjacency over site positions.
+
+    Parameters
+    ----------
+    positions : (n, 3) array
+        Site centers (x, y, z) in µm.
+    cell_size : float, optional
+        Grid cell edge in µm; by default about one site per cell.
+    arrays : mapping of str to array, optional
+        Grid and adjacency arrays from :meth:`to_arrays`, e.g. read from a
+        sidecar.
+    store : callable, optional
+        Called with this object by :meth:`save` to persist the grid and
+        adjacency graphs.
+    """
+
+    def __init__(
+        self,
+        positions: np.ndarray,
+        cell_size: float | None = None,
+        arrays: Mapping[str, np.ndarray] | None = None,
+        store: Callable[["SiteNeighbors"], None] | None = None,
+    ):
+        # Converted on first use, so a memory-mapped source is not read until queried.
+        self._source = positions
+        self._positions: np.ndarray | None = None
+        self.store = store
+        self._cell_size = cell_size
+        self._grid: tuple[np.ndarray, ...] | None = None
+        self._adjacency: dict[float, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        if arrays is not None and "neighbor_grid" in arrays:
+            grid = arrays["neighbor_grid"]
+            self._cell_size = float(grid[3])
+            self._grid = (
+                grid[:3],
+                grid[4:7].astype(np.int64),
+                arrays["neighbor_order"],
+                arrays["neighbor_keys"],
+                arrays["neighbor_starts"],
+            )
+            offsets = arrays["adjacency_offsets"].tolist()
+            for k, radius in enumerate(arrays["adjacency_radii"].tolist()):
+                chunk = slice(offsets[k], offsets[k + 1])
+                self._adjacency[radius] = (
+                    arrays["adjacency_indptr"][k],
+                    arrays["adjacency_indices"][chunk],
+                    arrays["adjacency_distances"][chunk],
+                )
+
+    def __len__(self) -> int:
+        return len(self._source)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """(n, 3) float64 site centers."""
+        if self._positions is None:
+            self._positions = np.asarray(self._source, dtype=np.float64).reshape(-1, 3)
+        return self._positions
+
+    @property
+    def cell_size(self) -> float:
+        if self._cell_size is None:
+            extent = np.ptp(self.positions, axis=0) if len(self) else np.zeros(3)
+            extent = extent[extent > 0]
+            volume = float(np.prod(extent)) if len(extent) else 1.0
+            self._cell_size = max((volume / max(len(self), 1)) ** (1 / max(len(extent), 1)), 1e-3)
+        return self._cell_size
+
+    @property
+    def grid(self) -> tuple[np.ndarray, ...]:
+        """(origin, dims, order, keys, starts) of the spatial hash."""
+        if self._grid is None:
+            origin = self.positions.min(axis=0) if len(self) else np.zeros(3)
+            cells = np.floor((self.positions - origin) / self.cell_size).astype(np.int64)
+            dims = cells.max(axis=0) + 1 if len(self) else np.ones(3, dtype=np.int64)
+            keys = np.ravel_multi_index(cells.T, dims)
+            order = np.argsort(keys, kind="stable").astype(np.int32)
+            keys, starts = np.unique(keys[order], return_index=True)
+            self._grid = (origin, dims, order, keys, np.append(starts, len(self)).astype(np.int32))
+        return self._grid
+
+    def save(self) -> None:
+        """Persist the grid and adjacency graphs through ``store``, if there is one."""
+        if self.store is not None:
+            self.store(self)
+
+    def _candidates(self, points: np.ndarray, radius: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(query, site) pairs for the sites in cells overlapping each query's box."""
+        origin, dims, order, keys, starts = self.grid
+        low = np.floor((points - radius[:, None] - origin) / self.cell_size).astype(np.int64)
+        high = np.floor((points + radius[:, None] - origin) / self.cell_size).astype(np.int64)
+        low, high = np.maximum(low, 0), np.minimum(high, dims - 1)
+        extent = np.maximum(high - low + 1, 0)
+        # Every cell of every query box, then the run of sites in that cell.
+        query, local = _ranges(np.zeros(len(points), dtype=np.int64), extent.prod(axis=1))
+        box = extent[query]
+        cell = low[query] + np.stack(
+            [local // (box[:, 1] * box[:, 2]), local // box[:, 2] % box[:, 1], local % box[:, 2]], axis=1
+        )
+        key = np.ravel_multi_index(cell.T, dims)
+        row = np.searchsorted(keys, key)
+        found = row < len(keys)
+        found[found] = keys[row[found]] == key[found]
+        query, row = query[found], row[found]
+        owner, position = _ranges(starts[row], starts[row + 1] - starts[row])
+        return query[owner], order[position]
+
+    def within(
+        self, points: np.ndarray, radius: float | np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sites within ``radius`` of each of (Q, 3) ``points`` as CSR.
+
+        Returns ``indptr`` (Q + 1,), ``indices`` and ``distances``: the sites
+        of query q are ``indices[indptr[q]:indptr[q + 1]]``, in site order.
+        (Q, 2) points are (x, y) on the probe face, z = 0.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        if points.shape[1] == 2:
+            points = np.column_stack([points, np.zeros(len(points))])
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), (len(points),))
+        query, site = self._candidates(points, radius)
+        distance = np.linalg.norm(self.positions[site] - points[query], axis=1)
+        keep = distance <= radius[query]
+        query, site, distance = query[keep], site[keep], distance[keep]
+        order = np.lexsort((site, query))
+        indptr = np.zeros(len(points) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(query, minlength=len(points)), out=indptr[1:])
+        return indptr, site[order].astype(np.int32), distance[order].astype(np.float32)
+
+    def nearest(self, points: np.ndarray, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """(Q, k) distances and sites nearest each point (inf / -1 if fewer sites)."""
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        distances = np.full((len(points), k), np.inf)
+        sites = np.full((len(points), k), -1, dtype=np.int64)
+        if not len(self):
+            return distances, sites
+        k_found = min(k, len(self))
+        pending = np.arange(len(points))
+        # Start at the distance to the sites' bounding box plus one cell.
+        low, high = self.positions.min(axis=0), self.positions.max(axis=0)
+        flat = points if points.shape[1] == 3 else np.column_stack([points, np.zeros(len(points))])
+        radius = np.linalg.norm(flat - np.clip(flat, low, high), axis=1) + self.cell_size
+        # Any k sites within r include the k nearest; double r until found.
+        while len(pending):
+            indptr, indices, found = self.within(points[pending], radius[pending])
+            counts = np.diff(indptr)
+            done = counts >= k_found
+            owner = np.repeat(np.arange(len(pending)), counts)
+            order = np.lexsort((found, owner))
+            rank = np.arange(len(order)) - indptr[owner]
+            best = order[done[owner] & (rank < k_found)]
+            rows, columns = pending[owner[best]], rank[done[owner] & (rank < k_found)]
+            distances[rows, columns] = found[best]
+            sites[rows, columns] = indices[best]
+            pending = pending[~done]
+            radius[pending] *= 2
+        return distances, sites
+
+    def adjacency(self, radius: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Site graph with an edge between sites within ``radius``, as CSR.
+
+        Returns ``indptr`` (n + 1,), ``indices`` and ``distances``; a site is
+        not its own neighbor. Cached per radius.
+        """
+        radius = float(radius)
+        if radius not in self._adjacency:
+            indptr, indices, distances = self.within(self.positions, radius)
+            owner = np.repeat(np.arange(len(self)), np.diff(indptr))
+            other = indices != owner
+            indptr = np.zeros(len(self) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(owner[other], minlength=len(self)), out=indptr[1:])
+            self._adjacency[radius] = (indptr, indices[other], distances[other])
+        return self._adjacency[radius]
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """Grid and the latest :data:`MAX_SAVED_GRAPHS` adjacency arrays, for :meth:`__init__` ``arrays``."""
+        origin, dims, order, keys, starts = self.grid
+        radii = list(self._adjacency)[-MAX_SAVED_GRAPHS:]
+        graphs = [self._adjacency[radius] for radius in radii]
+        sizes = [len(indices) for _, indices, _ in graphs]
+        return {
+            "neighbor_grid": np.concatenate([origin, [self.cell_size], dims]).astype(np.float64),
+            "neighbor_order": order.astype(np.int32),
+            "neighbor_keys": keys.astype(np.int64),
+            "neighbor_starts": starts.astype(np.int32),
+            "adjacency_radii": np.array(radii, dtype=np.float64),
+            "adjacency_offsets": np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+            "adjacency_indptr": np.array(
+                [indptr for indptr, _, _ in graphs], dtype=np.int64
+            ).reshape(len(radii), len(self) + 1),
+            "adjacency_indices": np.concatenate(
+                [np.empty(0, dtype=np.int32)] + [indices for _, indices, _ in graphs]
+            ).astype(np.int32),
+            "adjacency_distances": np.concatenate(
+                [np.empty(0, dtype=np.float32)] + [distances for _, _, distances in graphs]
+            ).astype(np.float32),
+        }
@@ -0,0 +1,238 @@
+"""Choosing which sites to record under a probe's switching constraints.
+
+A probe records ``channels`` sites at a time out of all its sites. The
+constraints live in ``selection.json`` next to ``metadata.json`` (see
+:class:`~probe_library.schema.SelectionConstraints`), e.g. for
+Neuropixels 1.0::
+
+    {"channels": 384, "block-size": 1}
+
+Site ``index`` is wired to hardware channel ``index % channels`` and sites
+are switched in blocks of ``block-size`` consecutive indices, so choosing
+a configuration is choosing blocks whose channels do not overlap. Each
+site is scored by its region label (for example from
+:func:`~probe_library.shank_regions.label_channels`) and the solver
+maximizes the summed score of the selected sites.
+
+Blocks that share a channel are split into connected components, which are
+independent subproblems. A component whose blocks all use the same
+channels (the usual case: the block size divides ``channels``) is solved
+for every component at once by picking its best block. Other components
+are solved by branch and bound, seeded with a greedy solution. Channels
+left without a scoring block are filled with the lowest-index compatible
+block, so a configuration always uses as many channels as it can.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Mapping
+
+import numpy as np
+
+from .channel_map import ChannelMap, load_channel_map, save_channel_map
+from .layer_query import SiteSelector
+from .schema import SelectionConstraints, parse_selection
+
+SELECTION_FILE = "selection.json"
+DEFAULT_MAX_NODES = 100_000
+
+
+def load_selection(path: str | os.PathLike) -> SelectionConstraints:
+    with open(path) as f:
+        return parse_selection(json.load(f))
+
+
+@dataclass(frozen=True)
+class Selection:
+    """A chosen configuration.
+
+    ``mask`` marks the selected sites, ``score`` is their summed score and
+    ``optimal`` is False if branch and bound stopped at its node limit.
+    """
+
+    mask: np.ndarray
+    score: float
+    optimal: bool
+
+    @property
+    def count(self) -> int:
+        return int(self.mask.sum())
+
+
+def site_scores(
+    labels: np.ndarray,
+    targets: Mapping[int, float] | np.ndarray | list[int],
+) -> np.ndarray:
+    """Per-site score: the weight of each site's label, 0 outside the targets.
+
+    ``targets`` is a collection of labels (weight 1) or a mapping from
+    label to weight.
+    """
+    labels = np.asarray(labels)
+    if isinstance(targets, Mapping):
+        keys = np.fromiter(targets.keys(), dtype=labels.dtype, count=len(targets))
+        weights = np.fromiter(targets.values(), dtype=np.float64, count=len(targets))
+    else:
+        keys = np.asarray(targets, dtype=labels.dtype)
+        weights = np.ones(len(keys))
+    if not len(keys):
+        return np.zeros(labels.shape)
+    order = np.argsort(keys)
+    keys, weights = keys[order], weights[order]
+    row = np.minimum(np.searchsorted(keys, labels), len(keys) - 1)
+    return np.where(keys[row] == labels, weights[row], 0.0)
+
+
+class _Blocks:
+    """Switch blocks of a channel map and the hardware channels they use."""
+
+    def __init__(self, channel_map: ChannelMap, constraints: SelectionConstraints, selectable: np.ndarray):
+        index = channel_map.index.astype(np.int64)
+        block = index // constraints.block_size
+        self.ids, self.site_block = np.unique(block, return_inverse=True)
+        n = len(self.ids)
+        # A block can be chosen only if all of its sites can.
+        self.allowed = np.ones(n, dtype=bool)
+        np.logical_and.at(self.allowed, self.site_block, selectable)
+        channel = index % constraints.channels
+        # (block, channel) incidence, one entry per site.
+        pairs = np.unique(self.site_block * constraints.channels + channel)
+        self.pair_block, self.pair_channel = np.divmod(pairs, constraints.channels)
+        self.n_channels = constraints.channels
+        self.sizes = np.bincount(self.pair_block, minlength=n)
+        # A block with two sites on one channel can never be recorded.
+        self.allowed &= self.sizes == np.bincount(self.site_block, minlength=n)
+
+    def components(self) -> np.ndarray:
+        """Connected component of each block in the block-channel graph."""
+        label = np.arange(len(self.ids))
+        while True:
+            channel_label = np.full(self.n_channels, len(label))
+            np.minimum.at(channel_label, self.pair_channel, label[self.pair_block])
+            updated = label.copy()
+            np.minimum.at(updated, self.pair_block, channel_label[self.pair_channel])
+            if np.array_equal(updated, label):
+                return label
+            label = updated
+
+    def masks(self, blocks: np.ndarray) -> list[int]:
+        """Channel sets of ``blocks`` as Python int bitsets."""
+        masks = [0] * len(blocks)
+        position = np.full(len(self.ids), -1)
+        position[blocks] = np.arange(len(blocks))
+        pairs = position[self.pair_block] >= 0
+        for i, channel in zip(position[self.pair_block[pairs]].tolist(), self.pair_channel[pairs].tolist()):
+            masks[i] |= 1 << channel
+        return masks
+
+
+def _branch_and_bound(scores: list[float], masks: list[int], max_nodes: int) -> tuple[list[int], bool]:
+    """Highest-scoring subset of blocks with disjoint channel masks.
+
+    Blocks are given in decreasing score order; returns positions of the
+    chosen blocks and whether the search finished.
+    """
+    # Greedy: take each block that still fits.
+    used, best = 0, []
+    for i, mask in enumerate(masks):
+        if not used & mask:
+            used |= mask
+            best.append(i)
+    best_score = sum(scores[i] for i in best)
+    nodes = 0
+
+    def search(i: int, used: int, chosen: list[int], score: float) -> None:
+        nonlocal best, best_score, nodes
+        nodes += 1
+        if score > best_score:
+            best, best_score = list(chosen), score
+        if i == len(scores) or nodes > max_nodes:
+            return
+        # Remaining blocks that still fit bound what can be added.
+        bound = score + sum(scores[j] for j in range(i, len(scores)) if not used & masks[j])
+        if bound <= best_score:
+            return
+        if not used & masks[i]:
+            chosen.append(i)
+            search(i + 1, used | masks[i], chosen, score + scores[i])
+            chosen.pop()
+        search(i + 1, used, chosen, score)
+
+    search(0, 0, [], 0.0)
+    return best, nodes <= max_nodes
+
+
+def _first_per_component(rows: np.ndarray, scores: np.ndarray, component: np.ndarray) -> np.ndarray:
+    """Highest-scoring of ``rows`` in each component, lowest row on ties."""
+    order = rows[np.lexsort((rows, -scores[rows], component[rows]))]
+    return order[np.r_[True, component[order][1:] != component[order][:-1]]] if len(order) else order
+
+
+def solve_selection(
+    channel_map: ChannelMap,
+    constraints: SelectionConstraints,
+    scores: np.ndarray,
+    n_shanks: int = 1,
+    fill: bool = True,
+    max_nodes: int = DEFAULT_MAX_NODES,
+) -> Selection:
+    """Best valid selection of sites for per-site ``scores`` (see :func:`site_scores`).
+
+    ``n_shanks`` is used by ``shank`` predicates in ``constraints.sites``;
+    ``max_nodes`` limits each branch-and-bound search.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.shape != (len(channel_map),):
+        raise ValueError(f"got {scores.size} scores for {len(channel_map)} sites")
+    if constraints.sites:
+        selectable = SiteSelector(channel_map, n_shanks).mask(constraints.sites)
+    else:
+        selectable = np.ones(len(channel_map), dtype=bool)
+    blocks = _Blocks(channel_map, constraints, selectable)
+    block_scores = np.bincount(blocks.site_block, weights=scores, minlength=len(blocks.ids))
+    candidate = blocks.allowed & (block_scores > 0)
+    chosen = np.zeros(len(blocks.ids), dtype=bool)
+    optimal = True
+
+    component = blocks.components()
+    channel_component = np.full(blocks.n_channels, -1)
+    channel_component[blocks.pair_channel] = component[blocks.pair_block]
+    channels_per_component = np.bincount(channel_component[channel_component >= 0], minlength=len(blocks.ids))
+    # Components where every block uses all the channels take at most one
+    # block, so each takes its best (lowest index on ties).
+    simple = np.ones(len(blocks.ids), dtype=bool)
+    np.logical_and.at(simple, component, blocks.sizes == channels_per_component[component])
+    simple = simple[component]
+    chosen[_first_per_component(np.flatnonzero(candidate & simple), block_scores, component)] = True
+
+    for c in np.unique(component[candidate & ~simple]):
+        rows = np.flatnonzero(candidate & (component == c))
+        rows = rows[np.argsort(-block_scores[rows], kind="stable")]
+        picked, finished = _branch_and_bound(block_scores[rows].tolist(), blocks.masks(rows), max_nodes)
+        chosen[rows[picked]] = True
+        optimal &= finished
+
+    if fill:
+        idle = blocks.allowed & simple & ~np.isin(component, component[chosen])
+        chosen[_first_per_component(np.flatnonzero(idle), np.zeros(len(blocks.ids)), component)] = True
+        rows = np.flatnonzero(blocks.allowed & ~simple & ~chosen)
+        used = 0
+        for mask in blocks.masks(np.flatnonzero(chosen & ~simple)):
+            used |= mask
+        for row, mask in zip(rows.tolist(), blocks.masks(rows)):
+            if not used & mask:
+                used |= mask
+                chosen[row] = True
+
+    mask = chosen[blocks.site_block]
+    return Selection(mask, float(scores[mask].sum()), optimal)
+
+
+def write_selection_layer(path: str | os.PathLike, name: str, selection: Selection) -> ChannelMap:
+    """Add ``selection`` to the ``channel_map.csv`` at ``path`` as layer ``name``."""
+    channel_map = load_channel_map(path).with_layer(name, selection.mask)
+    save_channel_map(path, channel_map)
+    return channel_map
@@ -0,0 +1,362 @@
+"""Collision and clearance checks between probes, hardware and rig objects.
+
+Every mesh gets a bounding volume hierarchy (:class:`MeshBVH`) once, in its
+own coordinates; moving an object only changes its 4 x 4 matrix. A
+:class:`CollisionScene` then finds the clearance of every pair of objects
+in two phases:
+
+* broad phase: world bounding boxes are swept and pruned along one axis,
+  so only pairs whose boxes come within ``max_distance`` are examined;
+* narrow phase: the two hierarchies are traversed together in the first
+  object's frame, a whole front of node pairs at a time. Pairs whose
+  boxes are farther apart than the best distance found so far are
+  dropped, and the remaining leaf pairs are resolved by vectorized
+  triangle-triangle distances.
+
+Matrices must be similarities (rotation, translation and uniform scale),
+e.g. from :func:`probe_library.transforms.insertion_matrices`.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .mesh_cache import CompiledMesh
+
+LEAF_SIZE = 8
+_EPS = 1e-12
+
+
+@dataclass
+class MeshBVH:
+    """Binary AABB hierarchy over a triangle mesh.
+
+    Node ``i`` bounds ``bounds[i]`` (min and max corner). Inner nodes have
+    children ``children[i]``; leaves have ``children[i] == (-1, -1)`` and
+    hold triangles ``triangles[first[i]:first[i] + count[i]]``. ``points``
+    holds one mesh vertex per node, used for cheap upper bounds.
+    """
+
+    vertices: np.ndarray
+    faces: np.ndarray
+    bounds: np.ndarray
+    children: np.ndarray
+    first: np.ndarray
+    count: np.ndarray
+    triangles: np.ndarray
+    points: np.ndarray
+
+    @classmethod
+    def build(cls, vertices: np.ndarray, faces: np.ndarray, leaf_size: int = LEAF_SIZE) -> "MeshBVH":
+        """Build by splitting triangle centroids at the median of the longest axis."""
+        vertices = np.asarray(vertices, dtype=np.float64)
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        if not len(faces):
+            raise ValueError("cannot build a BVH for a mesh without faces")
+        corners = vertices[faces]
+        tri_min = corners.min(axis=1)
+        tri_max = corners.max(axis=1)
+        centroids = corners.mean(axis=1)
+
+        order = np.arange(len(faces))
+        bounds, children, first, count = [], [], [], []
+        # (node, start, stop) ranges of ``order`` still to be placed.
+        stack = [(0, 0, len(faces))]
+        bounds.append(None), children.append((-1, -1)), first.append(0), count.append(0)
+        while stack:
+            node, start, stop = stack.pop()
+            members = order[start:stop]
+            bounds[node] = (tri_min[members].min(axis=0), tri_max[members].max(axis=0))
+            if stop - start <= leaf_size:
+                first[node], count[node] = start, stop - start
+                continue
+            c = centroids[members]
+            axis = int(np.argmax(np.ptp(c, axis=0)))
+            half = (stop - start) // 2
+            split = np.argpartition(c[:, axis], half)
+            order[start:stop] = members[split]
+            left, right = len(bounds), len(bounds) + 1
+            for _ in range(2):
+                bounds.append(None), children.append((-1, -1)), first.append(0), count.append(0)
+            children[node] = (left, right)
+            stack.append((left, start, start + half))
+            stack.append((right, start + half, stop))
+
+        first = np.array(first, dtype=np.int64)
+        return cls(
+            vertices=vertices,
+            faces=faces,
+            bounds=np.array([np.stack(b) for b in bounds]),
+            children=np.array(children, dtype=np.int64),
+            first=first,
+            count=np.array(count, dtype=np.int64),
+            triangles=order,
+            # The first vertex of the first triangle under each node.
+            points=vertices[faces[order[_first_leaf_start(np.array(children), first)], 0]],
+        )
+
+    @classmethod
+    def from_mesh(cls, mesh: CompiledMesh, leaf_size: int = LEAF_SIZE) -> "MeshBVH":
+        return cls.build(mesh.positions, mesh.indices, leaf_size)
+
+    @property
+    def is_leaf(self) -> np.ndarray:
+        return self.children[:, 0] < 0
+
+
+def _first_leaf_start(children: np.ndarray, first: np.ndarray) -> np.ndarray:
+    """Start of the leftmost leaf under each node."""
+    start = first.copy()
+    # Children are numbered after their parents, so a reverse pass sees
+    # every child before its parent.
+    for node in range(len(children) - 1, -1, -1):
+        if children[node, 0] >= 0:
+            start[node] = start[children[node, 0]]
+    return start
+
+
+def _box_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Distance between (k, 2, 3) axis-aligned boxes."""
+    gap = np.maximum(0.0, np.maximum(a[:, 0] - b[:, 1], b[:, 0] - a[:, 1]))
+    return np.sqrt(np.einsum("ij,ij->i", gap, gap))
+
+
+def _transform_boxes(matrix: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """Axis-aligned boxes enclosing (k, 2, 3) boxes after an affine ``matrix``."""
+    center = (boxes[:, 0] + boxes[:, 1]) / 2
+    extent = (boxes[:, 1] - boxes[:, 0]) / 2
+    center = center @ matrix[:3, :3].T + matrix[:3, 3]
+    extent = extent @ np.abs(matrix[:3, :3]).T
+    return np.stack([center - extent, center + extent], axis=1)
+
+
+def _dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.einsum("...i,...i->...", a, b)
+
+
+def segment_distances(p1, q1, p2, q2) -> np.ndarray:
+    """Distances between segments p1-q1 and p2-q2 (broadcast over leading axes)."""
+    d1, d2, r = q1 - p1, q2 - p2, p1 - p2
+    a, e = _dot(d1, d1), _dot(d2, d2)
+    b, c, f = _dot(d1, d2), _dot(d1, r), _dot(d2, r)
+    denom = a * e - b * b
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(denom > _EPS, np.clip((b * f - c * e) / denom, 0.0, 1.0), 0.0)
+        # p2-q2 is a point: project it onto p1-q1.
+        s = np.where(e > _EPS, s, np.where(a > _EPS, np.clip(-c / a, 0.0, 1.0), 0.0))
+        t = np.where(e > _EPS, (b * s + f) / e, 0.0)
+        s = np.where(t < 0, np.where(a > _EPS, np.clip(-c / a, 0.0, 1.0), 0.0), s)
+        s = np.where(t > 1, np.where(a > _EPS, np.clip((b - c) / a, 0.0, 1.0), 0.0), s)
+    t = np.clip(t, 0.0, 1.0)
+    diff = p1 + d1 * s[..., None] - p2 - d2 * t[..., None]
+    return np.sqrt(_dot(diff, diff))
+
+
+def _inside(tri: np.ndarray, normal: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Whether points ``q`` in the plane of ``tri`` lie inside it."""
+    inside = np.ones(q.shape[:-1], dtype=bool)
+    for i in range(3):
+        a, b = tri[..., i, :], tri[..., (i + 1) % 3, :]
+        inside &= _dot(np.cross(b - a, q - a), normal) >= 0
+    return inside
+
+
+def _face_distance(points: np.ndarray, tri: np.ndarray) -> np.ndarray:
+    """Distance from (k, 3, 3) points to the interior of (k, 3, 3) triangles.
+
+    Points that do not project inside their triangle give inf; those cases
+    are covered by the edge-edge distances.
+    """
+    normal = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    length = np.sqrt(_dot(normal, normal))
+    unit = normal / np.where(length > _EPS, length, 1.0)[:, None]
+    height = _dot(points - tri[:, None, 0], unit[:, None])
+    projected = points - height[..., None] * unit[:, None]
+    inside = _inside(tri[:, None], unit[:, None], projected) & (length > _EPS)[:, None]
+    return np.where(inside, np.abs(height), np.inf).min(axis=1)
+
+
+def _crossing(tri_a: np.ndarray, tri_b: np.ndarray) -> np.ndarray:
+    """Whether an edge of ``tri_a`` passes through ``tri_b``."""
+    normal = np.cross(tri_b[:, 1] - tri_b[:, 0], tri_b[:, 2] - tri_b[:, 0])
+    height = _dot(tri_a - tri_b[:, None, 0], normal[:, None])
+    start, end = height, np.roll(height, -1, axis=1)
+    crosses = (start * end < 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(crosses, start / (start - end), 0.0)
+    p = tri_a + t[..., None] * (np.roll(tri_a, -1, axis=1) - tri_a)
+    return np.any(crosses & _inside(tri_b[:, None], normal[:, None], p), axis=1)
+
+
+def triangle_distances(tri_a: np.ndarray, tri_b: np.ndarray) -> np.ndarray:
+    """Minimum distances between paired (k, 3, 3) triangles (0 if they intersect)."""
+    # Every edge of a against every edge of b: (k, 3, 3) distances.
+    edge = segment_distances(
+        tri_a[:, :, None], np.roll(tri_a, -1, axis=1)[:, :, None],
+        tri_b[:, None], np.roll(tri_b, -1, axis=1)[:, None],
+    ).reshape(len(tri_a), -1).min(axis=1)
+    distance = np.minimum(edge, np.minimum(_face_distance(tri_a, tri_b), _face_distance(tri_b, tri_a)))
+    return np.where(_crossing(tri_a, tri_b) | _crossing(tri_b, tri_a), 0.0, distance)
+
+
+def _scale(matrix: np.ndarray) -> float:
+    return float(abs(np.linalg.det(matrix[:3, :3])) ** (1.0 / 3.0))
+
+
+def mesh_distance(
+    a: MeshBVH,
+    matrix_a: np.ndarray,
+    b: MeshBVH,
+    matrix_b: np.ndarray,
+    max_distance: float = np.inf,
+) -> float:
+    """Minimum distance between two placed meshes, in scene units.
+
+    Returns inf if the meshes are farther apart than ``max_distance``.
+    """
+    matrix_a = np.asarray(matrix_a, dtype=np.float64)
+    # Work in a's frame; distances there are scene distances / scale_a.
+    scale = _scale(matrix_a)
+    relative = np.linalg.solve(matrix_a, np.asarray(matrix_b, dtype=np.float64))
+    linear, offset = relative[:3, :3], relative[:3, 3]
+    limit = max_distance / scale
+    # Smallest distance actually found; pruning uses min(found, limit).
+    found = np.inf
+
+    pairs_a = np.zeros(1, dtype=np.int64)
+    pairs_b = np.zeros(1, dtype=np.int64)
+    leaves_a, leaves_b, leaves_lower = [], [], []
+    while len(pairs_a):
+        lower = _box_distance(a.bounds[pairs_a], _transform_boxes(relative, b.bounds[pairs_b]))
+        diff = a.points[pairs_a] - (b.points[pairs_b] @ linear.T + offset)
+        found = min(found, float(np.sqrt(_dot(diff, diff)).min()))
+        keep = lower <= min(found, limit)
+        pairs_a, pairs_b = pairs_a[keep], pairs_b[keep]
+
+        leaf_a, leaf_b = a.is_leaf[pairs_a], b.is_leaf[pairs_b]
+        both = leaf_a & leaf_b
+        leaves_a.append(pairs_a[both])
+        leaves_b.append(pairs_b[both])
+        leaves_lower.append(lower[keep][both])
+        pairs_a, pairs_b = pairs_a[~both], pairs_b[~both]
+        leaf_a, leaf_b = leaf_a[~both], leaf_b[~both]
+
+        # Descend into the larger box unless it is a leaf.
+        size_a = np.ptp(a.bounds[pairs_a], axis=1).max(axis=1)
+        size_b = np.ptp(b.bounds[pairs_b], axis=1).max(axis=1) * _scale(relative)
+        split_a = ~leaf_a & (leaf_b | (size_a >= size_b))
+        pairs_a = np.concatenate([
+            a.children[pairs_a[split_a]].ravel(),
+            np.repeat(pairs_a[~split_a], 2),
+        ])
+        pairs_b = np.concatenate([
+            np.repeat(pairs_b[split_a], 2),
+            b.children[pairs_b[~split_a]].ravel(),
+        ])
+
+    # Leaf pairs are resolved last, against the tightest bound found.
+    nodes_a, nodes_b = np.concatenate(leaves_a), np.concatenate(leaves_b)
+    near = np.concatenate(leaves_lower) <= min(found, limit)
+    found = min(found, _leaf_distance(a, nodes_a[near], b, nodes_b[near], relative))
+    return found * scale if found <= limit else np.inf
+
+
+def _leaf_triangles(bvh: MeshBVH, nodes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Triangle ids of every leaf in ``nodes`` and the owning position in ``nodes``."""
+    count = bvh.count[nodes]
+    owner = np.repeat(np.arange(len(nodes)), count)
+    offset = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    return bvh.triangles[np.repeat(bvh.first[nodes], count) + offset], owner
+
+
+def _leaf_distance(a: MeshBVH, nodes_a: np.ndarray, b: MeshBVH, nodes_b: np.ndarray, relative: np.ndarray) -> float:
+    if not len(nodes_a):
+        return np.inf
+    tris_a, owner_a = _leaf_triangles(a, nodes_a)
+    tris_b, owner_b = _leaf_triangles(b, nodes_b)
+    # All triangle pairs within each leaf pair.
+    count_a = np.bincount(owner_a, minlength=len(nodes_a))
+    count_b = np.bincount(owner_b, minlength=len(nodes_b))
+    start_a = np.cumsum(count_a) - count_a
+    start_b = np.cumsum(count_b) - count_b
+    pairs = count_a * count_b
+    leaf = np.repeat(np.arange(len(nodes_a)), pairs)
+    k = np.arange(pairs.sum()) - np.repeat(np.cumsum(pairs) - pairs, pairs)
+    i = start_a[leaf] + k // count_b[leaf]
+    j = start_b[leaf] + k % count_b[leaf]
+    tri_a = a.vertices[a.faces[tris_a[i]]]
+    tri_b = b.vertices[b.faces[tris_b[j]]] @ relative[:3, :3].T + relative[:3, 3]
+    return float(triangle_distances(tri_a, tri_b).min())
+
+
+@dataclass
+class _SceneObject:
+    bvh: MeshBVH
+    matrix: np.ndarray
+    group: str | None
+    world_bounds: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self.world_bounds = _transform_boxes(self.matrix, self.bvh.bounds[:1])[0]
+
+
+class CollisionScene:
+    """Placed meshes whose pairwise clearances are tracked as they move.
+
+    Objects in the same ``group`` (e.g. a probe and its holder) are never
+    tested against each other.
+    """
+
+    def __init__(self):
+        self.objects: dict[str, _SceneObject] = {}
+
+    def add(self, name: str, bvh: MeshBVH, matrix: np.ndarray | None = None, group: str | None = None) -> None:
+        matrix = np.eye(4) if matrix is None else np.asarray(matrix, dtype=np.float64)
+        self.objects[name] = _SceneObject(bvh, matrix, group)
+
+    def move(self, name: str, matrix: np.ndarray) -> None:
+        """Place object ``name`` with a new matrix."""
+        obj = self.objects[name]
+        self.objects[name] = _SceneObject(obj.bvh, np.asarray(matrix, dtype=np.float64), obj.group)
+
+    def remove(self, name: str) -> None:
+        del self.objects[name]
+
+    def candidate_pairs(self, max_distance: float = np.inf) -> list[tuple[str, str]]:
+        """Pairs whose world boxes come within ``max_distance`` (sweep and prune on AP)."""
+        names = list(self.objects)
+        if not names:
+            return []
+        margin = max_distance / 2 if np.isfinite(max_distance) else np.inf
+        bounds = np.stack([self.objects[name].world_bounds for name in names])
+        lo, hi = bounds[:, 0] - margin, bounds[:, 1] + margin
+        order = np.argsort(lo[:, 0], kind="stable")
+        pairs = []
+        for rank, i in enumerate(order):
+            for j in order[rank + 1:]:
+                if lo[j, 0] > hi[i, 0]:
+                    break
+                if np.all(lo[j, 1:] <= hi[i, 1:]) and np.all(lo[i, 1:] <= hi[j, 1:]):
+                    group_i, group_j = self.objects[names[i]].group, self.objects[names[j]].group
+                    if group_i is None or group_i != group_j:
+                        pairs.append((names[min(i, j)], names[max(i, j)]))
+        return pairs
+
+    def clearances(self, max_distance: float = np.inf) -> dict[tuple[str, str], float]:
+        """Minimum distance between every pair of objects (0 where they collide).
+
+        Pairs farther apart than ``max_distance`` are left out.
+        """
+        result = {}
+        for first, second in self.candidate_pairs(max_distance):
+            a, b = self.objects[first], self.objects[second]
+            distance = mesh_distance(a.bvh, a.matrix, b.bvh, b.matrix, max_distance)
+            if distance <= max_distance:
+                result[first, second] = distance
+        return result
+
+    def collisions(self, clearance: float = 0.0) -> list[tuple[str, str]]:
+        """Pairs closer than ``clearance`` (touching or intersecting pairs for 0)."""
+        return [pair for pair, distance in self.clearances(clearance).items() if distance <= clearance]
@@ -0,0 +1,139 @@
+"""Non-linear deformation field atlas transforms.
+
+A deformation field stores a displacement vector (in mm) on a regular grid
+over atlas space, e.g. the CCF 25 µm grid. The forward transform maps an
+atlas point ``p`` into the individual (transformed) space as ``p + u(p)``,
+with ``u`` trilinearly interpolated; points outside the grid are not
+displaced. The inverse is approximated by the fixed-point iteration
+``q <- y - u(q)``.
+
+Fields are stored in chunks of ``chunk**3`` voxels so that neighbouring
+voxels share disk pages, and are memory-mapped: sampling a few thousand
+channel positions only pages in the chunks those positions touch.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Callable
+
+import numpy as np
+
+from ._binary import create_arrays, read_arrays
+
+MAGIC = b"PLDEFORM"
+VERSION = 1
+DEFAULT_CHUNK = 32
+
+_CORNERS = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)])
+# Voxel coordinates of grid points can round just past the boundary voxel.
+_EPS = 1e-9
+
+
+def _chunk_counts(shape, chunk: int) -> np.ndarray:
+    return -(-np.asarray(shape, dtype=np.int64) // chunk)
+
+
+def write_deformation_field(
+    path: str | os.PathLike,
+    displacement: np.ndarray | Callable[[tuple[slice, slice, slice]], np.ndarray],
+    shape: tuple[int, int, int] | None = None,
+    origin=(0.0, 0.0, 0.0),
+    spacing=(0.025, 0.025, 0.025),
+    chunk: int = DEFAULT_CHUNK,
+) -> None:
+    """Write a chunked deformation field.
+
+    ``displacement`` is an (X, Y, Z, 3) array in mm, which may itself be a
+    memory map, or a callable returning the (x, y, z, 3) block for a tuple
+    of slices, in which case ``shape`` must be given. Either way the field
+    is written one chunk at a time. ``origin`` and ``spacing`` give the mm
+    coordinates of voxel (0, 0, 0) and the voxel size along each axis.
+    """
+    if callable(displacement):
+        if shape is None:
+            raise ValueError("shape is required when displacement is a callable")
+        read_block = displacement
+    else:
+        shape = displacement.shape[:3]
+        read_block = displacement.__getitem__
+    counts = _chunk_counts(shape, chunk)
+    with create_arrays(
+        path,
+        MAGIC,
+        VERSION,
+        {
+            "grid": ((3, 3), np.float64),
+            "layout": ((2, 3), np.int64),
+            "displacement": ((int(np.prod(counts)) * chunk**3, 3), np.float32),
+        },
+    ) as arrays:
+        arrays["grid"][:] = [shape, origin, spacing]
+        arrays["layout"][:] = [counts, (chunk, chunk, chunk)]
+
+        blocks = arrays["displacement"].reshape(*counts, chunk, chunk, chunk, 3)
+        for ci in range(counts[0]):
+            for cj in range(counts[1]):
+                for ck in range(counts[2]):
+                    window = tuple(
+                        slice(c * chunk, min((c + 1) * chunk, n)) for c, n in zip((ci, cj, ck), shape)
+                    )
+                    block = np.asarray(read_block(window), dtype=np.float32)
+                    blocks[ci, cj, ck, : block.shape[0], : block.shape[1], : block.shape[2]] = block
+
+
+class DeformationField:
+    """Memory-mapped deformation field with batched trilinear sampling."""
+
+    def __init__(self, path: str | os.PathLike):
+        arrays, _ = read_arrays(path, MAGIC, VERSION)
+        shape, self.origin, self.spacing = np.array(arrays["grid"])
+        self.shape = shape.astype(np.int64)
+        counts, chunk = np.array(arrays["layout"])
+        self.chunk = int(chunk[0])
+        self._counts = counts
+        self._displacement = arrays["displacement"]
+
+    def _flat_index(self, voxel: np.ndarray) -> np.ndarray:
+        c = self.chunk
+        block, within = np.divmod(voxel, c)
+        block_id = (block[..., 0] * self._counts[1] + block[..., 1]) * self._counts[2] + block[..., 2]
+        return block_id * c**3 + (within[..., 0] * c + within[..., 1]) * c + within[..., 2]
+
+    def displacement(self, points: np.ndarray) -> np.ndarray:
+        """Trilinearly interpolate the displacement at (..., 3) points."""
+        points = np.asarray(points, dtype=np.float64)
+        flat = points.reshape(-1, 3)
+        voxel = (flat - self.origin) / self.spacing
+        inside = np.all((voxel >= -_EPS) & (voxel <= self.shape - 1 + _EPS), axis=1)
+        base = np.clip(np.floor(voxel), 0, np.maximum(self.shape - 2, 0)).astype(np.int64)
+        frac = np.clip(voxel - base, 0.0, 1.0)
+
+        corners = np.minimum(base[:, None, :] + _CORNERS, self.shape - 1)
+        values = self._displacement[self._flat_index(corners).ravel()].reshape(-1, 8, 3)
+        weights = np.prod(np.where(_CORNERS, frac[:, None, :], 1.0 - frac[:, None, :]), axis=2)
+        result = np.einsum("nc,nck->nk", weights, values)
+        result[~inside] = 0.0
+        return result.reshape(points.shape)
+
+    def to_transformed(self, points: np.ndarray) -> np.ndarray:
+        """Map (..., 3) atlas points into the deformed space."""
+        points = np.asarray(points, dtype=np.float64)
+        return points + self.displacement(points)
+
+    def to_atlas(self, points: np.ndarray, iterations: int = 20, tolerance: float = 1e-6) -> np.ndarray:
+        """Approximately invert :meth:`to_transformed` by fixed-point iteration.
+
+        Iterates ``q <- y - u(q)`` until every point moves less than
+        ``tolerance`` mm or ``iterations`` is reached. This converges when
+        the field is smooth relative to its magnitude (|grad u| < 1).
+        """
+        target = np.asarray(points, dtype=np.float64)
+        estimate = target.copy()
+        for _ in range(iterations):
+            updated = target - self.displacement(estimate)
+            step = np.max(np.abs(updated - estimate), initial=0.0)
+            estimate = updated
+            if step < tolerance:
+                break
+        return estimate
@@ -0,0 +1,233 @@
+"""Nearest-neighbor search over historical insertions.
+
+Insertions are first normalized to absolute atlas coordinates
+(:meth:`InsertionTable.world_matrices`), so records made in different
+transformed spaces are compared in one frame. Two indexes are kept:
+
+* a KD-tree over the tip positions;
+* a segment index over the trajectories (tip to ``length_um`` up the
+  shank): each trajectory is sampled every ``step`` mm and the samples go
+  in a KD-tree. A query first collects the trajectories with a sample
+  within ``radius + step / 2``, a superset of those within ``radius``,
+  then keeps those whose exact segment distance qualifies.
+
+New insertions go to a small pending set that is searched by brute force
+and merged into the trees once it grows past a fraction of their size, so
+logging an insertion does not rebuild the index. KD-trees come from
+scipy.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from .collision import segment_distances
+from .insertion_table import InsertionTable
+from .transforms import apply_matrices
+
+DEFAULT_LENGTH_UM = 10000.0
+DEFAULT_STEP_MM = 0.1
+MIN_PENDING = 256
+
+
+def trajectory_segments(table: InsertionTable, length_um: float = DEFAULT_LENGTH_UM) -> tuple[np.ndarray, np.ndarray]:
+    """(N, 3) tips and (N, 3) trajectory ends in absolute atlas mm."""
+    ends = apply_matrices(table.world_matrices(), np.array([[0.0, 0.0, 0.0], [0.0, length_um, 0.0]]), dtype=np.float64)
+    return ends[:, 0], ends[:, 1]
+
+
+class _PointSet:
+    """Labeled points in a KD-tree plus a brute-force pending buffer."""
+
+    def __init__(self, rebuild_fraction: float):
+        self.rebuild_fraction = rebuild_fraction
+        self.points = np.empty((0, 3))
+        self.labels = np.empty(0, dtype=np.int64)
+        self.tree = None
+        self.built = 0
+
+    def add(self, points: np.ndarray, labels: np.ndarray) -> None:
+        self.points = np.concatenate([self.points, points])
+        self.labels = np.concatenate([self.labels, labels])
+        if len(self.points) - self.built > max(MIN_PENDING, self.rebuild_fraction * self.built):
+            self.rebuild()
+
+    def rebuild(self) -> None:
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            raise ImportError("the insertion index requires scipy") from None
+        self.tree = cKDTree(self.points) if len(self.points) else None
+        self.built = len(self.points)
+
+    def nearest(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """(Q, k) distances and labels of the nearest points (inf / -1 padding)."""
+        distances = [np.full((len(queries), 0), np.inf)]
+        labels = [np.empty((len(queries), 0), dtype=np.int64)]
+        if self.built:
+            d, i = self.tree.query(queries, k=min(k, self.built))
+            d, i = d.reshape(len(queries), -1), i.reshape(len(queries), -1)
+            distances.append(d)
+            labels.append(self.labels[i])
+        pending = self.points[self.built:]
+        if len(pending):
+            d = np.linalg.norm(queries[:, None] - pending[None], axis=-1)
+            i = np.broadcast_to(np.arange(len(pending)), d.shape)
+            if len(pending) > k:
+                i = np.argpartition(d, k - 1, axis=1)[:, :k]
+                d = np.take_along_axis(d, i, 1)
+            distances.append(d)
+            labels.append(self.labels[self.built:][i])
+        distances = np.concatenate(distances, axis=1)
+        labels = np.concatenate(labels, axis=1)
+        if distances.shape[1] < k:
+            pad = k - distances.shape[1]
+            distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=np.inf)
+            labels = np.pad(labels, ((0, 0), (0, pad)), constant_values=-1)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, 1), np.take_along_axis(labels, order, 1)
+
+    def within(self, queries: np.ndarray, radius) -> list[np.ndarray]:
+        """Distinct labels of the points within ``radius`` of each query."""
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), (len(queries),))
+        hits = [[] for _ in range(len(queries))]
+        if self.built:
+            for q, rows in enumerate(self.tree.query_ball_point(queries, radius)):
+                hits[q].append(self.labels[np.asarray(rows, dtype=np.int64)])
+        pending = self.points[self.built:]
+        if len(pending):
+            close = np.linalg.norm(queries[:, None] - pending[None], axis=-1) <= radius[:, None]
+            for q in np.flatnonzero(close.any(axis=1)):
+                hits[q].append(self.labels[self.built:][close[q]])
+        return [np.unique(np.concatenate(h)) if h else np.empty(0, dtype=np.int64) for h in hits]
+
+
+class InsertionIndex:
+    """Tip and trajectory index over insertions, keyed by insertion id.
+
+    Ids are row numbers in the order insertions were added. Query points
+    are absolute atlas mm, e.g. ``InsertionTable.world_tips()``.
+
+    Parameters
+    ----------
+    table : InsertionTable, optional
+        Insertions to index initially.
+    length_um : float
+        Trajectory length up the shank from the tip.
+    step : float
+        Trajectory sample spacing in mm.
+    rebuild_fraction : float
+        Pending insertions, as a fraction of the indexed ones, that trigger
+        a rebuild of the trees.
+    """
+
+    def __init__(
+        self,
+        table: InsertionTable | None = None,
+        length_um: float = DEFAULT_LENGTH_UM,
+        step: float = DEFAULT_STEP_MM,
+        rebuild_fraction: float = 0.25,
+    ):
+        self.length_um = length_um
+        self.step = step
+        self.tips = np.empty((0, 3))
+        self.ends = np.empty((0, 3))
+        self._tips = _PointSet(rebuild_fraction)
+        self._samples = _PointSet(rebuild_fraction)
+        if table is not None:
+            self.add(table)
+
+    def __len__(self) -> int:
+        return len(self.tips)
+
+    def add(self, table: InsertionTable) -> np.ndarray:
+        """Index the insertions in ``table``; returns their ids."""
+        tips, ends = trajectory_segments(table, self.length_um)
+        ids = np.arange(len(self), len(self) + len(tips))
+        self.tips = np.concatenate([self.tips, tips])
+        self.ends = np.concatenate([self.ends, ends])
+        self._tips.add(tips, ids)
+        t = np.linspace(0.0, 1.0, self._n_samples)
+        samples = tips[:, None] + t[None, :, None] * (ends - tips)[:, None]
+        self._samples.add(samples.reshape(-1, 3), np.repeat(ids, self._n_samples))
+        return ids
+
+    @property
+    def _n_samples(self) -> int:
+        return max(int(np.ceil(self.length_um / 1000.0 / self.step)) + 1, 2)
+
+    @property
+    def _half_step(self) -> float:
+        """Largest distance from a trajectory point to its nearest sample."""
+        return self.length_um / 1000.0 / (self._n_samples - 1) / 2
+
+    def nearest_tips(self, points: np.ndarray, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """(Q, k) distances and ids of the insertions with the nearest tips.
+
+        Missing neighbors (fewer than k insertions) are inf / -1.
+        """
+        return self._tips.nearest(np.atleast_2d(np.asarray(points, dtype=np.float64)), k)
+
+    def tips_within(self, points: np.ndarray, radius: float) -> list[np.ndarray]:
+        """Ids of the insertions whose tips are within ``radius`` of each point."""
+        return self._tips.within(np.atleast_2d(np.asarray(points, dtype=np.float64)), radius)
+
+    def trajectory_distances(self, start: np.ndarray, end: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Exact distances from segment ``start``-``end`` to the trajectories ``ids``."""
+        return segment_distances(start, end, self.tips[ids], self.ends[ids])
+
+    def trajectories_within(
+        self, start: np.ndarray, radius: float, end: np.ndarray | None = None
+    ) -> list[np.ndarray]:
+        """Ids of the trajectories within ``radius`` of each query, nearest first.
+
+        Queries are (Q, 3) points, or segments from ``start`` to ``end``
+        (e.g. a planned trajectory, to find earlier insertions close to it).
+        """
+        start = np.atleast_2d(np.asarray(start, dtype=np.float64))
+        end = start if end is None else np.atleast_2d(np.asarray(end, dtype=np.float64))
+        # Query segments are sampled too, so a sample pair lies within
+        # radius plus both half spacings of any closer pair of points.
+        lengths = np.linalg.norm(end - start, axis=1)
+        counts = np.ceil(lengths / self.step).astype(np.int64) + 1
+        owner = np.repeat(np.arange(len(start)), counts)
+        offsets = np.cumsum(counts) - counts
+        t = (np.arange(counts.sum()) - offsets[owner]) / np.maximum(counts - 1, 1)[owner]
+        samples = start[owner] + t[:, None] * (end - start)[owner]
+        reach = radius + self._half_step + (lengths / np.maximum(counts - 1, 1) / 2)[owner]
+
+        candidates = self._samples.within(samples, reach)
+        result = []
+        for q, first in enumerate(offsets.tolist()):
+            ids = np.unique(np.concatenate([np.empty(0, dtype=np.int64), *candidates[first:first + counts[q]]]))
+            distances = self.trajectory_distances(start[q], end[q], ids)
+            keep = distances <= radius
+            result.append(ids[keep][np.argsort(distances[keep], kind="stable")])
+        return result
+
+    def nearest_trajectories(self, points: np.ndarray, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """(Q, k) distances and ids of the trajectories nearest each point.
+
+        Missing neighbors (fewer than k insertions) are inf / -1.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        distances = np.full((len(points), k), np.inf)
+        ids = np.full((len(points), k), -1, dtype=np.int64)
+        if not len(self):
+            return distances, ids
+        # The trajectories through the nearest tips and samples give at
+        # least k candidates; the k-th smallest exact distance among them
+        # bounds the search radius for the exact answer.
+        _, near_tips = self._tips.nearest(points, k)
+        _, near_samples = self._samples.nearest(points, k)
+        candidates = np.sort(np.concatenate([near_tips, near_samples], axis=1), axis=1)
+        bounds = segment_distances(points[:, None], points[:, None], self.tips[candidates], self.ends[candidates])
+        bounds[candidates < 0] = np.inf
+        bounds[:, 1:][candidates[:, 1:] == candidates[:, :-1]] = np.inf
+        bounds = np.sort(bounds, axis=1)[:, min(k, len(self)) - 1]
+        for q, found in enumerate(self._samples.within(points, bounds + self._half_step)):
+            d = self.trajectory_distances(points[q], points[q], found)
+            order = np.argsort(d, kind="stable")[:k]
+            distances[q, :len(order)] = d[order]
+            ids[q, :len(order)] = found[order]
+        return distances, ids
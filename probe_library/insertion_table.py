@@ -0,0 +1,228 @@
+"""Columnar tables of probe insertions for experiment databases.
+
+An :class:`InsertionTable` holds N insertions as a float64 (9, N) array
+(AP, ML, DV, Yaw, Pitch, Roll, RefAP, RefML, RefDV) and int32 (3, N) codes
+for the atlas, transform and probe names, each dictionary-encoded against
+a small table of distinct names. Filtering compares whole columns,
+grouping sorts the codes once, and conversion to world coordinates
+applies one inverse atlas transform per transform group.
+
+Tables are saved in the array container used by the channel map sidecars
+(magic ``PLINSERT``), so a database of hundreds of thousands of insertions
+is memory-mapped on load rather than parsed.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Iterator, Mapping, Sequence
+
+import numpy as np
+
+from ._binary import decode_strings, encode_strings, read_arrays, write_arrays
+from .atlas_transform import get_transform
+from .schema import INSERTION_FIELDS, Insertion, insertion_columns, read_insertion_records
+from .transforms import insertion_matrices
+
+MAGIC = b"PLINSERT"
+VERSION = 1
+SUFFIX = ".insertions"
+
+VALUE_COLUMNS = ("ap", "ml", "dv", "yaw", "pitch", "roll", "ref_ap", "ref_ml", "ref_dv")
+NAME_COLUMNS = ("atlas_name", "transform_name", "probe_name")
+
+_FIELD_ORDER = [attribute for attribute, *_ in INSERTION_FIELDS]
+_VALUE_FIELDS = [_FIELD_ORDER.index(name) for name in VALUE_COLUMNS]
+_NAME_FIELDS = [_FIELD_ORDER.index(name) for name in NAME_COLUMNS]
+
+
+def _encode(names: Sequence[str]) -> tuple[list[str], np.ndarray]:
+    """Dictionary-encode ``names`` into (distinct names, int32 codes)."""
+    table: dict[str, int] = {}
+    codes = np.fromiter(
+        (table.setdefault(name, len(table)) for name in names), dtype=np.int32, count=len(names)
+    )
+    return list(table), codes
+
+
+class InsertionTable:
+    """Struct-of-arrays table of probe insertions.
+
+    Parameters
+    ----------
+    values : (9, N) float64 array
+        Rows :data:`VALUE_COLUMNS`, in mm and degrees.
+    codes : (3, N) int32 array
+        Rows :data:`NAME_COLUMNS`, indexing ``names``.
+    names : sequence of three sequences of str
+        Distinct atlas, transform and probe names.
+    """
+
+    __slots__ = ("values", "codes", "names", "_rows")
+
+    def __init__(self, values: np.ndarray, codes: np.ndarray, names: Sequence[Sequence[str]]):
+        self.values = values
+        self.codes = codes
+        self.names = tuple(tuple(table) for table in names)
+        self._rows = [{name: row for row, name in enumerate(table)} for table in self.names]
+
+    def __len__(self) -> int:
+        return self.values.shape[1]
+
+    def __repr__(self) -> str:
+        return f"InsertionTable({len(self)} insertions, atlases={list(self.names[0])})"
+
+    @classmethod
+    def from_records(cls, records: Sequence[Mapping[str, Any]]) -> "InsertionTable":
+        """Build a table from insertion JSON records, validated column-wise."""
+        columns = insertion_columns(records)
+        values = np.stack([columns[i] for i in _VALUE_FIELDS]).reshape(len(VALUE_COLUMNS), len(records))
+        names, codes = zip(*(_encode(columns[i]) for i in _NAME_FIELDS))
+        return cls(values, np.stack(codes).reshape(len(NAME_COLUMNS), len(records)), names)
+
+    @classmethod
+    def from_insertions(cls, insertions: Sequence[Insertion]) -> "InsertionTable":
+        return cls.from_records([insertion.to_json() for insertion in insertions])
+
+    @classmethod
+    def load_log(cls, path: str | os.PathLike) -> "InsertionTable":
+        """Build a table from an experiment log of insertion JSON records."""
+        return cls.from_records(read_insertion_records(path))
+
+    def column(self, name: str) -> np.ndarray:
+        """Column ``name``: a float64 view for values, decoded strings for names."""
+        if name in VALUE_COLUMNS:
+            return self.values[VALUE_COLUMNS.index(name)]
+        if name in NAME_COLUMNS:
+            row = NAME_COLUMNS.index(name)
+            return np.asarray(self.names[row], dtype=str)[self.codes[row]]
+        raise KeyError(f"unknown column {name!r}")
+
+    @property
+    def tip(self) -> np.ndarray:
+        """(N, 3) tip (AP, ML, DV) relative to each insertion's reference."""
+        return self.values[0:3].T
+
+    @property
+    def angles(self) -> np.ndarray:
+        """(N, 3) yaw, pitch, roll."""
+        return self.values[3:6].T
+
+    @property
+    def reference(self) -> np.ndarray:
+        """(N, 3) reference coordinate (RefAP, RefML, RefDV) in atlas mm."""
+        return self.values[6:9].T
+
+    def code(self, column: str, name: str) -> int:
+        """Code of ``name`` in name column ``column``; -1 if it does not occur."""
+        return self._rows[NAME_COLUMNS.index(column)].get(name, -1)
+
+    def select(self, **conditions: Any) -> np.ndarray:
+        """Boolean mask of the insertions matching every condition.
+
+        Name columns take a name or a collection of names; value columns
+        take a ``(low, high)`` inclusive range (either end may be None),
+        e.g. ``select(atlas_name="CCF", ap=(1.0, 3.0))``.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for column, condition in conditions.items():
+            if column in NAME_COLUMNS:
+                row = NAME_COLUMNS.index(column)
+                wanted = [condition] if isinstance(condition, str) else list(condition)
+                codes = [self.code(column, name) for name in wanted]
+                mask &= np.isin(self.codes[row], [c for c in codes if c >= 0])
+            elif column in VALUE_COLUMNS:
+                low, high = condition
+                values = self.values[VALUE_COLUMNS.index(column)]
+                if low is not None:
+                    mask &= values >= low
+                if high is not None:
+                    mask &= values <= high
+            else:
+                raise KeyError(f"unknown column {column!r}")
+        return mask
+
+    def __getitem__(self, index) -> "InsertionTable":
+        """Rows selected by a mask, index array or slice; name tables are shared."""
+        return InsertionTable(self.values[:, index], self.codes[:, index], self.names)
+
+    def filter(self, **conditions: Any) -> "InsertionTable":
+        return self[self.select(**conditions)]
+
+    def groups(self, column: str) -> Iterator[tuple[str, np.ndarray]]:
+        """(name, row indices) for each name that occurs in name column ``column``."""
+        codes = self.codes[NAME_COLUMNS.index(column)]
+        order = np.argsort(codes, kind="stable")
+        present, starts = np.unique(codes[order], return_index=True)
+        table = self.names[NAME_COLUMNS.index(column)]
+        for code, rows in zip(present.tolist(), np.split(order, starts[1:])):
+            yield table[code], rows
+
+    def group_by(self, column: str) -> dict[str, "InsertionTable"]:
+        return {name: self[rows] for name, rows in self.groups(column)}
+
+    def world_matrices(self) -> np.ndarray:
+        """(N, 4, 4) matrices from probe-local µm to absolute atlas mm.
+
+        Each insertion is mapped out of its transformed space with the
+        inverse of its atlas transform and offset by its reference
+        coordinate, so insertions from different transforms share one
+        frame.
+        """
+        matrices = insertion_matrices(*self.values[:6])
+        for name, rows in self.groups("transform_name"):
+            matrices[rows] = get_transform(name).inverse @ matrices[rows]
+        matrices[:, :3, 3] += self.reference
+        return matrices
+
+    def world_tips(self) -> np.ndarray:
+        """(N, 3) tip positions in absolute atlas mm (see :meth:`world_matrices`)."""
+        tips = np.empty((len(self), 3))
+        for name, rows in self.groups("transform_name"):
+            transform = get_transform(name)
+            tips[rows] = transform.to_atlas(self.tip[rows])
+        return tips + self.reference
+
+    def records(self) -> list[dict[str, Any]]:
+        """Insertion JSON records with native numbers."""
+        return [insertion.to_json() for insertion in self.insertions()]
+
+    def insertions(self) -> list[Insertion]:
+        columns = [None] * len(_FIELD_ORDER)
+        for row, field in enumerate(_VALUE_FIELDS):
+            columns[field] = self.values[row].tolist()
+        for row, field in enumerate(_NAME_FIELDS):
+            columns[field] = [self.names[row][code] for code in self.codes[row].tolist()]
+        return [Insertion(*values) for values in zip(*columns)]
+
+    def concat(self, other: "InsertionTable") -> "InsertionTable":
+        """A table with the rows of ``other`` appended, merging name tables."""
+        names, codes = [], []
+        for row in range(len(NAME_COLUMNS)):
+            merged = dict(self._rows[row])
+            for name in other.names[row]:
+                merged.setdefault(name, len(merged))
+            remap = np.array([merged[name] for name in other.names[row]], dtype=np.int32)
+            names.append(list(merged))
+            codes.append(np.concatenate([self.codes[row], remap[other.codes[row]]]))
+        return InsertionTable(np.concatenate([self.values, other.values], axis=1), np.stack(codes), names)
+
+
+def save_table(path: str | os.PathLike, table: InsertionTable) -> None:
+    """Atomically write ``table`` to ``path``."""
+    arrays = {
+        "values": np.ascontiguousarray(table.values, dtype=np.float64),
+        "codes": np.ascontiguousarray(table.codes, dtype=np.int32),
+        "name_counts": np.array([len(names) for names in table.names], dtype=np.int64),
+    }
+    for column, names in zip(NAME_COLUMNS, table.names):
+        arrays[column] = encode_strings(names)
+    write_arrays(path, MAGIC, VERSION, arrays)
+
+
+def load_table(path: str | os.PathLike) -> InsertionTable:
+    """Memory-map a table written by :func:`save_table`."""
+    arrays, _ = read_arrays(path, MAGIC, VERSION)
+    counts = arrays["name_counts"].tolist()
+    names = [decode_strings(arrays[column], count) for column, count in zip(NAME_COLUMNS, counts)]
+    return InsertionTable(arrays["values"], arrays["codes"], names)
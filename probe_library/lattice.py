@@ -0,0 +1,234 @@
+"""Parametric storage of regular channel map geometry.
+
+Neuropixels-style maps are lattices: along each shank the geometry row of
+site ``j`` (x, y, z, w, h, d) is ``offsets[j % P] + (j // P) * pitch`` for a
+small period ``P`` (four for the Neuropixels 1.0 checkerboard, whose x
+repeats -14, 18, -30, 2 while y steps 20 µm every two sites). A
+:class:`SiteLattice` splits the sites, in file order, into segments; each
+segment is either such a lattice, stored as ``P`` offset rows and one pitch
+row, or an explicit block of rows for irregular stretches. A 10k-site
+lattice shank then takes a few hundred bytes instead of 240 kB, and a site's
+geometry is computed from its segment's parameters rather than gathered
+from a full array.
+
+Lattice parameters are float64 and are fitted as the shortest decimals of
+the CSV values, so a fractional pitch such as 15.3 µm generates rows that
+round to the same float32 values as the CSV instead of drifting by an ulp
+every few sites. Segments are accepted only where the float32 rows they
+produce equal the original rows exactly, so :meth:`SiteLattice.expand` (and
+writing the expanded map with
+:func:`~probe_library.channel_map.save_channel_map`) reproduces the CSV.
+Geometry that is not decimal-regular (e.g. pitches computed in float32
+arithmetic) still compresses, but may be split into several segments.
+"""
+
+from __future__ import annotations
+
+from typing import Mapping
+
+import numpy as np
+
+MAX_PERIOD = 16
+# A lattice segment must repeat its period at least this many times.
+MIN_REPEATS = 2
+
+ARRAY_NAMES = ("lattice_starts", "lattice_periods", "lattice_row_starts", "lattice_rows", "lattice_index")
+
+
+def _lattice_rows(rows: np.ndarray, period: int, count: int) -> np.ndarray:
+    """``count`` float32 rows generated by ``period`` offset rows and a pitch row."""
+    j = np.arange(count)
+    offsets = rows[:period].astype(np.float64)
+    pitch = rows[period].astype(np.float64)
+    return (offsets[j % period] + (j // period)[:, None] * pitch).astype(np.float32)
+
+
+def _decimal(values: np.ndarray) -> np.ndarray:
+    """float64 of the shortest decimal that reads back as each float32 value (``15.3``, not ``15.300000190734863``)."""
+    return np.array(
+        [float(np.format_float_positional(v, trim="-")) for v in np.asarray(values, dtype=np.float32).ravel()]
+    ).reshape(np.shape(values))
+
+
+def _run_ends(rows: np.ndarray, period: int, tolerance: np.ndarray) -> np.ndarray:
+    """For each site j, the end of the run of sites from j with a near-constant period-``period`` step.
+
+    Sites j..end-1 satisfy ``rows[i + period] - rows[i] ~= rows[j + period] - rows[j]``
+    for i < end - period, up to ``tolerance`` per column: float32 rounding
+    makes the steps of a fractional pitch differ by an ulp.
+    """
+    n = len(rows)
+    step = rows[period:] - rows[:n - period]
+    breaks = np.flatnonzero(np.any(np.abs(step[1:] - step[:-1]) > tolerance, axis=1)) + 1
+    ends = np.append(breaks, len(step))
+    # The step run containing j ends at the first break after j.
+    run_end = ends[np.searchsorted(ends, np.arange(len(step)), side="right")]
+    return np.append(run_end + period, np.full(period, n))
+
+
+def _exact_count(rows: np.ndarray, start: int, parameters: np.ndarray, count: int) -> int:
+    """How many of the ``count`` sites from ``start`` the lattice ``parameters`` reproduce exactly."""
+    generated = _lattice_rows(parameters, len(parameters) - 1, count)
+    mismatch = np.flatnonzero(np.any(generated != rows[start:start + count], axis=1))
+    return int(mismatch[0]) if len(mismatch) else count
+
+
+def _fit_segment(rows: np.ndarray, start: int, period: int, count: int) -> tuple[np.ndarray, int]:
+    """Best lattice parameters for the ``count`` sites from ``start`` and how many they reproduce.
+
+    The pitch measured between the first and last cycle is rounded to its
+    shortest decimal, like the offsets, so a pitch such as 15.3 µm is
+    stored as the float64 15.3 and every generated row rounds to the same
+    float32 as the CSV value. The plain float32 first step is tried as well.
+    """
+    offsets = rows[start:start + period].astype(np.float64)
+    cycles = (count - 1) // period
+    pitch = (rows[start + cycles * period].astype(np.float64) - offsets[0]) / cycles
+    candidates = [
+        np.vstack([_decimal(offsets), _decimal(pitch)]),
+        np.vstack([offsets, rows[start + period].astype(np.float64) - offsets[0]]),
+    ]
+    counts = [_exact_count(rows, start, parameters, count) for parameters in candidates]
+    best = int(np.argmax(counts))
+    return candidates[best], counts[best]
+
+
+class SiteLattice:
+    """Channel map geometry as lattice and explicit segments.
+
+    Parameters
+    ----------
+    starts : (S + 1,) int64 array
+        First site of each segment, then the number of sites.
+    periods : (S,) int32 array
+        Lattice period of each segment; 0 for explicit segments.
+    row_starts : (S,) int64 array
+        First row of each segment in ``rows``: ``P`` offset rows and a
+        pitch row for lattices, one row per site otherwise.
+    rows : (R, 6) float64 array
+        x, y, z, w, h, d parameter rows. Lattice parameters are decimal
+        values such as 15.3 rather than their float32 roundings.
+    index : (n,) int32 array or (1,) int32 array
+        Channel indices, or just the first one when they are consecutive.
+    """
+
+    __slots__ = ("starts", "periods", "row_starts", "rows", "index")
+
+    def __init__(
+        self,
+        starts: np.ndarray,
+        periods: np.ndarray,
+        row_starts: np.ndarray,
+        rows: np.ndarray,
+        index: np.ndarray,
+    ):
+        self.starts = starts
+        self.periods = periods
+        self.row_starts = row_starts
+        self.rows = rows
+        self.index = index
+
+    def __len__(self) -> int:
+        return int(self.starts[-1])
+
+    def __repr__(self) -> str:
+        regular = int(np.sum(np.diff(self.starts)[self.periods > 0]))
+        return f"SiteLattice({len(self)} sites, {regular} on lattices, {len(self.periods)} segments, {self.nbytes} bytes)"
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    @classmethod
+    def fit(cls, index: np.ndarray, geometry: np.ndarray, max_period: int = MAX_PERIOD) -> "SiteLattice":
+        """Detect lattice segments in (6, n) ``geometry``, in site order."""
+        rows = np.ascontiguousarray(np.asarray(geometry, dtype=np.float32).T)
+        n = len(rows)
+        periods_tried = range(1, min(max_period, n // MIN_REPEATS) + 1)
+        wide = rows.astype(np.float64)
+        # Steps may differ by float32 rounding: a few ulps of the largest value per column.
+        tolerance = 4 * np.spacing(np.abs(rows).max(axis=0, initial=0)).astype(np.float64)
+        run_ends = {period: _run_ends(wide, period, tolerance) for period in periods_tried}
+        starts, periods, parameters = [], [], []
+        explicit = 0
+        position = 0
+        while position < n:
+            best_period, best_count, best_rows = 0, 0, None
+            for period in periods_tried:
+                minimum = max(MIN_REPEATS * period, period + 2)
+                count = int(run_ends[period][position]) - position
+                if count >= minimum and count > best_count:
+                    segment, count = _fit_segment(rows, position, period, count)
+                    if count >= minimum and count > best_count:
+                        best_period, best_count, best_rows = period, count, segment
+            if best_period:
+                if position > explicit:
+                    starts.append(explicit)
+                    periods.append(0)
+                    parameters.append(wide[explicit:position])
+                starts.append(position)
+                periods.append(best_period)
+                parameters.append(best_rows)
+                position += best_count
+                explicit = position
+            else:
+                position += 1
+        if n > explicit:
+            starts.append(explicit)
+            periods.append(0)
+            parameters.append(wide[explicit:n])
+
+        index = np.asarray(index, dtype=np.int32)
+        consecutive = n > 0 and np.array_equal(index, index[0] + np.arange(n, dtype=np.int32))
+        sizes = np.array([len(p) for p in parameters], dtype=np.int64)
+        return cls(
+            starts=np.array(starts + [n], dtype=np.int64),
+            periods=np.array(periods, dtype=np.int32),
+            row_starts=np.cumsum(sizes) - sizes,
+            rows=np.concatenate([np.zeros((0, 6)), *parameters]).astype(np.float64),
+            index=index[:1].copy() if consecutive else index.copy(),
+        )
+
+    def site_geometry(self, sites: np.ndarray) -> np.ndarray:
+        """(k, 6) geometry rows of ``sites`` (positions in file order)."""
+        sites = np.asarray(sites, dtype=np.int64)
+        segment = np.searchsorted(self.starts, sites, side="right") - 1
+        local = sites - self.starts[segment]
+        period = self.periods[segment]
+        regular = period > 0
+        cycle = np.where(regular, local // np.maximum(period, 1), 0)
+        row = self.row_starts[segment] + np.where(regular, local % np.maximum(period, 1), local)
+        out = self.rows[row].astype(np.float64)
+        out[regular] += cycle[regular, None] * self.rows[self.row_starts[segment] + period][regular]
+        return out.astype(np.float32)
+
+    def site_index(self, sites: np.ndarray) -> np.ndarray:
+        sites = np.asarray(sites, dtype=np.int64)
+        if len(self.index) == 1:
+            return (self.index[0] + sites).astype(np.int32)
+        return self.index[sites]
+
+    def expand(self) -> tuple[np.ndarray, np.ndarray]:
+        """Explicit (n,) int32 index and (6, n) float32 geometry."""
+        geometry = np.empty((len(self), 6), dtype=np.float32)
+        for segment, period in enumerate(self.periods.tolist()):
+            start, stop = int(self.starts[segment]), int(self.starts[segment + 1])
+            first = int(self.row_starts[segment])
+            if period:
+                geometry[start:stop] = _lattice_rows(self.rows[first:first + period + 1], period, stop - start)
+            else:
+                geometry[start:stop] = self.rows[first:first + stop - start]
+        return self.site_index(np.arange(len(self))), np.ascontiguousarray(geometry.T)
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        return {
+            "lattice_starts": self.starts,
+            "lattice_periods": self.periods,
+            "lattice_row_starts": self.row_starts,
+            "lattice_rows": self.rows,
+            "lattice_index": self.index,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray]) -> "SiteLattice":
+        return cls(*(arrays[name] for name in ARRAY_NAMES))
@@ -0,0 +1,254 @@
+"""Boolean queries over channel map selection layers.
+
+A query combines layer names with geometry predicates::
+
+    bank0 and not double_length and shank == 2
+    (bank0 | bank1) & 200 <= y < 2000 & ~default
+
+Operators are ``not``/``~``, ``and``/``&``, ``xor``/``^`` and ``or``/``|``
+(in decreasing precedence) and parentheses. A predicate compares one of
+``x``, ``y``, ``z`` (µm), ``shank`` or ``index`` with numbers using ``<``,
+``<=``, ``>``, ``>=``, ``==`` or ``!=``; comparisons chain as in Python.
+Layer names that are not plain identifiers can be quoted (``"bank 0"``).
+
+:func:`compile_query` parses an expression once into a tree of closures
+and caches it by expression string. A compiled query is evaluated against
+a :class:`SiteSelector`, which holds the channel map's layers as uint64
+words (``ChannelMap.layer_bits`` viewed 64 sites at a time) and caches the
+bitset of each predicate, so evaluation is a few word-wise NumPy
+operations on ``n / 64`` words.
+"""
+
+from __future__ import annotations
+
+import operator
+import re
+from functools import lru_cache
+from typing import Callable
+
+import numpy as np
+
+from .channel_map import ChannelMap
+
+FIELDS = ("x", "y", "z", "shank", "index")
+_COMPARISONS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+_KEYWORDS = {"not": "~", "and": "&", "xor": "^", "or": "|"}
+_TOKEN = re.compile(
+    r"\s*(?:(?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+    r"|(?P<name>[A-Za-z_]\w*)"
+    r'|"(?P<quoted>[^"]*)"'
+    r"|(?P<op><=|>=|==|!=|[<>()~&^|]))"
+)
+
+# A compiled query maps a selector to uint64 words of selected sites.
+Evaluator = Callable[["SiteSelector"], np.ndarray]
+
+
+class QuerySyntaxError(ValueError):
+    """A layer query expression cannot be parsed."""
+
+
+def _tokenize(expression: str) -> list[tuple[str, str]]:
+    tokens, pos = [], 0
+    end = len(expression.rstrip())
+    while pos < end:
+        match = _TOKEN.match(expression, pos)
+        if match is None:
+            raise QuerySyntaxError(f"unexpected {expression[pos:].strip()[:10]!r} at offset {pos} in {expression!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "name" and value in _KEYWORDS:
+            kind, value = "op", _KEYWORDS[value]
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing closures over a selector."""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+
+    def error(self, message: str) -> QuerySyntaxError:
+        return QuerySyntaxError(f"{message} in {self.expression!r}")
+
+    def peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self, value: str) -> bool:
+        if self.peek() == ("op", value):
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self) -> Evaluator:
+        if not self.tokens:
+            raise self.error("empty query")
+        query = self.binary(0)
+        if self.peek() is not None:
+            raise self.error(f"unexpected {self.peek()[1]!r}")
+        return query
+
+    _LEVELS = (("|", np.bitwise_or), ("^", np.bitwise_xor), ("&", np.bitwise_and))
+
+    def binary(self, level: int) -> Evaluator:
+        if level == len(self._LEVELS):
+            return self.unary()
+        symbol, ufunc = self._LEVELS[level]
+        query = self.binary(level + 1)
+        while self.take(symbol):
+            left, right = query, self.binary(level + 1)
+            query = lambda s, left=left, right=right, ufunc=ufunc: ufunc(left(s), right(s))
+        return query
+
+    def unary(self) -> Evaluator:
+        if self.take("~"):
+            inner = self.unary()
+            return lambda s: inner(s) ^ s.valid
+        if self.take("("):
+            query = self.binary(0)
+            if not self.take(")"):
+                raise self.error("missing ')'")
+            return query
+        token = self.peek()
+        if token is None:
+            raise self.error("unexpected end")
+        kind, value = token
+        if kind == "number" or (kind == "name" and value in FIELDS and self.comparison_follows()):
+            return self.predicate()
+        if kind in ("name", "quoted"):
+            self.pos += 1
+            return lambda s: s.layer_words(value)
+        raise self.error(f"unexpected {value!r}")
+
+    def comparison_follows(self) -> bool:
+        following = self.tokens[self.pos + 1] if self.pos + 1 < len(self.tokens) else None
+        return following is not None and following[0] == "op" and following[1] in _COMPARISONS
+
+    def operand(self) -> tuple[str, str]:
+        token = self.peek()
+        if token is None or not (token[0] == "number" or (token[0] == "name" and token[1] in FIELDS)):
+            raise self.error("expected a number or one of " + ", ".join(FIELDS))
+        self.pos += 1
+        return token
+
+    def predicate(self) -> Evaluator:
+        """A comparison chain such as ``200 <= y < 2000``."""
+        operands = [self.operand()]
+        symbols = []
+        while self.peek() is not None and self.peek()[0] == "op" and self.peek()[1] in _COMPARISONS:
+            symbols.append(self.tokens[self.pos][1])
+            self.pos += 1
+            operands.append(self.operand())
+        if not symbols:
+            raise self.error(f"expected a comparison after {operands[0][1]!r}")
+        terms = []
+        for symbol, (left_kind, left), (right_kind, right) in zip(symbols, operands, operands[1:]):
+            if (left_kind == "name") == (right_kind == "name"):
+                raise self.error(f"{left} {symbol} {right} must compare a field with a number")
+            if left_kind == "number":
+                # 200 <= y is y >= 200.
+                symbol = {"<": ">", "<=": ">=", ">": "<", ">=": "<="}.get(symbol, symbol)
+                left, right = right, left
+            terms.append((left, symbol, float(right)))
+        terms = tuple(terms)
+        return lambda s: s.predicate_words(terms)
+
+
+@lru_cache(maxsize=4096)
+def compile_query(expression: str) -> Evaluator:
+    """Parse ``expression`` into a callable mapping a :class:`SiteSelector` to words.
+
+    Results are cached by expression string.
+    """
+    return _Parser(expression).parse()
+
+
+class SiteSelector:
+    """Evaluates layer queries against one channel map.
+
+    Parameters
+    ----------
+    channel_map : ChannelMap
+        Sites and selection layers to query.
+    n_shanks : int
+        Number of shanks, for ``shank`` predicates (see
+        :meth:`ChannelMap.shank_ids`).
+    """
+
+    def __init__(self, channel_map: ChannelMap, n_shanks: int = 1):
+        self.channel_map = channel_map
+        self.n_shanks = n_shanks
+        n = len(channel_map)
+        self.n_words = -(-n // 64)
+        words = np.zeros((len(channel_map.layer_names), self.n_words * 8), dtype=np.uint8)
+        words[:, : channel_map.layer_bits.shape[1]] = channel_map.layer_bits
+        self.words = words.view("<u8")
+        self.valid = np.packbits(np.ones(n, dtype=bool), bitorder="little")
+        self.valid = np.pad(self.valid, (0, self.n_words * 8 - len(self.valid))).view("<u8")
+        self._rows = {name: row for row, name in enumerate(channel_map.layer_names)}
+        self._predicates: dict[tuple, np.ndarray] = {}
+        self._fields: dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.channel_map)
+
+    def layer_words(self, name: str) -> np.ndarray:
+        try:
+            return self.words[self._rows[name]]
+        except KeyError:
+            raise KeyError(f"unknown layer {name!r}, available: {list(self._rows)}") from None
+
+    def field(self, name: str) -> np.ndarray:
+        if name not in self._fields:
+            if name == "shank":
+                values = self.channel_map.shank_ids(self.n_shanks)
+            elif name == "index":
+                values = self.channel_map.index
+            else:
+                values = self.channel_map.geometry["xyz".index(name)]
+            self._fields[name] = values
+        return self._fields[name]
+
+    def predicate_words(self, terms: tuple[tuple[str, str, float], ...]) -> np.ndarray:
+        """Bitset of the sites satisfying every ``(field, comparison, value)``, cached."""
+        words = self._predicates.get(terms)
+        if words is None:
+            mask = np.ones(len(self), dtype=bool)
+            for name, symbol, value in terms:
+                mask &= _COMPARISONS[symbol](self.field(name), value)
+            words = np.zeros(self.n_words * 8, dtype=np.uint8)
+            bits = np.packbits(mask, bitorder="little")
+            words[: len(bits)] = bits
+            words = self._predicates[terms] = words.view("<u8")
+        return words
+
+    def words_for(self, expression: str) -> np.ndarray:
+        """Selected sites of ``expression`` as uint64 words, 64 sites each."""
+        return compile_query(expression)(self)
+
+    def packed(self, expression: str) -> np.ndarray:
+        """Selected sites packed like ``ChannelMap.layer_bits``."""
+        return self.words_for(expression).view(np.uint8)[: self.channel_map.layer_bits.shape[1]]
+
+    def mask(self, expression: str) -> np.ndarray:
+        """(n,) boolean mask of the sites selected by ``expression``."""
+        return np.unpackbits(self.packed(expression), count=len(self), bitorder="little").view(bool)
+
+    def indices(self, expression: str) -> np.ndarray:
+        """Positions (rows of the channel map) of the selected sites."""
+        return np.flatnonzero(self.mask(expression))
+
+    def count(self, expression: str) -> int:
+        """Number of selected sites."""
+        return int(np.bitwise_count(self.words_for(expression)).sum())
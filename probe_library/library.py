@@ -0,0 +1,309 @@
+"""On-disk index of the probe folders in a library checkout.
+
+Each probe folder holds ``metadata.json``, ``model.obj``, optional hardware
+OBJs, ``channel_map.csv`` and optionally ``selection.json``. :class:`ProbeLibrary` keeps a single
+``probe_index.json`` at the library root with every probe's metadata and
+file hashes, so listing and searching probes reads one file. Meshes and
+channel maps are only read when a :class:`Probe` asks for them.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field, replace
+from functools import cached_property
+from typing import Any, Iterator
+
+import numpy as np
+
+from .channel_map import ChannelMap
+from .channel_map_cache import file_digest, load_cached_channel_map
+from .channel_selection import SELECTION_FILE, Selection, load_selection, solve_selection
+from .layer_query import SiteSelector
+from .mesh_cache import CompiledMesh, MeshCache
+from .obj import Mesh, load_obj
+from .schema import SelectionConstraints, parse_metadata
+
+INDEX_FILE = "probe_index.json"
+INDEX_VERSION = 1
+METADATA_FILE = "metadata.json"
+MODEL_FILE = "model.obj"
+CHANNEL_MAP_FILE = "channel_map.csv"
+
+
+@dataclass(frozen=True, slots=True)
+class ProbeEntry:
+    """Index record for one probe folder."""
+
+    folder: str
+    name: str
+    type: int
+    producer: str
+    channels: int
+    shanks: int
+    reference_shank: int
+    hardware_files: tuple[str, ...] = ()
+    files: dict[str, str] = field(default_factory=dict, compare=False, hash=False)
+
+    @classmethod
+    def from_metadata(cls, folder: str, metadata: dict[str, Any], files: dict[str, str]) -> "ProbeEntry":
+        """Build an entry from a ``metadata.json`` record, validated by :func:`parse_metadata`."""
+        parsed = parse_metadata(metadata)
+        return cls(
+            folder=folder,
+            name=parsed.name,
+            type=parsed.type,
+            producer=parsed.producer,
+            channels=parsed.channels,
+            shanks=parsed.shanks,
+            reference_shank=parsed.reference_shank,
+            hardware_files=parsed.hardware_files,
+            files=dict(files),
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "folder": self.folder,
+            "name": self.name,
+            "type": self.type,
+            "producer": self.producer,
+            "channels": self.channels,
+            "shanks": self.shanks,
+            "reference-shank": self.reference_shank,
+            "hardware-files": list(self.hardware_files),
+            "files": self.files,
+        }
+
+    @classmethod
+    def from_json(cls, record: dict[str, Any]) -> "ProbeEntry":
+        metadata = {k: v for k, v in record.items() if k not in ("folder", "files", "stats")}
+        return cls.from_metadata(record["folder"], metadata, record.get("files", {}))
+
+
+class Probe:
+    """A probe folder whose files are read on first access."""
+
+    def __init__(
+        self,
+        root: str,
+        entry: ProbeEntry,
+        mesh_cache: MeshCache | None = None,
+        stats: dict[str, list[int]] | None = None,
+    ):
+        self.entry = entry
+        self.path = os.path.join(root, entry.folder)
+        self.mesh_cache = mesh_cache
+        # (mtime, size) of each file when ``entry.files`` was hashed.
+        self.stats = stats or {}
+        self._hardware: dict[str, Mesh] = {}
+
+    def __repr__(self) -> str:
+        return f"Probe({self.entry.name!r}, path={self.path!r})"
+
+    @property
+    def name(self) -> str:
+        return self.entry.name
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.path, MODEL_FILE)
+
+    def hardware_path(self, name: str) -> str:
+        """Return the path of hardware model ``name`` (e.g. ``"sensapex_holder"``)."""
+        if name not in self.entry.hardware_files:
+            raise KeyError(f"{self.entry.name} has no hardware file {name!r}")
+        return os.path.join(self.path, f"{name}.obj")
+
+    @cached_property
+    def model(self) -> Mesh:
+        return load_obj(self.model_path)
+
+    def hardware(self, name: str) -> Mesh:
+        """Return hardware model ``name``, parsing it on first use."""
+        if name not in self._hardware:
+            self._hardware[name] = load_obj(self.hardware_path(name))
+        return self._hardware[name]
+
+    def compiled_mesh(self, name: str = "model") -> CompiledMesh:
+        """Return render-ready buffers for ``model`` or a hardware model.
+
+        Uses the library's mesh cache, keyed by the file hash in the index
+        while the file's mtime and size still match the index, and by a
+        fresh hash otherwise.
+        """
+        path = self.model_path if name == "model" else self.hardware_path(name)
+        if self.mesh_cache is None:
+            self.mesh_cache = MeshCache()
+        filename = os.path.basename(path)
+        digest = self.entry.files.get(filename)
+        if digest is not None and self.stats.get(filename) != _stat_key(path):
+            digest = None
+        return self.mesh_cache.get(path, digest)
+
+    @cached_property
+    def channel_map(self) -> ChannelMap:
+        return load_cached_channel_map(os.path.join(self.path, CHANNEL_MAP_FILE))
+
+    @cached_property
+    def sites(self) -> SiteSelector:
+        """Layer queries over the channel map, e.g. ``probe.sites.mask("bank0 and shank == 1")``."""
+        return SiteSelector(self.channel_map, self.entry.shanks)
+
+    @cached_property
+    def selection(self) -> SelectionConstraints:
+        """Channel selection constraints from the probe's ``selection.json``."""
+        return load_selection(os.path.join(self.path, SELECTION_FILE))
+
+    def select_channels(self, scores: np.ndarray, **options: Any) -> Selection:
+        """Best valid channel configuration for per-site ``scores``.
+
+        See :func:`~probe_library.channel_selection.solve_selection`.
+        """
+        return solve_selection(self.channel_map, self.selection, scores, self.entry.shanks, **options)
+
+
+def _stat_key(path: str) -> list[int]:
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+class ProbeLibrary:
+    """Index over the probe folders under ``root``.
+
+    Opening a library only reads ``probe_index.json``; call :meth:`refresh`
+    to pick up folders that were added, removed or edited since the index
+    was written. Only files whose mtime or size changed are re-read and
+    re-hashed. ``mesh_cache`` is used for :meth:`Probe.compiled_mesh`.
+    """
+
+    def __init__(
+        self,
+        root: str | os.PathLike,
+        index_path: str | os.PathLike | None = None,
+        mesh_cache: MeshCache | None = None,
+    ):
+        self.root = os.fspath(root)
+        self.mesh_cache = mesh_cache
+        self.index_path = os.fspath(index_path or os.path.join(self.root, INDEX_FILE))
+        self._entries: dict[str, ProbeEntry] = {}
+        self._stats: dict[str, dict[str, list[int]]] = {}
+        if os.path.exists(self.index_path):
+            self._read_index()
+        else:
+            self.refresh()
+
+    def _read_index(self) -> None:
+        with open(self.index_path) as f:
+            index = json.load(f)
+        if index.get("version") != INDEX_VERSION:
+            self.refresh()
+            return
+        for record in index["probes"]:
+            entry = ProbeEntry.from_json(record)
+            self._entries[entry.folder] = entry
+            self._stats[entry.folder] = record.get("stats", {})
+
+    def _write_index(self) -> None:
+        probes = []
+        for folder, entry in sorted(self._entries.items()):
+            record = entry.to_json()
+            record["stats"] = self._stats[folder]
+            probes.append(record)
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": INDEX_VERSION, "probes": probes}, f, indent=1)
+        os.replace(tmp, self.index_path)
+
+    def _scan_folder(self, folder: str) -> bool:
+        """Update the entry for ``folder``; return True if anything changed."""
+        path = os.path.join(self.root, folder)
+        old_stats = self._stats.get(folder, {})
+        old_files = self._entries[folder].files if folder in self._entries else {}
+
+        stats, files = {}, {}
+        with os.scandir(path) as it:
+            for item in it:
+                if not item.is_file() or not (
+                    item.name in (METADATA_FILE, SELECTION_FILE) or item.name.endswith((".obj", ".csv"))
+                ):
+                    continue
+                stats[item.name] = _stat_key(item.path)
+                if old_stats.get(item.name) == stats[item.name] and item.name in old_files:
+                    files[item.name] = old_files[item.name]
+                else:
+                    files[item.name] = file_digest(item.path).hex()
+
+        if stats == old_stats and folder in self._entries:
+            return False
+        if files.get(METADATA_FILE) != old_files.get(METADATA_FILE) or folder not in self._entries:
+            with open(os.path.join(path, METADATA_FILE)) as f:
+                entry = ProbeEntry.from_metadata(folder, json.load(f), files)
+        else:
+            entry = replace(self._entries[folder], files=files)
+        self._entries[folder] = entry
+        self._stats[folder] = stats
+        return True
+
+    def refresh(self) -> bool:
+        """Bring the index up to date with the folders on disk.
+
+        Returns True if the index changed (and was rewritten).
+        """
+        folders = {
+            item.name
+            for item in os.scandir(self.root)
+            if item.is_dir() and os.path.isfile(os.path.join(item.path, METADATA_FILE))
+        }
+        changed = False
+        for folder in set(self._entries) - folders:
+            del self._entries[folder]
+            del self._stats[folder]
+            changed = True
+        for folder in sorted(folders):
+            changed |= self._scan_folder(folder)
+        if changed or not os.path.exists(self.index_path):
+            self._write_index()
+        return changed
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[ProbeEntry]:
+        return iter(self._entries.values())
+
+    def names(self) -> list[str]:
+        return [entry.name for entry in self._entries.values()]
+
+    def search(self, text: str | None = None, **fields: Any) -> list[ProbeEntry]:
+        """Return entries matching all ``fields`` and, if given, containing ``text``.
+
+        ``text`` is matched case-insensitively against the name, producer
+        and folder; ``fields`` are compared for equality, e.g.
+        ``library.search(producer="imec", shanks=4)``.
+        """
+        needle = text.lower() if text else None
+        matches = []
+        for entry in self._entries.values():
+            if needle and not any(
+                needle in value.lower() for value in (entry.name, entry.producer, entry.folder)
+            ):
+                continue
+            if any(getattr(entry, key) != value for key, value in fields.items()):
+                continue
+            matches.append(entry)
+        return matches
+
+    def entry(self, name: str) -> ProbeEntry:
+        """Return the entry whose name or folder is ``name``."""
+        if name in self._entries:
+            return self._entries[name]
+        for entry in self._entries.values():
+            if entry.name == name:
+                return entry
+        raise KeyError(f"no probe named {name!r} in {self.root}")
+
+    def probe(self, name: str) -> Probe:
+        """Return a lazily loaded :class:`Probe` for ``name``."""
+        entry = self.entry(name)
+        return Probe(self.root, entry, self.mesh_cache, self._stats.get(entry.folder))
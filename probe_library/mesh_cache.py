@@ -0,0 +1,175 @@
+"""Content-addressed cache of compiled probe and hardware meshes.
+
+Each OBJ is parsed once and stored as ``<sha256>.mesh`` in the cache
+directory: an interleaved float32 vertex buffer (position, normal), a uint32
+index buffer and the bounding box. Entries are memory-mapped on load, so
+the buffers can be handed to a renderer without copying. The cache is kept
+under a disk budget by evicting the least recently used entries; an entry's
+mtime is bumped every time it is used.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from ._binary import read_arrays, write_arrays
+from .channel_map_cache import file_digest
+from .obj import Mesh, load_obj
+
+MAGIC = b"PLMESH\0\0"
+VERSION = 1
+SUFFIX = ".mesh"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "probe_library", "meshes")
+
+
+@dataclass
+class CompiledMesh:
+    """Render-ready mesh buffers.
+
+    ``vertices`` is (n, 6) float32 with columns x, y, z, nx, ny, nz;
+    ``indices`` is (n_triangles, 3) uint32; ``bounds`` is (2, 3) float32
+    holding the minimum and maximum corner.
+    """
+
+    vertices: np.ndarray
+    indices: np.ndarray
+    bounds: np.ndarray
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self.vertices[:, :3]
+
+    @property
+    def normals(self) -> np.ndarray:
+        return self.vertices[:, 3:]
+
+
+def _vertex_normals(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Area-weighted vertex normals."""
+    tri = vertices[faces].astype(np.float64)
+    face_normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    corners = faces.ravel()
+    normals = np.stack(
+        [
+            np.bincount(corners, np.repeat(face_normals[:, axis], 3), minlength=len(vertices))
+            for axis in range(3)
+        ],
+        axis=1,
+    )
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return (normals / np.where(length > 0, length, 1)).astype(np.float32)
+
+
+def compile_mesh(mesh: Mesh) -> CompiledMesh:
+    """Build interleaved vertex and index buffers for ``mesh``.
+
+    When the OBJ supplies per-corner normals, vertices are split wherever a
+    position is used with more than one normal, which keeps hard edges.
+    Otherwise smooth area-weighted normals are computed.
+    """
+    if mesh.face_normals is not None and len(mesh.normals):
+        if mesh.face_normals.size and mesh.face_normals.max() >= len(mesh.normals):
+            raise ValueError(f"face normal index out of range for {len(mesh.normals)} normals")
+        pairs = mesh.faces.astype(np.int64) * len(mesh.normals) + mesh.face_normals
+        unique, inverse = np.unique(pairs.ravel(), return_inverse=True)
+        positions = mesh.vertices[unique // len(mesh.normals)]
+        normals = mesh.normals[unique % len(mesh.normals)]
+        indices = inverse.reshape(-1, 3).astype(np.uint32)
+    else:
+        positions = mesh.vertices
+        normals = _vertex_normals(mesh.vertices, mesh.faces)
+        indices = mesh.faces.astype(np.uint32, copy=False)
+
+    if len(positions):
+        bounds = np.stack([positions.min(axis=0), positions.max(axis=0)])
+    else:
+        bounds = np.zeros((2, 3))
+    return CompiledMesh(
+        vertices=np.concatenate([positions, normals], axis=1).astype(np.float32),
+        indices=np.ascontiguousarray(indices),
+        bounds=bounds.astype(np.float32),
+    )
+
+
+class MeshCache:
+    """Disk cache of :class:`CompiledMesh` blobs keyed by OBJ content hash."""
+
+    def __init__(self, directory: str | os.PathLike | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = os.fspath(directory or default_cache_dir())
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest + SUFFIX)
+
+    def get(self, obj_path: str | os.PathLike, digest: str | None = None) -> CompiledMesh:
+        """Return the compiled mesh for ``obj_path``.
+
+        ``digest`` is the hex SHA-256 of the OBJ file; pass it when it is
+        already known (e.g. from the probe index) to skip hashing the file.
+        """
+        digest = digest or file_digest(obj_path).hex()
+        path = self._path(digest)
+        try:
+            arrays, _ = read_arrays(path, MAGIC, VERSION)
+        except (OSError, ValueError):
+            self.put(digest, compile_mesh(load_obj(obj_path)))
+            arrays, _ = read_arrays(path, MAGIC, VERSION)
+        else:
+            try:
+                os.utime(path)
+            except OSError:
+                # Read-only cache: the entry is still usable, just not marked as used.
+                pass
+        return CompiledMesh(arrays["vertices"], arrays["indices"], arrays["bounds"])
+
+    def put(self, digest: str, mesh: CompiledMesh) -> None:
+        """Store ``mesh`` under ``digest`` and evict entries over budget."""
+        write_arrays(
+            self._path(digest),
+            MAGIC,
+            VERSION,
+            {"vertices": mesh.vertices, "indices": mesh.indices, "bounds": mesh.bounds},
+        )
+        self.evict(keep=digest)
+
+    def size(self) -> int:
+        """Total size of the cache entries in bytes."""
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self) -> list[os.DirEntry]:
+        with os.scandir(self.directory) as it:
+            return [entry for entry in it if entry.name.endswith(SUFFIX) and entry.is_file()]
+
+    def evict(self, keep: str | None = None) -> int:
+        """Delete least recently used entries until the cache fits its budget.
+
+        Returns the number of bytes freed. The entry for ``keep`` is never
+        evicted.
+        """
+        entries = [(entry.stat().st_mtime_ns, entry.stat().st_size, entry) for entry in self._entries()]
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total - freed <= self.max_bytes:
+                break
+            if keep is not None and entry.name == keep + SUFFIX:
+                continue
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            freed += size
+        return freed
+
+    def clear(self) -> None:
+        for entry in self._entries():
+            os.remove(entry.path)
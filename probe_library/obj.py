@@ -0,0 +1,267 @@
+"""Streaming Wavefront OBJ parser for ``model.obj`` and hardware models.
+
+The file is read in large chunks that are split on the last newline. Each
+chunk is classified line by line with array operations on its raw bytes:
+the bytes of ``v``, ``vn`` and ``f`` lines are masked out, comments are
+blanked and the numbers of each record type are converted in one
+``np.fromstring`` call. Each face corner is classified by its own slashes,
+so ``v``, ``v/vt``, ``v//vn`` and ``v/vt/vn`` faces can be mixed. Polygons
+are fan triangulated and negative (relative) indices are resolved against
+the number of vertices defined before each face, so no Python object is
+ever created per vertex or per face. Records may be indented; a record
+that cannot be parsed raises a ``ValueError`` naming its line.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 22
+
+_SPACE, _LF, _SLASH, _HASH = ord(" "), ord("\n"), ord("/"), ord("#")
+
+
+@dataclass
+class Mesh:
+    """Triangle mesh as contiguous arrays.
+
+    ``faces`` index ``vertices`` and ``face_normals`` index ``normals``;
+    both are zero-based. ``face_normals`` is None when the faces carry no
+    normal indices.
+    """
+
+    vertices: np.ndarray
+    faces: np.ndarray
+    normals: np.ndarray
+    face_normals: np.ndarray | None = None
+
+    def __repr__(self) -> str:
+        return f"Mesh({len(self.vertices)} vertices, {len(self.faces)} triangles)"
+
+
+def _parse_floats(data: np.ndarray, n_lines: int) -> np.ndarray:
+    """Parse ``n_lines`` whitespace-separated numeric records."""
+    if n_lines == 0:
+        return np.empty((0, 3), dtype=np.float32)
+    values = np.fromstring(data.tobytes(), dtype=np.float64, sep=" ")
+    width = values.shape[0] // n_lines
+    if width < 3 or width * n_lines != values.shape[0]:
+        raise ValueError("OBJ records have an inconsistent number of components")
+    return values.reshape(n_lines, width)[:, :3].astype(np.float32)
+
+
+def _corner_layout(face: np.ndarray, token_start: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Integers per face corner token and the offset of its normal index (-1 if none).
+
+    ``v`` has one integer, ``v/vt`` two, ``v//vn`` two with the normal
+    second and ``v/vt/vn`` three with the normal third. Tokens are
+    classified individually, so faces of different formats can be mixed.
+    """
+    # Slashes and "//" pairs from each token start up to the next one.
+    slash = (face == _SLASH).view(np.uint8)
+    slashes = np.add.reduceat(slash, token_start, dtype=np.int32)
+    double = np.add.reduceat(slash & np.r_[slash[1:], np.uint8(0)], token_start, dtype=np.int32)
+    per_corner = np.where(double > 0, 2, slashes + 1)
+    normal_offset = np.where(double > 0, 1, np.where(slashes == 2, 2, -1))
+    return per_corner, normal_offset
+
+
+class _ChunkParser:
+    def __init__(self):
+        self.vertices: list[np.ndarray] = []
+        self.normals: list[np.ndarray] = []
+        self.faces: list[np.ndarray] = []
+        self.face_normals: list[np.ndarray] = []
+        self.n_vertices = 0
+        self.n_normals = 0
+        self.n_lines = 0
+        self.has_face_normals = True
+
+    def feed(self, chunk: bytes) -> None:
+        """Parse ``chunk``, which must end with a newline."""
+        buf = np.frombuffer(chunk, dtype=np.uint8)
+        if buf.shape[0] == 0:
+            return
+        ends = np.flatnonzero(buf == _LF)
+        starts = np.r_[0, ends[:-1] + 1]
+        lengths = ends - starts + 1
+        # Records are classified from their first non-blank byte.
+        heads = starts
+        indented = (buf[starts] <= _SPACE) & (buf[starts] != _LF)
+        if indented.any():
+            solid = np.flatnonzero((buf > _SPACE) | (buf == _LF))
+            heads = solid[np.searchsorted(solid, starts)]
+        last = buf.shape[0] - 1
+        first = buf[heads]
+        second = buf[np.minimum(heads + 1, last)]
+        third = np.where(ends - heads > 1, buf[np.minimum(heads + 2, last)], _LF)
+
+        # Space and tab both sort at or below " ", newlines are excluded.
+        sep2 = (second <= _SPACE) & (second != _LF)
+        sep3 = (third <= _SPACE) & (third != _LF)
+        is_v = (first == ord("v")) & sep2
+        is_vn = (first == ord("v")) & (second == ord("n")) & sep3
+        is_f = (first == ord("f")) & sep2
+
+        line_kind = is_v.view(np.uint8) | (is_vn.view(np.uint8) << 1) | (is_f.view(np.uint8) << 2)
+        byte_kind = np.repeat(line_kind, lengths)
+
+        # Blank the record keywords and any "# comment" so only numbers remain.
+        work = buf.copy()
+        comment = buf == _HASH
+        if comment.any():
+            seen = np.cumsum(comment)
+            before_line = np.repeat(seen[starts] - comment[starts], lengths)
+            work[(seen > before_line) & (buf != _LF)] = _SPACE
+        work[heads[is_v | is_vn | is_f]] = _SPACE
+        work[heads[is_vn] + 1] = _SPACE
+
+        v_lines = int(is_v.sum())
+        vn_lines = int(is_vn.sum())
+        try:
+            vertices = _parse_floats(work[byte_kind == 1], v_lines)
+            normals = _parse_floats(work[byte_kind == 2], vn_lines)
+            if is_f.any():
+                self._parse_faces(
+                    work[byte_kind == 4],
+                    lengths[is_f],
+                    np.cumsum(is_v)[is_f],
+                    np.cumsum(is_vn)[is_f],
+                )
+        except ValueError:
+            line = _first_bad_line(work, starts, ends, line_kind)
+            if line is None:
+                raise
+            raise ValueError(
+                f"line {self.n_lines + line + 1}: malformed OBJ record "
+                f"{bytes(buf[starts[line]:ends[line]]).decode(errors='replace').strip()!r}"
+            ) from None
+        self.vertices.append(vertices)
+        self.normals.append(normals)
+        self.n_vertices += v_lines
+        self.n_normals += vn_lines
+        self.n_lines += len(ends)
+
+    def _parse_faces(self, face, line_lengths, v_before, vn_before):
+        space = face <= _SPACE
+        token_start = np.flatnonzero(~space & np.r_[True, space[:-1]])
+        per_corner, normal_offset = _corner_layout(face, token_start)
+        line_ends = np.cumsum(line_lengths)
+        corners_per_line = np.bincount(
+            np.searchsorted(line_ends, token_start, side="right"), minlength=line_lengths.shape[0]
+        )
+        values = np.fromstring(
+            np.where(face == _SLASH, _SPACE, face).astype(np.uint8).tobytes(), dtype=np.int64, sep=" "
+        )
+        if values.shape[0] != per_corner.sum() or np.any(corners_per_line < 3):
+            raise ValueError("malformed or inconsistent OBJ face records")
+        first_value = np.cumsum(per_corner) - per_corner
+
+        triangles = _fan_triangulate(corners_per_line)
+        # Negative indices count back from the vertices defined so far.
+        corners = values[first_value]
+        vertices_before = np.repeat(self.n_vertices + v_before, corners_per_line)
+        corners = np.where(corners < 0, vertices_before + corners, corners - 1)
+        self.faces.append(corners[triangles].astype(np.uint32))
+
+        if np.any(normal_offset < 0):
+            self.has_face_normals = False
+        if self.has_face_normals:
+            normals = values[first_value + normal_offset]
+            normals_before = np.repeat(self.n_normals + vn_before, corners_per_line)
+            normals = np.where(normals < 0, normals_before + normals, normals - 1)
+            self.face_normals.append(normals[triangles].astype(np.uint32))
+
+    def result(self) -> Mesh:
+        def concat(parts, shape, dtype):
+            return np.concatenate(parts) if parts else np.empty(shape, dtype=dtype)
+
+        face_normals = None
+        if self.has_face_normals and self.face_normals:
+            face_normals = concat(self.face_normals, (0, 3), np.uint32)
+        return Mesh(
+            vertices=concat(self.vertices, (0, 3), np.float32),
+            faces=concat(self.faces, (0, 3), np.uint32),
+            normals=concat(self.normals, (0, 3), np.float32),
+            face_normals=face_normals,
+        )
+
+
+def _is_corner(corner: bytes) -> bool:
+    """Whether ``corner`` is one of ``v``, ``v/vt``, ``v//vn`` or ``v/vt/vn``."""
+    parts = corner.split(b"/")
+    if len(parts) > 3 or not parts[0] or not parts[-1]:
+        return False
+    try:
+        for part in parts:
+            if part:
+                int(part)
+    except ValueError:
+        return False
+    return True
+
+
+def _first_bad_line(work: np.ndarray, starts: np.ndarray, ends: np.ndarray, line_kind: np.ndarray) -> int | None:
+    """Index of the first ``v``, ``vn`` or ``f`` record that cannot be parsed.
+
+    ``work`` holds the records with their keywords and comments blanked.
+    Only called after a chunk failed to parse, so it goes line by line.
+    """
+    widths: dict[int, int] = {}
+    for line in np.flatnonzero(line_kind).tolist():
+        kind = int(line_kind[line])
+        fields = bytes(work[starts[line]:ends[line]]).split()
+        if kind == 4:
+            if len(fields) < 3 or not all(_is_corner(corner) for corner in fields):
+                return line
+            continue
+        try:
+            for field in fields:
+                float(field)
+        except ValueError:
+            return line
+        # All vertex (or normal) records of a chunk must have the same width.
+        if len(fields) < 3 or widths.setdefault(kind, len(fields)) != len(fields):
+            return line
+    return None
+
+
+def _fan_triangulate(corners_per_face: np.ndarray) -> np.ndarray:
+    """Return (n_triangles, 3) corner indices fan-triangulating each polygon."""
+    offsets = np.r_[0, np.cumsum(corners_per_face)[:-1]]
+    n_triangles = corners_per_face - 2
+    base = np.repeat(offsets, n_triangles)
+    step = np.arange(n_triangles.sum()) - np.repeat(np.cumsum(n_triangles) - n_triangles, n_triangles)
+    return np.stack([base, base + step + 1, base + step + 2], axis=1)
+
+
+def load_obj(path: str | os.PathLike, chunk_size: int = CHUNK_SIZE) -> Mesh:
+    """Parse the OBJ file at ``path`` into a triangulated :class:`Mesh`."""
+    parser = _ChunkParser()
+    with open(path, "rb") as f:
+        tail = b""
+        try:
+            while True:
+                block = f.read(chunk_size)
+                if not block:
+                    break
+                block = tail + block
+                cut = block.rfind(b"\n") + 1
+                if cut == 0:
+                    tail = block
+                    continue
+                parser.feed(block[:cut])
+                tail = block[cut:]
+            if tail:
+                parser.feed(tail + b"\n")
+        except ValueError as error:
+            raise ValueError(f"{os.fspath(path)}: {error}") from None
+    mesh = parser.result()
+    if mesh.faces.size and mesh.faces.max() >= len(mesh.vertices):
+        raise ValueError(f"{os.fspath(path)}: face index out of range")
+    if mesh.face_normals is not None and mesh.face_normals.size and mesh.face_normals.max() >= len(mesh.normals):
+        raise ValueError(f"{os.fspath(path)}: face normal index out of range")
+    return mesh
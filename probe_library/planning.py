@@ -0,0 +1,199 @@
+"""Grid search over insertion parameters for trajectory planning.
+
+Every candidate insertion on an (AP, ML, DV, yaw, pitch, roll) grid is
+scored by how many of its sites land in a set of target regions. The grid
+is split into ranges of flat candidate indices that are scored in a
+process pool; only (start, stop) pairs go to the workers and only each
+range's best candidates come back, which are merged into a top-k heap as
+they arrive.
+
+Each search's state is held by a scorer object that forked workers
+receive through the pool initializer, so they share the memory-mapped
+volume and the site arrays instead of receiving pickled copies, and
+concurrent searches do not share state. This requires the ``fork`` start
+method (Linux); elsewhere, or with ``processes=0``, the search runs in the
+calling process.
+"""
+
+from __future__ import annotations
+
+import heapq
+import multiprocessing
+import os
+from dataclasses import dataclass, field
+from typing import Iterable, NamedTuple, Sequence
+
+import numpy as np
+
+from .atlas import AtlasLookup
+from .atlas_transform import IDENTITY, AffineTransform
+from .transforms import apply_matrices, insertion_matrices
+
+DEFAULT_CHUNK = 4096
+
+
+class Candidate(NamedTuple):
+    score: int
+    ap: float
+    ml: float
+    dv: float
+    yaw: float
+    pitch: float
+    roll: float
+
+
+@dataclass(frozen=True)
+class InsertionGrid:
+    """Cartesian grid of insertion parameters (mm and degrees)."""
+
+    ap: Sequence[float]
+    ml: Sequence[float]
+    dv: Sequence[float]
+    yaw: Sequence[float] = (0.0,)
+    pitch: Sequence[float] = (0.0,)
+    roll: Sequence[float] = (0.0,)
+    _axes: tuple[np.ndarray, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        axes = tuple(
+            np.atleast_1d(np.asarray(v, dtype=np.float64))
+            for v in (self.ap, self.ml, self.dv, self.yaw, self.pitch, self.roll)
+        )
+        object.__setattr__(self, "_axes", axes)
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return tuple(len(axis) for axis in self._axes)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    def parameters(self, flat: np.ndarray) -> np.ndarray:
+        """(k, 6) insertion parameters for flat candidate indices."""
+        index = np.unravel_index(flat, self.shape)
+        return np.stack([axis[i] for axis, i in zip(self._axes, index)], axis=1)
+
+
+def target_ids(lookup: AtlasLookup, acronyms: Iterable[str]) -> np.ndarray:
+    """Region ids for a list of acronyms."""
+    acronyms = list(acronyms)
+    rows = np.flatnonzero(np.isin(lookup.acronyms, acronyms))
+    missing = set(acronyms) - set(lookup.acronyms[rows])
+    if missing:
+        raise KeyError(f"unknown acronyms {sorted(missing)}")
+    return lookup.structure_ids[rows]
+
+
+def score_insertions(
+    lookup: AtlasLookup,
+    sites: np.ndarray,
+    parameters: np.ndarray,
+    targets: np.ndarray,
+    transform: AffineTransform = IDENTITY,
+) -> np.ndarray:
+    """Number of ``sites`` inside ``targets`` for each row of (k, 6) ``parameters``."""
+    matrices = lookup.voxel_transform(transform) @ insertion_matrices(*parameters.T)
+    voxels = np.rint(apply_matrices(matrices, sites)).astype(np.int32)
+    shape = np.array(lookup.annotation.shape, dtype=np.int32)
+    inside = np.all((voxels >= 0) & (voxels < shape), axis=-1)
+    voxels[~inside] = 0
+    ids = lookup.annotation[voxels[..., 0], voxels[..., 1], voxels[..., 2]]
+    return np.sum(np.isin(ids, targets) & inside, axis=-1)
+
+
+@dataclass(frozen=True)
+class _RangeScorer:
+    """Scores ranges of flat grid indices for one search."""
+
+    lookup: AtlasLookup
+    sites: np.ndarray
+    grid: InsertionGrid
+    targets: np.ndarray
+    transform: AffineTransform
+    top_k: int
+
+    def __call__(self, bounds: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+        start, stop = bounds
+        flat = np.arange(start, stop)
+        scores = score_insertions(self.lookup, self.sites, self.grid.parameters(flat), self.targets, self.transform)
+        k = min(self.top_k, len(flat))
+        # Everything tied with the k-th best score, then best first and lower index on ties.
+        if k < len(flat):
+            kth = np.partition(scores, len(flat) - k)[len(flat) - k]
+            candidates = np.flatnonzero(scores >= kth)
+        else:
+            candidates = np.arange(len(flat))
+        best = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+        return scores[best], flat[best]
+
+
+# The scorer of the pool a worker belongs to; set in each forked worker only.
+_WORKER_SCORER: _RangeScorer | None = None
+
+
+def _init_worker(scorer: _RangeScorer) -> None:
+    global _WORKER_SCORER
+    _WORKER_SCORER = scorer
+
+
+def _score_range(bounds: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+    return _WORKER_SCORER(bounds)
+
+
+def search(
+    lookup: AtlasLookup,
+    sites: np.ndarray,
+    grid: InsertionGrid,
+    targets: np.ndarray,
+    top_k: int = 100,
+    transform: AffineTransform = IDENTITY,
+    processes: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK,
+) -> list[Candidate]:
+    """Return the ``top_k`` best insertions on ``grid``, best first.
+
+    ``sites`` is (n, 3) probe-local positions in µm, e.g. the sites of a
+    channel map selection layer; ``targets`` is an array of region ids.
+    ``processes`` defaults to the CPU count; 0 runs in this process.
+    """
+    if top_k < 1:
+        raise ValueError(f"top_k must be at least 1, got {top_k}")
+    scorer = _RangeScorer(
+        lookup=lookup,
+        sites=np.asarray(sites, dtype=np.float32),
+        grid=grid,
+        targets=np.asarray(targets),
+        transform=transform,
+        top_k=top_k,
+    )
+    ranges = [(start, min(start + chunk_size, grid.size)) for start in range(0, grid.size, chunk_size)]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if "fork" not in multiprocessing.get_all_start_methods():
+        processes = 0
+
+    heap: list[tuple[int, int]] = []
+
+    def merge(results):
+        for scores, flat in results:
+            for score, index in zip(scores.tolist(), flat.tolist()):
+                # Ties are broken toward the lower grid index.
+                item = (score, -index)
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+    if processes and len(ranges) > 1:
+        # Forked workers inherit the scorer instead of receiving a pickled copy.
+        with multiprocessing.get_context("fork").Pool(processes, _init_worker, (scorer,)) as pool:
+            merge(pool.imap_unordered(_score_range, ranges))
+    else:
+        merge(map(scorer, ranges))
+
+    best = sorted(heap, reverse=True)
+    if not best:
+        return []
+    parameters = grid.parameters(np.array([-index for _, index in best]))
+    return [Candidate(score, *row) for (score, _), row in zip(best, parameters.tolist())]
@@ -0,0 +1,281 @@
+"""Lazy loading of scene JSON files (README "Scene").
+
+A scene is ``{"AtlasName": ..., "AtlasTransform": ..., "Data": [...]}``
+where ``AtlasTransform`` is a transform JSON object (or that object
+serialized to a string) and each ``Data`` entry is either
+``{"type": "probes", ...}`` or ``{"probes": jsondata}``, ``jsondata`` again
+being inline JSON or a JSON string.
+
+:class:`Scene` does not decode the document up front. When it first needs
+to step over a nested value it builds a structural index of the whole
+buffer with a few NumPy passes: the positions of unescaped quotes, and of
+every bracket outside strings paired with its matching bracket. Skipping
+a string, array or object is then a binary search, so long strings and
+embedded per-channel data cost nothing beyond that index, and no Python
+objects are built for parts of the scene that are never read. Top-level
+fields and ``Data`` entries are decoded with :mod:`json` the first time
+they are read and cached afterwards.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import re
+from typing import Any, Iterator, Sequence
+
+import numpy as np
+
+from .atlas_transform import IDENTITY, AffineTransform
+from .schema import parse_transform
+
+_SCALAR = re.compile(rb"[^\s,\]}]+")
+# Short strings without escapes (keys, names) are matched without the index.
+_SHORT_STRING = re.compile(rb'"[^"\\\n]{0,256}"')
+_SPACE = re.compile(rb"[\s:,]*")
+
+
+class _Structure:
+    """Unescaped quote positions and matching bracket pairs of a JSON buffer."""
+
+    def __init__(self, buffer):
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        quotes = np.flatnonzero(data == ord('"'))
+        slashes = np.flatnonzero(data == ord("\\"))
+        if len(quotes) and len(slashes):
+            # A quote is escaped by an odd run of backslashes right before it.
+            run = np.r_[True, np.diff(slashes) != 1]
+            run_start = slashes[np.maximum.accumulate(np.where(run, np.arange(len(slashes)), 0))]
+            k = np.searchsorted(slashes, quotes) - 1
+            follows = (k >= 0) & (slashes[np.maximum(k, 0)] == quotes - 1)
+            length = np.where(follows, quotes - run_start[np.maximum(k, 0)], 0)
+            quotes = quotes[length % 2 == 0]
+        self.quotes = quotes
+
+        # "[]{}" all become 0x7F when OR-ed with 0x26 (as do "Y_y" and DEL,
+        # which are filtered out afterwards).
+        brackets = np.flatnonzero((data | 0x26) == 0x7F)
+        kind = data[brackets]
+        brackets = brackets[(kind & 0xDF == ord("[")) | (kind & 0xDF == ord("]"))]
+        brackets = brackets[np.searchsorted(quotes, brackets, side="right") % 2 == 0]
+        kind = data[brackets]
+        opening = (kind == ord("{")) | (kind == ord("["))
+        depth = np.cumsum(np.where(opening, 1, -1))
+        # An opening bracket at depth d pairs with the next closing bracket
+        # that brings the depth back to d - 1.
+        level = np.where(opening, depth, depth + 1)
+        opens = brackets[opening][np.argsort(level[opening], kind="stable")]
+        closes = brackets[~opening][np.argsort(level[~opening], kind="stable")]
+        if len(opens) != len(closes) or np.any(closes < opens):
+            raise ValueError("unbalanced brackets in scene JSON")
+        order = np.argsort(opens)
+        self.opens = opens[order]
+        self.closes = closes[order]
+
+    def string_end(self, pos: int) -> int:
+        i = np.searchsorted(self.quotes, pos) + 1
+        if i >= len(self.quotes) or self.quotes[i - 1] != pos:
+            raise ValueError(f"unterminated string in scene JSON at offset {pos}")
+        return int(self.quotes[i]) + 1
+
+    def container_end(self, pos: int) -> int:
+        i = np.searchsorted(self.opens, pos)
+        if i >= len(self.opens) or self.opens[i] != pos:
+            raise ValueError(f"malformed scene JSON at offset {pos}")
+        return int(self.closes[i]) + 1
+
+
+def _members(buffer, skip, pos: int) -> Iterator[tuple[str, int, int]]:
+    """(key, start, end) of each member of the object starting at ``pos``."""
+    if buffer[pos:pos + 1] != b"{":
+        raise ValueError(f"expected a JSON object at offset {pos}")
+    pos = _SPACE.match(buffer, pos + 1).end()
+    while buffer[pos:pos + 1] != b"}":
+        if buffer[pos:pos + 1] != b'"':
+            raise ValueError(f"malformed scene JSON at offset {pos}")
+        key_end = skip(pos)
+        start = _SPACE.match(buffer, key_end).end()
+        end = skip(start)
+        yield json.loads(buffer[pos:key_end]), start, end
+        pos = _SPACE.match(buffer, end).end()
+
+
+def _elements(buffer, skip, pos: int) -> Iterator[tuple[int, int]]:
+    """(start, end) of each element of the array starting at ``pos``."""
+    if buffer[pos:pos + 1] != b"[":
+        raise ValueError(f"expected a JSON array at offset {pos}")
+    pos = _SPACE.match(buffer, pos + 1).end()
+    while buffer[pos:pos + 1] != b"]":
+        end = skip(pos)
+        yield pos, end
+        pos = _SPACE.match(buffer, end).end()
+
+
+def _decode_embedded(value: Any) -> Any:
+    """Decode a JSON value that may itself be serialized to a string."""
+    if isinstance(value, str) and value.lstrip()[:1] in ("{", "["):
+        return json.loads(value)
+    return value
+
+
+class SceneEntries(Sequence):
+    """The ``Data`` entries of one type, decoded on first access."""
+
+    def __init__(self, scene: "Scene", type: str, spans: list[tuple[int, int, str | None]]):
+        self.scene = scene
+        self.type = type
+        self._spans = spans
+        self._decoded: dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = range(len(self))[index]
+        if index not in self._decoded:
+            start, end, key = self._spans[index]
+            value = self.scene._decode(start, end)
+            if key is None:
+                # {"type": ..., fields...}: the entry minus its type.
+                value = {k: v for k, v in value.items() if k != "type"}
+            else:
+                value = _decode_embedded(value)
+            self._decoded[index] = value
+        return self._decoded[index]
+
+
+class Scene:
+    """A scene JSON document whose parts are decoded on demand."""
+
+    def __init__(self, buffer: bytes | bytearray | mmap.mmap):
+        self._buffer = buffer
+        self._structure: _Structure | None = None
+        self._fields: dict[str, tuple[int, int]] = {}
+        self._scan = _members(buffer, self._skip, _SPACE.match(buffer, 0).end())
+        self._values: dict[str, Any] = {}
+        self._data: dict[str, list[tuple[int, int, str | None]]] | None = None
+        self._entries: dict[str, SceneEntries] = {}
+
+    @classmethod
+    def open(cls, path: str | os.PathLike) -> "Scene":
+        """Memory-map a scene file."""
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f"empty scene file: {os.fspath(path)}")
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def loads(cls, text: str | bytes) -> "Scene":
+        return cls(text.encode() if isinstance(text, str) else text)
+
+    def _skip(self, pos: int) -> int:
+        """End offset of the JSON value starting at ``pos``."""
+        buffer = self._buffer
+        first = buffer[pos:pos + 1]
+        if first == b'"':
+            match = _SHORT_STRING.match(buffer, pos)
+            if match is not None:
+                return match.end()
+        elif first not in (b"{", b"["):
+            match = _SCALAR.match(buffer, pos)
+            if match is None:
+                raise ValueError(f"malformed scene JSON at offset {pos}")
+            return match.end()
+        if self._structure is None:
+            self._structure = _Structure(buffer)
+        if first == b'"':
+            return self._structure.string_end(pos)
+        return self._structure.container_end(pos)
+
+    def _field(self, name: str) -> tuple[int, int] | None:
+        """Span of top-level field ``name``, scanning only as far as needed."""
+        if name not in self._fields:
+            for key, start, end in self._scan:
+                self._fields[key] = (start, end)
+                if key == name:
+                    break
+        return self._fields.get(name)
+
+    def _decode(self, start: int, end: int) -> Any:
+        return json.loads(self._buffer[start:end])
+
+    def fields(self) -> list[str]:
+        """Top-level field names, in document order."""
+        for key, start, end in self._scan:
+            self._fields[key] = (start, end)
+        return list(self._fields)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Decoded top-level field ``name``."""
+        if name not in self._values:
+            span = self._field(name)
+            if span is None:
+                return default
+            self._values[name] = self._decode(*span)
+        return self._values[name]
+
+    @property
+    def atlas_name(self) -> str:
+        return self.get("AtlasName", "")
+
+    @property
+    def transform(self) -> AffineTransform:
+        """The scene's affine atlas transform (identity if it has none)."""
+        if "transform" not in self._values:
+            data = _decode_embedded(self.get("AtlasTransform"))
+            self._values["transform"] = parse_transform(data) if data else IDENTITY
+        return self._values["transform"]
+
+    def _index_data(self) -> dict[str, list[tuple[int, int, str | None]]]:
+        if self._data is None:
+            self._data = {}
+            span = self._field("Data")
+            if span is not None:
+                buffer = self._buffer
+                for start, end in _elements(buffer, self._skip, span[0]):
+                    members = list(_members(buffer, self._skip, start))
+                    keys = [key for key, _, _ in members]
+                    if "type" in keys:
+                        _, type_start, type_end = members[keys.index("type")]
+                        entry = (json.loads(buffer[type_start:type_end]), (start, end, None))
+                    elif len(members) == 1:
+                        key, value_start, value_end = members[0]
+                        entry = (key, (value_start, value_end, key))
+                    else:
+                        raise ValueError(f"scene Data entry at offset {start} has no type")
+                    self._data.setdefault(entry[0], []).append(entry[1])
+        return self._data
+
+    def types(self) -> list[str]:
+        """Types of the ``Data`` entries, e.g. ``["probes", "settings"]``."""
+        return list(self._index_data())
+
+    def count(self, type: str) -> int:
+        return len(self._index_data().get(type, ()))
+
+    def entries(self, type: str) -> SceneEntries:
+        """The ``Data`` entries of ``type``; each is decoded when first read."""
+        if type not in self._entries:
+            self._entries[type] = SceneEntries(self, type, self._index_data().get(type, []))
+        return self._entries[type]
+
+    def items(self) -> Iterator[tuple[str, Any]]:
+        """(type, decoded entry) of every ``Data`` entry, in document order."""
+        order = sorted(
+            (span[0], type, i) for type, spans in self._index_data().items() for i, span in enumerate(spans)
+        )
+        for _, type, i in order:
+            yield type, self.entries(type)[i]
+
+    @property
+    def probes(self) -> SceneEntries:
+        return self.entries("probes")
+
+    @property
+    def settings(self) -> Any:
+        """The first settings entry, or None."""
+        entries = self.entries("settings")
+        return entries[0] if len(entries) else None
@@ -0,0 +1,290 @@
+"""Strict loaders for probe metadata, channel selection, insertion and atlas transform JSON.
+
+The README examples store numbers as strings (``"channels":"960"``,
+``"AP":"2.000"``). These loaders validate a record once, against a fixed
+set of known keys, and return immutable, hashable ``__slots__`` objects
+holding native ints and floats, so consumers never re-parse strings and
+records can be used as cache keys. Invalid records raise
+:class:`SchemaError`, naming the record and field.
+
+Batches are converted column by column: the values of one field across
+all records go through a single NumPy conversion, so loading thousands of
+insertions does not convert field by field in Python.
+"""
+
+from __future__ import annotations
+
+import json
+import numbers
+import os
+from dataclasses import dataclass
+from itertools import chain
+from operator import itemgetter
+from typing import Any, Iterable, Mapping, Sequence
+
+import numpy as np
+
+from .atlas_transform import AXES, AffineTransform
+
+
+class SchemaError(ValueError):
+    """A JSON record does not match its schema."""
+
+
+_NUMBER_TYPES = {str, int, float}
+
+
+def _column(records: Sequence[Mapping[str, Any]], key: str, aliases: tuple[str, ...], default: Any) -> list:
+    try:
+        return list(map(itemgetter(key), records))
+    except KeyError:
+        pass
+    values = []
+    for i, record in enumerate(records):
+        for name in (key, *aliases):
+            if name in record:
+                values.append(record[name])
+                break
+        else:
+            if default is None:
+                raise SchemaError(f"record {i}: missing required field {key!r}")
+            values.append(default)
+    return values
+
+
+def _numbers(values: list, key: str, dtype: type) -> np.ndarray:
+    """Convert a column of numbers or numeric strings, checking every value."""
+    if not set(map(type, values)) <= _NUMBER_TYPES:
+        # NumPy scalars (e.g. from InsertionTable columns) are numbers too.
+        bad = next((i for i, v in enumerate(values) if not _is_number_type(v)), None)
+        if bad is not None:
+            raise SchemaError(f"record {bad}: field {key!r} must be a number, got {values[bad]!r}")
+    try:
+        column = np.array(values, dtype=np.float64)
+    except ValueError:
+        bad = next(i for i, v in enumerate(values) if not _is_number(v))
+        raise SchemaError(f"record {bad}: field {key!r} is not a number: {values[bad]!r}") from None
+    invalid = ~np.isfinite(column)
+    if dtype is int:
+        invalid |= column != np.round(column)
+    if invalid.any():
+        bad = int(np.argmax(invalid))
+        kind = "an integer" if dtype is int else "a finite number"
+        raise SchemaError(f"record {bad}: field {key!r} must be {kind}, got {values[bad]!r}")
+    return column.astype(np.int64) if dtype is int else column
+
+
+def _is_number_type(value: Any) -> bool:
+    return isinstance(value, (str, numbers.Real)) and not isinstance(value, (bool, np.bool_))
+
+
+def _is_number(value: Any) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _strings(values: list, key: str) -> list[str]:
+    if not set(map(type, values)) <= {str}:
+        bad = next((i for i, v in enumerate(values) if not isinstance(v, str)), None)
+        if bad is None:
+            return [str(v) for v in values]
+        raise SchemaError(f"record {bad}: field {key!r} must be a string, got {values[bad]!r}")
+    return values
+
+
+def _check_keys(records: Sequence[Mapping[str, Any]], known: set[str]) -> None:
+    if not set(map(type, records)) <= {dict}:
+        for i, record in enumerate(records):
+            if not isinstance(record, Mapping):
+                raise SchemaError(f"record {i}: expected a JSON object, got {type(record).__name__}")
+    if set(chain.from_iterable(records)) - known:
+        bad = next(i for i, record in enumerate(records) if record.keys() - known)
+        raise SchemaError(f"record {bad}: unknown fields {sorted(records[bad].keys() - known)}")
+
+
+# (attribute, JSON key, aliases, type, default); a default of None means required.
+_Field = tuple[str, str, tuple[str, ...], type, Any]
+
+
+def _parse(records: Sequence[Mapping[str, Any]], fields: Sequence[_Field]) -> list:
+    """Validate ``records`` and return one column per field.
+
+    Numeric columns are int64 or float64 arrays, the others lists.
+    """
+    _check_keys(records, {name for _, key, aliases, _, _ in fields for name in (key, *aliases)})
+    columns = []
+    for _, key, aliases, kind, default in fields:
+        values = _column(records, key, aliases, default)
+        if kind is str:
+            columns.append(_strings(values, key))
+        elif kind is tuple:
+            if not all(isinstance(v, list) and all(isinstance(s, str) for s in v) for v in values):
+                raise SchemaError(f"field {key!r} must be a list of strings")
+            columns.append([tuple(v) for v in values])
+        else:
+            columns.append(_numbers(values, key, kind))
+    return columns
+
+
+def _native(columns: list) -> list[list]:
+    return [column.tolist() if isinstance(column, np.ndarray) else column for column in columns]
+
+
+@dataclass(frozen=True, slots=True)
+class ProbeMetadata:
+    """Validated ``metadata.json`` of one probe."""
+
+    name: str
+    type: int
+    producer: str
+    channels: int
+    shanks: int
+    reference_shank: int
+    hardware_files: tuple[str, ...]
+
+
+METADATA_FIELDS: tuple[_Field, ...] = (
+    ("name", "name", (), str, None),
+    ("type", "type", (), int, None),
+    ("producer", "producer", (), str, ""),
+    ("channels", "channels", (), int, None),
+    ("shanks", "shanks", (), int, 1),
+    ("reference_shank", "reference-shank", (), int, 0),
+    ("hardware_files", "hardware-files", (), tuple, []),
+)
+
+
+def parse_metadata(data: Mapping[str, Any]) -> ProbeMetadata:
+    """Validate one decoded ``metadata.json``."""
+    metadata = ProbeMetadata(*(column[0] for column in _native(_parse([data], METADATA_FIELDS))))
+    if metadata.channels < 1 or metadata.shanks < 1:
+        raise SchemaError(f"{metadata.name}: channels and shanks must be positive")
+    if not 0 <= metadata.reference_shank < metadata.shanks:
+        raise SchemaError(f"{metadata.name}: reference-shank {metadata.reference_shank} out of range")
+    return metadata
+
+
+@dataclass(frozen=True, slots=True)
+class SelectionConstraints:
+    """Validated ``selection.json``: how a probe's sites map to recording channels.
+
+    Site ``index`` records on hardware channel ``index % channels``; sites
+    are switched in blocks of ``block_size`` consecutive indices; only
+    sites matching the layer query ``sites`` (all if empty) may be chosen.
+    """
+
+    channels: int
+    block_size: int
+    sites: str
+
+
+SELECTION_FIELDS: tuple[_Field, ...] = (
+    ("channels", "channels", (), int, None),
+    ("block_size", "block-size", (), int, 1),
+    ("sites", "sites", (), str, ""),
+)
+
+
+def parse_selection(data: Mapping[str, Any]) -> SelectionConstraints:
+    """Validate one decoded ``selection.json``."""
+    constraints = SelectionConstraints(*(column[0] for column in _native(_parse([data], SELECTION_FIELDS))))
+    if constraints.channels < 1 or constraints.block_size < 1:
+        raise SchemaError(f"selection: channels and block-size must be positive, got {constraints}")
+    return constraints
+
+
+@dataclass(frozen=True, slots=True)
+class Insertion:
+    """Validated probe insertion (README "Probe Insertion"); mm and degrees."""
+
+    ap: float
+    ml: float
+    dv: float
+    yaw: float
+    pitch: float
+    roll: float
+    atlas_name: str
+    transform_name: str = ""
+    ref_ap: float = 0.0
+    ref_ml: float = 0.0
+    ref_dv: float = 0.0
+    probe_name: str = ""
+
+    def to_json(self) -> dict[str, Any]:
+        return {key: getattr(self, attribute) for attribute, key, _, _, _ in INSERTION_FIELDS}
+
+
+# Aliases are the key spellings used by the README example.
+INSERTION_FIELDS: tuple[_Field, ...] = (
+    ("ap", "AP", (), float, None),
+    ("ml", "ML", (), float, None),
+    ("dv", "DV", ("Dv",), float, None),
+    ("yaw", "Yaw", (), float, None),
+    ("pitch", "Pitch", (), float, None),
+    ("roll", "Roll", (), float, None),
+    ("atlas_name", "AtlasName", ("ReferenceAtlasName",), str, None),
+    ("transform_name", "TransformName", ("AtlasTransformName",), str, ""),
+    ("ref_ap", "RefAP", (), float, 0.0),
+    ("ref_ml", "RefML", (), float, 0.0),
+    ("ref_dv", "RefDV", (), float, 0.0),
+    ("probe_name", "ProbeName", (), str, ""),
+)
+
+
+def insertion_columns(records: Sequence[Mapping[str, Any]]) -> list:
+    """Validate insertion records; one column per :data:`INSERTION_FIELDS` entry.
+
+    Numeric fields are float64 arrays and names are lists of strings.
+    """
+    return _parse(records, INSERTION_FIELDS)
+
+
+def parse_insertions(records: Sequence[Mapping[str, Any]]) -> list[Insertion]:
+    """Validate a batch of insertion records, one NumPy conversion per field."""
+    return [Insertion(*values) for values in zip(*_native(insertion_columns(records)))]
+
+
+def parse_insertion(data: Mapping[str, Any]) -> Insertion:
+    return parse_insertions([data])[0]
+
+
+def load_insertions(path: str | os.PathLike) -> list[Insertion]:
+    """Load an experiment log (see :func:`read_insertion_records`)."""
+    return parse_insertions(read_insertion_records(path))
+
+
+def read_insertion_records(path: str | os.PathLike) -> list:
+    """Decode an experiment log: a JSON array of insertions, or one per line."""
+    with open(path, "rb") as f:
+        text = f.read()
+    if text.lstrip().startswith(b"["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+TRANSFORM_FIELDS: tuple[_Field, ...] = (
+    ("name", "Name", (), str, ""),
+    ("yaw", "Yaw", (), float, 0.0),
+    ("pitch", "Pitch", (), float, 0.0),
+    ("roll", "Roll", (), float, 0.0),
+    *((f"scale_{axis}", f"Scale{axis.upper()}", (), float, 1.0) for axis in AXES),
+    *((f"sign_{axis}", f"Sign{axis.upper()}", (), int, 1) for axis in AXES),
+)
+
+
+def parse_transform(data: Mapping[str, Any]) -> AffineTransform:
+    """Validate an affine atlas transform (README "Affine Transform")."""
+    name, yaw, pitch, roll, *rest = (column[0] for column in _native(_parse([data], TRANSFORM_FIELDS)))
+    scale, sign = tuple(rest[:3]), tuple(rest[3:])
+    if any(s <= 0 for s in scale):
+        raise SchemaError(f"transform {name!r}: scales must be positive, got {scale}")
+    if any(s not in (-1, 1) for s in sign):
+        raise SchemaError(f"transform {name!r}: signs must be 1 or -1, got {sign}")
+    return AffineTransform(name, yaw, pitch, roll, scale, sign)
+
+
+def parse_transforms(records: Iterable[Mapping[str, Any]]) -> list[AffineTransform]:
+    return [parse_transform(record) for record in records]
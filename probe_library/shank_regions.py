@@ -0,0 +1,132 @@
+"""Region boundaries along straight probe shanks.
+
+Instead of looking up every site, each shank's axis is walked through the
+annotation volume with a 3D DDA: the parameters at which the axis crosses
+voxel faces are computed per axis in one array operation, every voxel the
+axis passes through is sampled once, and only the depths where the region
+changes are kept. Sites are then labeled by a binary search of their
+position along the shank over those boundaries, so the cost grows with the
+number of voxels crossed rather than the number of sites.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from .atlas import AtlasLookup
+from .atlas_transform import IDENTITY, AffineTransform
+from .channel_map import ChannelMap
+from .transforms import apply_matrix, insertion_matrices
+
+
+@dataclass
+class ShankProfile:
+    """Regions along one shank.
+
+    Region ``ids[i]`` starts ``starts[i]`` µm above the tip (along the
+    probe-local y axis) and extends to the next start or to ``length``.
+    """
+
+    starts: np.ndarray
+    ids: np.ndarray
+    length: float
+
+    def ids_at(self, y: np.ndarray) -> np.ndarray:
+        """Region id at probe-local heights ``y`` (µm) along the shank."""
+        index = np.searchsorted(self.starts, y, side="right") - 1
+        return self.ids[np.clip(index, 0, len(self.ids) - 1)]
+
+
+def _voxel_crossings(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """Sorted segment parameters in (0, 1) where start->end crosses a voxel face.
+
+    Voxel ``k`` covers [k - 0.5, k + 0.5) along each axis.
+    """
+    crossings = [np.zeros(1), np.ones(1)]
+    for axis in range(3):
+        a, b = start[axis], end[axis]
+        if a == b:
+            continue
+        lo, hi = min(a, b), max(a, b)
+        faces = np.arange(np.ceil(lo - 0.5), np.floor(hi - 0.5) + 1) + 0.5
+        crossings.append((faces - a) / (b - a))
+    t = np.unique(np.concatenate(crossings))
+    return t[(t >= 0) & (t <= 1)]
+
+
+def shank_profile(
+    lookup: AtlasLookup,
+    matrix: np.ndarray,
+    x: float,
+    length: float,
+    z: float = 0.0,
+) -> ShankProfile:
+    """Walk one shank through the annotation volume.
+
+    ``matrix`` maps probe-local µm to voxel indices (see
+    ``atlas_transform.channel_voxel_matrices``); the shank axis runs from
+    ``(x, 0, z)`` to ``(x, length, z)`` in probe-local coordinates.
+    """
+    start = apply_matrix(matrix, np.array([x, 0.0, z]))
+    end = apply_matrix(matrix, np.array([x, length, z]))
+    t = _voxel_crossings(start, end)
+    middle = (t[:-1] + t[1:]) / 2
+    samples = start + middle[:, None] * (end - start)
+
+    voxels = np.rint(samples).astype(np.int64)
+    outside = np.any((voxels < 0) | (voxels >= np.array(lookup.annotation.shape)), axis=1)
+    voxels[outside] = -1
+    ids = lookup.ids_at_voxels(voxels)
+
+    change = np.r_[True, ids[1:] != ids[:-1]]
+    return ShankProfile(starts=t[:-1][change] * length, ids=ids[change], length=length)
+
+
+def shank_profiles(
+    lookup: AtlasLookup,
+    channel_map: ChannelMap,
+    n_shanks: int,
+    ap: float, ml: float, dv: float, yaw: float, pitch: float, roll: float,
+    transform: AffineTransform = IDENTITY,
+) -> tuple[list[ShankProfile], np.ndarray]:
+    """Profile every shank of an inserted probe.
+
+    Each shank's axis is the mean x/z of its sites, running from the tip up
+    to its highest site. Returns the profiles and the per-site shank ids.
+    """
+    matrix = lookup.voxel_transform(transform) @ insertion_matrices(ap, ml, dv, yaw, pitch, roll)
+    shanks = channel_map.shank_ids(n_shanks)
+    profiles = []
+    for shank in range(n_shanks):
+        on_shank = shanks == shank
+        length = float(max(channel_map.y[on_shank].max(initial=0.0), 1.0))
+        profiles.append(
+            shank_profile(
+                lookup,
+                matrix,
+                float(channel_map.x[on_shank].mean()) if on_shank.any() else 0.0,
+                length,
+                float(channel_map.z[on_shank].mean()) if on_shank.any() else 0.0,
+            )
+        )
+    return profiles, shanks
+
+
+def label_channels(
+    lookup: AtlasLookup,
+    channel_map: ChannelMap,
+    n_shanks: int,
+    ap: float, ml: float, dv: float, yaw: float, pitch: float, roll: float,
+    transform: AffineTransform = IDENTITY,
+) -> np.ndarray:
+    """Acronym/color table row of every site, labeled from shank profiles."""
+    profiles, shanks = shank_profiles(
+        lookup, channel_map, n_shanks, ap, ml, dv, yaw, pitch, roll, transform
+    )
+    ids = np.zeros(len(channel_map), dtype=np.int64)
+    for shank, profile in enumerate(profiles):
+        on_shank = shanks == shank
+        ids[on_shank] = profile.ids_at(channel_map.y[on_shank])
+    return lookup.labels_for_ids(ids)
@@ -0,0 +1,152 @@
+"""Partial-volume region labels from electrode site extents.
+
+Labeling a site by the region at its center is wrong where a region
+boundary passes through the site. Here every site is treated as the box
+its ``w``, ``h``, ``d`` extents span around its center, oriented with the
+probe. The box is sampled on a regular grid of points, and each point is
+looked up in the annotation volume. A region's fraction of the site is the
+share of sample points that fall in it.
+
+The sites of all probes are sampled in one batch. Each site's center and
+its three scaled box axes are mapped to voxel space once, so each voxel
+coordinate of all sample points is one matrix product of the unit-box
+offsets with the sites' axes, plus the centers. Points are processed in chunks of
+:data:`CHUNK_POINTS`. The result is a sparse site x region matrix in CSR
+form (:class:`RegionFractions`). Its columns are rows of the atlas
+acronym/color tables. :meth:`RegionFractions.majority` therefore gives
+labels that :func:`~probe_library.anatomical_data.encode_labels` accepts
+directly.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+from .atlas import AtlasLookup
+from .atlas_transform import IDENTITY, AffineTransform
+from .channel_map import ChannelMap
+
+DEFAULT_SAMPLES = 4
+# Sample points looked up per batch; small batches keep the temporaries in cache.
+CHUNK_POINTS = 1 << 16
+
+
+@dataclass
+class RegionFractions:
+    """Sparse site x region volume fractions, in CSR form.
+
+    The regions of site ``s`` are ``labels[indptr[s]:indptr[s + 1]]``, in
+    increasing order, and ``fractions`` holds their shares of the site's
+    volume. Each site's fractions sum to 1. Labels are rows of
+    ``AtlasLookup.acronyms`` / ``colors``, and label 0 is outside the brain.
+    Sites are numbered probe by probe: the sites of probe ``p`` are rows
+    ``probe_starts[p]:probe_starts[p + 1]``.
+    """
+
+    indptr: np.ndarray
+    labels: np.ndarray
+    fractions: np.ndarray
+    probe_starts: np.ndarray
+    n_labels: int
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def majority(self) -> np.ndarray:
+        """(n_sites,) label with the largest fraction per site, lowest label on ties."""
+        row = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        order = np.lexsort((self.labels, -self.fractions, row))
+        return self.labels[order[self.indptr[:-1]]]
+
+    def per_probe(self, values: np.ndarray) -> list[np.ndarray]:
+        """Split per-site ``values`` (e.g. :meth:`majority`) into one array per probe."""
+        return np.split(np.asarray(values), self.probe_starts[1:-1])
+
+    def to_scipy(self):
+        """The fractions as a ``scipy.sparse.csr_array`` of shape (n_sites, n_labels)."""
+        try:
+            from scipy.sparse import csr_array
+        except ImportError:
+            raise ImportError("RegionFractions.to_scipy requires scipy") from None
+        return csr_array((self.fractions, self.labels, self.indptr), shape=(len(self), self.n_labels))
+
+
+def _sample_offsets(samples: int | Sequence[int]) -> np.ndarray:
+    """(K, 3) cell centers of a regular grid over the unit box [-0.5, 0.5]^3."""
+    counts = np.broadcast_to(np.asarray(samples, dtype=np.int64), (3,))
+    if np.any(counts < 1):
+        raise ValueError(f"samples must be at least 1 per axis, got {samples}")
+    axes = [(np.arange(count) + 0.5) / count - 0.5 for count in counts.tolist()]
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+
+
+def site_region_fractions(
+    lookup: AtlasLookup,
+    matrices: np.ndarray,
+    channel_maps: ChannelMap | Sequence[ChannelMap],
+    transform: AffineTransform = IDENTITY,
+    samples: int | Sequence[int] = DEFAULT_SAMPLES,
+) -> RegionFractions:
+    """Region fractions of every site of every inserted probe.
+
+    ``matrices`` are (P, 4, 4) insertion matrices (see
+    :func:`~probe_library.transforms.insertion_matrices`). ``channel_maps`` is
+    one channel map shared by all probes or one channel map per probe.
+    ``samples`` is the number of sample points along each site axis
+    (x, y, z), either one count for all three axes or one count per axis.
+    """
+    matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+    if isinstance(channel_maps, ChannelMap):
+        channel_maps = [channel_maps] * len(matrices)
+    if len(channel_maps) != len(matrices):
+        raise ValueError(f"got {len(channel_maps)} channel maps for {len(matrices)} probes")
+    sizes = np.array([len(channel_map) for channel_map in channel_maps], dtype=np.int64)
+    probe_starts = np.concatenate([[0], np.cumsum(sizes)])
+    offsets = _sample_offsets(samples)
+    n_labels = len(lookup.structure_ids)
+    if not probe_starts[-1]:
+        empty = np.empty(0, dtype=np.int32)
+        return RegionFractions(probe_starts[:1].copy(), empty, empty.astype(np.float32), probe_starts, n_labels)
+
+    # Site centers and box axes, in voxel space, for all probes at once.
+    voxel = lookup.voxel_transform(transform) @ matrices
+    geometry = np.concatenate(
+        [channel_map.site_geometry(np.arange(len(channel_map))) for channel_map in channel_maps]
+    ).astype(np.float64)
+    probe = np.repeat(np.arange(len(matrices)), sizes)
+    linear = voxel[probe, :3, :3]
+    centers = (np.einsum("sij,sj->si", linear, geometry[:, :3]) + voxel[probe, :3, 3]).T
+    # axes[i, j, s] is voxel coordinate i of site s's box edge along probe-local axis j.
+    axes = (linear * geometry[:, None, 3:]).transpose(1, 2, 0)
+
+    shape = lookup.annotation.shape
+    n_sites = len(geometry)
+    labels = np.empty((n_sites, len(offsets)), dtype=np.int32)
+    chunk = max(CHUNK_POINTS // len(offsets), 1)
+    for start in range(0, n_sites, chunk):
+        rows = slice(start, start + chunk)
+        # One (K, 3) x (3, sites) product per voxel axis gives (K, sites) coordinates.
+        voxels = []
+        inside = np.ones((len(offsets), len(centers[0, rows])), dtype=bool)
+        for axis in range(3):
+            coordinate = np.rint(offsets @ axes[axis, :, rows] + centers[axis, rows]).astype(np.int64)
+            inside &= (coordinate >= 0) & (coordinate < shape[axis])
+            voxels.append(coordinate)
+        ids = np.zeros(inside.shape, dtype=np.int64)
+        ids[inside] = lookup.annotation[voxels[0][inside], voxels[1][inside], voxels[2][inside]]
+        labels[rows] = lookup.labels_for_ids(ids).T
+
+    # Count each site's distinct labels from its sorted samples.
+    labels.sort(axis=1)
+    first = np.ones(labels.shape, dtype=bool)
+    first[:, 1:] = labels[:, 1:] != labels[:, :-1]
+    site, column = np.nonzero(first)
+    ends = np.append(column[1:], len(offsets))
+    ends[np.r_[site[1:] != site[:-1], True]] = len(offsets)
+    indptr = np.zeros(n_sites + 1, dtype=np.int64)
+    np.cumsum(np.bincount(site, minlength=n_sites), out=indptr[1:])
+    fractions = ((ends - column) / len(offsets)).astype(np.float32)
+    return RegionFractions(indptr, labels[site, column], fractions, probe_starts, n_labels)
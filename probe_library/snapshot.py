@@ -0,0 +1,327 @@
+"""Binary scene snapshots for fast autosave and restore.
+
+A snapshot holds the same information as a scene JSON file, in the array
+container used for channel map sidecars (magic ``PLSCENE``):
+
+* the atlas name and the affine transform parameters and matrix,
+* the probe insertions as a float64 (9, N) array (AP, ML, DV, Yaw, Pitch,
+  Roll, RefAP, RefML, RefDV) with a uint8 (9, N) format code per value, and
+  int32 (3, N) codes into a string table for AtlasName, TransformName and
+  ProbeName (the probe library entry),
+* any other fields of each insertion and all other ``Data`` entries as
+  JSON text.
+
+Converting scene JSON to a snapshot and back is lossless. The format code
+of each value records whether it was absent, a JSON float, integer or
+``null``, or a string such as ``"2.000"`` with a fixed number of decimals;
+values that fit none of these are kept as JSON text. ``Data`` entries
+keep their order and form; a probe entry serialized to a string that would
+not be reproduced exactly is kept as JSON text instead of in the arrays.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+import numpy as np
+
+from ._binary import decode_strings, encode_strings, read_arrays, write_arrays
+from .atlas_transform import IDENTITY, AffineTransform
+from .scene import Scene
+from .schema import parse_transform
+
+MAGIC = b"PLSCENE\0"
+VERSION = 2
+SUFFIX = ".scene"
+
+PROBE_TYPE = "probes"
+NUMERIC_FIELDS = ("AP", "ML", "DV", "Yaw", "Pitch", "Roll", "RefAP", "RefML", "RefDV")
+NAME_FIELDS = ("AtlasName", "TransformName", "ProbeName")
+_FIELDS = NUMERIC_FIELDS + NAME_FIELDS
+
+# Format codes of the numeric fields; QUOTED + d is a string with d decimals.
+ABSENT, FLOAT, INTEGER, NULL, QUOTED = range(5)
+_MAX_DECIMALS = 255 - QUOTED
+# Forms of a probe ``Data`` entry: {"type": "probes", ...}, {"probes": {...}},
+# and {"probes": "..."} serialized with json's default or compact separators.
+TYPED, KEYED, ENCODED, ENCODED_COMPACT = range(4)
+_COMPACT = (",", ":")
+_MISSING = object()
+
+
+def _format(value: Any) -> int | None:
+    """Format code of a numeric field value, or None if it has none."""
+    if isinstance(value, str):
+        decimals = len(value) - value.index(".") - 1 if "." in value else 0
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+        if decimals <= _MAX_DECIMALS and f"{number:.{decimals}f}" == value:
+            return QUOTED + decimals
+        return None
+    if isinstance(value, float):
+        return FLOAT
+    if isinstance(value, int) and not isinstance(value, bool) and abs(value) <= 1 << 53:
+        return INTEGER
+    if value is None:
+        return NULL
+    return None
+
+
+def _value(number: float, format: int) -> Any:
+    if format == FLOAT:
+        return number
+    if format == INTEGER:
+        return int(number)
+    if format == NULL:
+        return None
+    return f"{number:.{format - QUOTED}f}"
+
+
+def _entry(type: str, value: Any, form: int = TYPED) -> dict[str, Any]:
+    """A ``Data`` entry in ``form``; values with their own ``"type"`` key keep the ``{type: value}`` form."""
+    if form == ENCODED:
+        return {type: json.dumps(value)}
+    if form == ENCODED_COMPACT:
+        return {type: json.dumps(value, separators=_COMPACT)}
+    if form == TYPED and isinstance(value, dict) and "type" not in value:
+        return {"type": type, **value}
+    return {type: value}
+
+
+def _probe_form(entry: dict[str, Any]) -> int:
+    if "type" in entry:
+        return TYPED
+    value = entry[PROBE_TYPE]
+    if not isinstance(value, str):
+        return KEYED
+    return ENCODED_COMPACT if ": " not in value else ENCODED
+
+
+@dataclass
+class SceneSnapshot:
+    """A scene as typed arrays.
+
+    ``insertions`` is float64 (9, N) with rows :data:`NUMERIC_FIELDS` and
+    ``formats`` their uint8 format codes (:data:`ABSENT`, :data:`FLOAT`,
+    :data:`INTEGER`, :data:`NULL` or :data:`QUOTED` plus the number of
+    decimals). ``codes`` is int32 (3, N), rows :data:`NAME_FIELDS`,
+    indexing ``names`` (-1 where absent). ``extras`` holds each insertion's
+    remaining fields as JSON object text (``""`` if none) and ``forms`` the
+    form of its ``Data`` entry. ``data`` holds the other ``Data`` entries as
+    (type, entry JSON text) pairs, at positions ``data_positions`` of the
+    ``Data`` list.
+    """
+
+    atlas_name: str
+    transform: AffineTransform
+    insertions: np.ndarray
+    formats: np.ndarray
+    codes: np.ndarray
+    names: list[str]
+    extras: list[str]
+    forms: np.ndarray
+    data: list[tuple[str, str]] = field(default_factory=list)
+    data_positions: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return self.insertions.shape[1]
+
+    @classmethod
+    def from_entries(
+        cls,
+        atlas_name: str,
+        transform: AffineTransform,
+        entries: Iterable[tuple[str, Any]],
+    ) -> "SceneSnapshot":
+        """Build a snapshot from (type, decoded JSON) ``Data`` entries, in order.
+
+        Entries are written back in the ``{"type": ...}`` form.
+        """
+        return cls._build(atlas_name, transform, [(type, value, _entry(type, value)) for type, value in entries])
+
+    @classmethod
+    def _build(
+        cls,
+        atlas_name: str,
+        transform: AffineTransform,
+        entries: list[tuple[str, Any, dict[str, Any]]],
+        raw: frozenset[int] = frozenset(),
+    ) -> "SceneSnapshot":
+        """Build from (type, value, entry) triples; entries in ``raw`` are kept as JSON text."""
+        probes, forms, positions, data = [], [], [], []
+        for position, (type, value, entry) in enumerate(entries):
+            if type == PROBE_TYPE and isinstance(value, dict) and position not in raw:
+                probes.append(value)
+                forms.append(_probe_form(entry))
+            else:
+                positions.append(position)
+                data.append((type, json.dumps(entry)))
+
+        n = len(probes)
+        formats = np.zeros((len(NUMERIC_FIELDS), n), dtype=np.uint8)
+        insertions = np.full((len(NUMERIC_FIELDS), n), np.nan)
+        rests = [{} for _ in probes]
+        for row, name in enumerate(NUMERIC_FIELDS):
+            values = [probe.get(name, _MISSING) for probe in probes]
+            row_formats = [ABSENT if value is _MISSING else _format(value) for value in values]
+            for i, format in enumerate(row_formats):
+                if format is None:
+                    rests[i][name] = values[i]
+                    row_formats[i] = ABSENT
+            formats[row] = row_formats
+            insertions[row] = [
+                float(value) if format not in (ABSENT, NULL) else np.nan
+                for value, format in zip(values, row_formats)
+            ]
+
+        names: dict[str, int] = {}
+        codes = np.full((len(NAME_FIELDS), n), -1, dtype=np.int32)
+        for row, name in enumerate(NAME_FIELDS):
+            for i, probe in enumerate(probes):
+                value = probe.get(name)
+                if isinstance(value, str):
+                    codes[row, i] = names.setdefault(value, len(names))
+                elif name in probe:
+                    rests[i][name] = value
+        for rest, probe in zip(rests, probes):
+            rest.update((k, v) for k, v in probe.items() if k not in _FIELDS)
+        snapshot = cls(
+            atlas_name,
+            transform,
+            insertions,
+            formats,
+            codes,
+            list(names),
+            [json.dumps(rest) if rest else "" for rest in rests],
+            np.array(forms, dtype=np.uint8),
+            data,
+            np.array(positions, dtype=np.int64),
+        )
+
+        # Entries serialized to a string are kept as JSON text unless they
+        # are reproduced exactly (same key order and whitespace).
+        probe_positions = np.delete(np.arange(len(entries)), snapshot.data_positions)
+        mismatched = {
+            position
+            for i, position in enumerate(probe_positions.tolist())
+            if forms[i] >= ENCODED and snapshot._probe_entry(i) != entries[position][2]
+        }
+        if mismatched:
+            return cls._build(atlas_name, transform, entries, raw | mismatched)
+        return snapshot
+
+    @classmethod
+    def from_scene(cls, scene: Scene) -> "SceneSnapshot":
+        return cls.from_entries(scene.atlas_name, scene.transform, scene.items())
+
+    @classmethod
+    def from_json(cls, scene: dict[str, Any]) -> "SceneSnapshot":
+        """Build a snapshot from a decoded scene JSON object."""
+        transform = scene.get("AtlasTransform")
+        if isinstance(transform, str):
+            transform = json.loads(transform) if transform.strip() else None
+        entries = []
+        for entry in scene.get("Data", []):
+            if "type" in entry:
+                value = {k: v for k, v in entry.items() if k != "type"}
+                entries.append((entry["type"], value, entry))
+            else:
+                ((type, value),) = entry.items()
+                if isinstance(value, str) and value.lstrip()[:1] in ("{", "["):
+                    value = json.loads(value)
+                entries.append((type, value, entry))
+        return cls._build(
+            scene.get("AtlasName", ""),
+            parse_transform(transform) if transform else IDENTITY,
+            entries,
+        )
+
+    def probe(self, i: int) -> dict[str, Any]:
+        """Insertion ``i`` as a scene JSON object (without its type)."""
+        probe: dict[str, Any] = {}
+        formats = self.formats[:, i].tolist()
+        for row, name in enumerate(NUMERIC_FIELDS):
+            if formats[row] != ABSENT:
+                probe[name] = _value(float(self.insertions[row, i]), formats[row])
+        for row, name in enumerate(NAME_FIELDS):
+            if self.codes[row, i] >= 0:
+                probe[name] = self.names[self.codes[row, i]]
+        if self.extras[i]:
+            probe.update(json.loads(self.extras[i]))
+        return probe
+
+    def _probe_entry(self, i: int) -> dict[str, Any]:
+        return _entry(PROBE_TYPE, self.probe(i), int(self.forms[i]))
+
+    def to_json(self) -> dict[str, Any]:
+        """The scene JSON object, with the transform serialized to a string."""
+        data: list[Any] = [None] * (len(self) + len(self.data))
+        probe_positions = np.delete(np.arange(len(data)), self.data_positions)
+        for i, position in enumerate(probe_positions.tolist()):
+            data[position] = self._probe_entry(i)
+        for position, (_, text) in zip(self.data_positions.tolist(), self.data):
+            data[position] = json.loads(text)
+        return {
+            "AtlasName": self.atlas_name,
+            "AtlasTransform": "" if self.transform == IDENTITY else json.dumps(self.transform.to_json()),
+            "Data": data,
+        }
+
+
+def save_snapshot(path: str | os.PathLike, snapshot: SceneSnapshot) -> None:
+    """Atomically write ``snapshot`` to ``path``."""
+    transform = snapshot.transform
+    write_arrays(
+        path,
+        MAGIC,
+        VERSION,
+        {
+            "strings": encode_strings([snapshot.atlas_name, transform.name]),
+            "transform": np.array(
+                [transform.yaw, transform.pitch, transform.roll, *transform.scale, *transform.sign],
+                dtype=np.float64,
+            ),
+            "matrix": np.asarray(transform.matrix, dtype=np.float64),
+            "insertions": snapshot.insertions.astype(np.float64, copy=False),
+            "formats": snapshot.formats.astype(np.uint8, copy=False),
+            "codes": snapshot.codes.astype(np.int32, copy=False),
+            "names": encode_strings(snapshot.names),
+            "extras": encode_strings(snapshot.extras),
+            "forms": snapshot.forms.astype(np.uint8, copy=False),
+            "data_types": encode_strings([type for type, _ in snapshot.data]),
+            "data": encode_strings([text for _, text in snapshot.data]),
+            "data_positions": snapshot.data_positions.astype(np.int64, copy=False),
+            "counts": np.array([len(snapshot.names), len(snapshot.data)], dtype=np.int64),
+        },
+    )
+
+
+def load_snapshot(path: str | os.PathLike) -> SceneSnapshot:
+    """Read a snapshot written by :func:`save_snapshot`; arrays are memory-mapped."""
+    arrays, _ = read_arrays(path, MAGIC, VERSION)
+    atlas_name, transform_name = decode_strings(arrays["strings"], 2)
+    parameters = arrays["transform"].tolist()
+    n_names, n_data = arrays["counts"].tolist()
+    n = arrays["insertions"].shape[1]
+    return SceneSnapshot(
+        atlas_name=atlas_name,
+        transform=AffineTransform(
+            transform_name,
+            *parameters[:3],
+            scale=tuple(parameters[3:6]),
+            sign=tuple(int(s) for s in parameters[6:9]),
+        ),
+        insertions=arrays["insertions"],
+        formats=arrays["formats"],
+        codes=arrays["codes"],
+        names=decode_strings(arrays["names"], n_names),
+        extras=decode_strings(arrays["extras"], n),
+        forms=arrays["forms"],
+        data=list(zip(decode_strings(arrays["data_types"], n_data), decode_strings(arrays["data"], n_data))),
+        data_positions=arrays["data_positions"],
+    )
@@ -0,0 +1,146 @@
+"""Brain surface entry points and insertion depths.
+
+A signed distance field (SDF) of the brain mask, in atlas mm, is computed
+once per atlas and resolution and saved as ``<atlas>_sdf.npy`` in a cache
+directory; later sessions memory-map it. Entry points are then found for a
+whole batch of insertions at once by sphere tracing: each probe axis is
+marched from where it enters the atlas volume down toward the tip in steps
+of the local distance to the surface, which never overshoots it.
+
+Building the SDF requires scipy; querying a cached SDF does not.
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+from .atlas import AtlasLookup
+from .atlas_transform import AXES, IDENTITY, AffineTransform
+from .transforms import insertion_rotation
+
+DEFAULT_TOLERANCE_MM = 0.005
+MAX_STEPS = 256
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "probe_library", "surfaces")
+
+
+def signed_distance(lookup: AtlasLookup) -> np.ndarray:
+    """Signed distance (mm) to the brain surface: negative inside, positive outside."""
+    try:
+        from scipy.ndimage import distance_transform_edt
+    except ImportError:
+        raise ImportError("building a brain surface distance field requires scipy") from None
+    resolution = np.broadcast_to(np.asarray(lookup.resolution_um, dtype=np.float64), (3,))
+    sampling = [resolution[AXES.index(axis)] / 1000.0 for axis in lookup.axis_order]
+    brain = np.asarray(lookup.annotation) != 0
+    outside = distance_transform_edt(~brain, sampling=sampling)
+    inside = distance_transform_edt(brain, sampling=sampling)
+    return (outside - inside).astype(np.float32)
+
+
+def _trilinear(volume: np.ndarray, voxels: np.ndarray) -> np.ndarray:
+    """Sample ``volume`` at (n, 3) fractional voxel indices, clamped to its bounds."""
+    upper = np.array(volume.shape) - 1
+    voxels = np.clip(voxels, 0, upper)
+    base = np.minimum(np.floor(voxels).astype(np.int64), np.maximum(upper - 1, 0))
+    frac = voxels - base
+    result = np.zeros(len(voxels))
+    for corner in np.ndindex(2, 2, 2):
+        corner = np.array(corner)
+        index = np.minimum(base + corner, upper)
+        weight = np.prod(np.where(corner, frac, 1.0 - frac), axis=1)
+        result += weight * volume[index[:, 0], index[:, 1], index[:, 2]]
+    return result
+
+
+class BrainSurface:
+    """Batched entry point and depth queries against a brain SDF."""
+
+    def __init__(self, lookup: AtlasLookup, sdf: np.ndarray):
+        if sdf.shape != lookup.annotation.shape:
+            raise ValueError("distance field and annotation volume shapes differ")
+        self.lookup = lookup
+        self.sdf = sdf
+
+    @classmethod
+    def load(cls, lookup: AtlasLookup, cache_dir: str | os.PathLike | None = None) -> "BrainSurface":
+        """Memory-map the cached SDF for ``lookup``'s atlas, building it if needed."""
+        if not lookup.name:
+            raise ValueError("the atlas lookup needs a name to key the surface cache")
+        directory = os.fspath(cache_dir or default_cache_dir())
+        path = os.path.join(directory, f"{lookup.name}_sdf.npy")
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp, signed_distance(lookup))
+            os.replace(tmp, path)
+        return cls(lookup, np.load(path, mmap_mode="r"))
+
+    def distance(self, points: np.ndarray, transform: AffineTransform = IDENTITY) -> np.ndarray:
+        """Signed atlas-space distance (mm) to the surface at (n, 3) points."""
+        matrix = self.lookup.voxel_transform(transform)
+        voxels = points @ matrix[:3, :3].T + matrix[:3, 3]
+        return _trilinear(self.sdf, voxels)
+
+    def entry_points(
+        self,
+        ap, ml, dv, yaw, pitch, roll,
+        transform: AffineTransform = IDENTITY,
+        tolerance: float = DEFAULT_TOLERANCE_MM,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Where each probe axis enters the brain, and the tip's depth below it.
+
+        Arguments are arrays of insertions, as for ``insertion_matrices``.
+        Returns the (N, 3) entry coordinates (in the insertion space) and
+        the (N,) depths in mm along the probe axis from entry to tip.
+        Insertions whose axis never meets the brain give NaN.
+        """
+        ap, ml, dv, yaw, pitch, roll = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in (ap, ml, dv, yaw, pitch, roll))
+        )
+        tip = np.stack([ap, ml, dv], axis=1)
+        up = insertion_rotation(yaw, pitch, roll)[:, :, 1]
+
+        matrix = self.lookup.voxel_transform(transform)
+        linear = matrix[:3, :3]
+        tip_voxel = tip @ linear.T + matrix[:3, 3]
+        up_voxel = up @ linear.T
+
+        # Clip each ray (tip + s * up, s >= 0) to the volume box (slab test).
+        upper = np.array(self.sdf.shape) - 1.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t0 = (0.0 - tip_voxel) / up_voxel
+            t1 = (upper - tip_voxel) / up_voxel
+        inside_slab = (tip_voxel >= 0) & (tip_voxel <= upper)
+        t_far = np.where(up_voxel != 0, np.maximum(t0, t1), np.where(inside_slab, np.inf, -np.inf))
+        s_start = np.min(t_far, axis=1)
+        valid = np.isfinite(s_start) & (s_start >= 0)
+
+        # Steps are taken in insertion-space mm; an atlas-space distance d
+        # allows a step of at least d / (largest stretch of the inverse transform).
+        stretch = np.linalg.norm(transform.inverse[:3, :3], ord=2)
+        s = np.where(valid, s_start, np.nan)
+        active = valid.copy()
+        entered = np.zeros_like(valid)
+        for _ in range(MAX_STEPS):
+            if not active.any():
+                break
+            index = np.flatnonzero(active)
+            points = tip[index] + s[index, None] * up[index]
+            d = self.distance(points, transform)
+            hit = d <= tolerance
+            entered[index[hit]] = True
+            step = np.maximum(d[~hit], tolerance) / stretch
+            s[index[~hit]] -= step
+            passed = s[index[~hit]] < 0
+            active[index[hit]] = False
+            active[index[~hit][passed]] = False
+
+        depth = np.where(entered, s, np.nan)
+        entry = tip + depth[:, None] * up
+        return entry, depth
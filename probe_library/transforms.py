@@ -0,0 +1,159 @@
+"""Batched coordinate transforms for probe insertions.
+
+Insertion coordinates are (AP, ML, DV) in mm relative to the insertion's
+reference coordinate (RefAP, RefML, RefDV), along the axes of the space the
+insertion is defined in. With no atlas transform (the identity) that is the
+reference atlas's own axes. For BrainGlobe atlases such as CCF, +AP is
+posterior, +ML is left and +DV is ventral, following their voxel indices.
+Transforms such as Qiu2018 flip axes: its ``SignAP = SignDV = -1`` makes +AP
+anterior and +DV dorsal.
+
+Channel map positions are probe-local (x, y, z) in µm relative to the tip: x
+runs across the shank, y up the shank and z out of the electrode face.
+
+At (yaw, pitch, roll) = (0, 0, 0) the probe axes are x -> +ML, y -> +DV and
+z -> +AP. Where +DV is dorsal and +AP anterior (the README convention), the
+probe points down with its sites facing anterior. Angles are in degrees:
+
+* roll rotates the probe clockwise (seen from above) around its own shank,
+* pitch then tilts the top of the probe posteriorly, bringing it up toward
+  horizontal,
+* yaw finally rotates the whole probe clockwise around the DV axis.
+
+Each insertion is compiled into one 4 x 4 homogeneous matrix, so the sites
+of N insertions are placed with a single batched matrix product.
+:func:`channel_positions` also folds the inverse atlas transform and the
+reference offset into that matrix, giving absolute atlas (world)
+coordinates.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .atlas_transform import AffineTransform
+
+UM_PER_MM = 1000.0
+
+# Columns are the (AP, ML, DV) directions of the probe-local x, y, z axes.
+PROBE_AXES = np.array(
+    [
+        [0.0, 0.0, 1.0],
+        [1.0, 0.0, 0.0],
+        [0.0, 1.0, 0.0],
+    ]
+)
+
+
+def _rotation(angle, i: int, j: int) -> np.ndarray:
+    """Batched rotation in the (i, j) plane taking axis i toward axis j."""
+    theta = np.deg2rad(np.asarray(angle, dtype=np.float64))
+    c, s = np.cos(theta), np.sin(theta)
+    rotation = np.zeros(theta.shape + (3, 3))
+    k = 3 - i - j
+    rotation[..., k, k] = 1.0
+    rotation[..., i, i] = c
+    rotation[..., j, j] = c
+    rotation[..., j, i] = s
+    rotation[..., i, j] = -s
+    return rotation
+
+
+def rotation_dv(angle) -> np.ndarray:
+    """Clockwise rotation (seen from above) around the DV axis, AP toward ML."""
+    return _rotation(angle, 0, 1)
+
+
+def rotation_ml(angle) -> np.ndarray:
+    """Rotation around the ML axis taking +DV toward -AP."""
+    return _rotation(angle, 0, 2)
+
+
+def rotation_ap(angle) -> np.ndarray:
+    """Clockwise rotation (seen from behind) around the AP axis, ML toward -DV."""
+    return _rotation(angle, 2, 1)
+
+
+def insertion_rotation(yaw, pitch, roll) -> np.ndarray:
+    """Return (..., 3, 3) matrices mapping probe-local axes to (AP, ML, DV)."""
+    return rotation_dv(yaw) @ rotation_ml(pitch) @ rotation_dv(roll) @ PROBE_AXES
+
+
+def insertion_matrices(ap, ml, dv, yaw, pitch, roll) -> np.ndarray:
+    """Compile insertions into (..., 4, 4) homogeneous matrices.
+
+    The matrices map probe-local site positions in µm to (AP, ML, DV) in mm
+    relative to the reference coordinate. All arguments broadcast.
+    """
+    ap, ml, dv, yaw, pitch, roll = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (ap, ml, dv, yaw, pitch, roll))
+    )
+    matrices = np.zeros(ap.shape + (4, 4))
+    matrices[..., :3, :3] = insertion_rotation(yaw, pitch, roll) / UM_PER_MM
+    matrices[..., 0, 3] = ap
+    matrices[..., 1, 3] = ml
+    matrices[..., 2, 3] = dv
+    matrices[..., 3, 3] = 1.0
+    return matrices
+
+
+def apply_matrices(
+    matrices: np.ndarray,
+    points: np.ndarray,
+    out: np.ndarray | None = None,
+    dtype=np.float32,
+) -> np.ndarray:
+    """Apply N homogeneous matrices to the same (n, 3) points.
+
+    Returns an (N, n, 3) array. ``out`` may be a preallocated (or
+    memory-mapped) array of that shape, e.g. for 100k insertions x 960
+    sites, which would otherwise need over a gigabyte of float32.
+    """
+    matrices = np.asarray(matrices)
+    points = np.asarray(points, dtype=dtype)
+    linear = matrices[..., :3, :3].astype(dtype, copy=False)
+    offset = matrices[..., None, :3, 3].astype(dtype, copy=False)
+    if out is None:
+        out = np.empty(matrices.shape[:-2] + points.shape, dtype=dtype)
+    np.matmul(points, linear.swapaxes(-1, -2), out=out)
+    out += offset
+    return out
+
+
+def apply_matrix(matrix: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Apply one homogeneous matrix to (..., 3) points."""
+    matrix = np.asarray(matrix)
+    return np.asarray(points) @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def channel_positions(
+    ap, ml, dv, yaw, pitch, roll,
+    sites: np.ndarray,
+    out: np.ndarray | None = None,
+    ref_ap=0.0,
+    ref_ml=0.0,
+    ref_dv=0.0,
+    transform: AffineTransform | None = None,
+) -> np.ndarray:
+    """Place the (n, 3) probe-local ``sites`` for every insertion in world coordinates.
+
+    ``sites`` is typically ``ChannelMap.position``. Returns (N, n, 3)
+    absolute (AP, ML, DV) atlas coordinates in mm. Each insertion is mapped
+    out of its transformed space with the inverse of ``transform`` (if
+    given) and offset by its reference coordinate ``ref_ap``, ``ref_ml``,
+    ``ref_dv``, as in
+    :meth:`~probe_library.insertion_table.InsertionTable.world_matrices`.
+    With the default zero reference and no transform the result is relative
+    to the reference coordinate. All insertion arguments broadcast.
+    """
+    ap, ml, dv, yaw, pitch, roll, ref_ap, ref_ml, ref_dv = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (ap, ml, dv, yaw, pitch, roll, ref_ap, ref_ml, ref_dv))
+    )
+    matrices = insertion_matrices(ap, ml, dv, yaw, pitch, roll)
+    if transform is not None:
+        matrices = transform.inverse @ matrices
+    matrices[..., :3, 3] += np.stack([ref_ap, ref_ml, ref_dv], axis=-1)
+    return apply_matrices(matrices, sites, out=out)
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def np1_table(n_channels, n_layers=3, seed=0):
+    """(header, rows) of a Neuropixels 1.0-like channel map with random layers."""
+    rng = np.random.default_rng(seed)
+    index = np.arange(n_channels)
+    columns = [
+        index,
+        np.tile([-14, 18, -30, 2], n_channels // 4 + 1)[:n_channels],
+        200 + 20 * (index // 2),
+        np.zeros(n_channels, dtype=int),
+        np.full(n_channels, 12),
+        np.full(n_channels, 12),
+        np.full(n_channels, 24),
+    ]
+    layers = rng.integers(0, 2, size=(n_layers, n_channels))
+    header = ["index", "x", "y", "z", "w", "h", "d"] + [f"bank{i}" for i in range(n_layers)]
+    return header, np.column_stack([*columns, *layers])
+
+
+@pytest.fixture
+def np1_csv(tmp_path):
+    """Write a Neuropixels 1.0-like ``channel_map.csv`` and return its path."""
+
+    def write(n_channels=960, n_layers=3, seed=0, name="channel_map.csv"):
+        header, rows = np1_table(n_channels, n_layers, seed)
+        path = tmp_path / name
+        with open(path, "w") as f:
+            f.write(",".join(header) + "\n")
+            np.savetxt(f, rows, fmt="%d", delimiter=",")
+        return path
+
+    return write
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from probe_library.anatomical_data import (
+    UNLABELED,
+    decode,
+    decode_probe,
+    encode,
+    encode_labels,
+    encode_probe,
+    split_probes,
+)
+
+ACRONYMS = ["root", "ACAv", "ACAd"]
+COLORS = ["FFFFFF", "40A666", "40A667"]
+
+
+def _channel_acronyms(probes):
+    return [probe.channel_acronyms().tolist() for probe in probes]
+
+
+@pytest.mark.parametrize("compressed", [True, False])
+def test_round_trip(compressed):
+    rng = np.random.default_rng(0)
+    labels = np.repeat(rng.integers(0, 3, (3, 40)), 5, axis=1)
+    names = ["ProbeA", "ProbeB", "ProbeC"]
+    probes = decode(encode(names, labels, ACRONYMS, COLORS, compressed))
+    assert [probe.name for probe in probes] == names
+    assert _channel_acronyms(probes) == np.array(ACRONYMS)[labels].tolist()
+    assert [probe.channel_colors().tolist() for probe in probes] == np.array(COLORS)[labels].tolist()
+
+
+def test_runs_do_not_cross_probes():
+    labels = np.array([[0, 0, 1], [1, 1, 1]])
+    assert encode_labels(["A", "B"], labels, ACRONYMS, COLORS) == [
+        "A;0-1,root,FFFFFF;2-2,ACAv,40A666",
+        "B;0-2,ACAv,40A666",
+    ]
+
+
+def test_encode_probe_from_strings():
+    message = encode_probe("A", np.array(["root", "root", "ACAv"]), np.array(["FFFFFF", "FFFFFF", "40A666"]))
+    assert message == "A;0-1,root,FFFFFF;2-2,ACAv,40A666"
+
+
+def test_zero_channel_probes():
+    labels = np.empty((2, 0), dtype=np.int32)
+    message = encode(["ProbeA", "ProbeB"], labels, ACRONYMS, COLORS)
+    assert message == "[ProbeA;,ProbeB;]"
+    probes = decode(message)
+    assert [probe.name for probe in probes] == ["ProbeA", "ProbeB"]
+    assert all(len(probe.labels) == 0 for probe in probes)
+    assert encode([], np.empty((0, 4), dtype=np.int32), ACRONYMS, COLORS) == "[]"
+    assert decode("[]") == []
+
+
+def test_split_mixed_empty_and_nonempty():
+    message = "[A;,B;0-1,ACAv,40A666,C;,D;]"
+    assert split_probes(message) == ["A;", "B;0-1,ACAv,40A666", "C;", "D;"]
+    assert split_probes('["A;", "B;0,ACAv,40A666"]') == ["A;", "B;0,ACAv,40A666"]
+
+
+def test_missing_channels_are_unlabeled():
+    probe = decode_probe("A;2-3,ACAv,40A666")
+    assert probe.labels[:2].tolist() == [UNLABELED, UNLABELED]
+    assert probe.channel_acronyms().tolist() == ["-", "-", "ACAv", "ACAv"]
+
+
+def test_malformed_entry():
+    with pytest.raises(ValueError):
+        decode_probe("A;0-1,ACAv")
+    with pytest.raises(ValueError):
+        decode_probe("A;3-1,ACAv,40A666")
@@ -0,0 +1,83 @@
+import numpy as np
+
+from probe_library.anatomical_data import join_probes
+from probe_library.anatomical_delta import DeltaDecoder, DeltaEncoder
+
+ACRONYMS = ["root", "ACAv", "ACAd"]
+COLORS = ["FFFFFF", "40A666", "40A667"]
+
+
+def _sync(encoder, decoder, message):
+    states = {probe.name: probe for probe in decoder.decode(message)}
+    for name, sequence in decoder.acknowledgements.items():
+        encoder.acknowledge(name, sequence)
+    return states
+
+
+def _acronyms(probe):
+    return probe.channel_acronyms().tolist()
+
+
+def test_full_then_delta():
+    encoder, decoder = DeltaEncoder(ACRONYMS, COLORS), DeltaDecoder()
+    labels = np.zeros(960, dtype=np.int32)
+    message = encoder.encode("A", labels)
+    assert message.startswith("~A@1;")
+    _sync(encoder, decoder, message)
+
+    labels[412:416] = 2
+    message = encoder.encode("A", labels)
+    assert message == "~A@2<1;412-415,ACAd,40A667"
+    (probe,) = decoder.decode(message)
+    assert _acronyms(probe) == [ACRONYMS[label] for label in labels]
+
+
+def test_unchanged_labels_send_nothing():
+    encoder, decoder = DeltaEncoder(ACRONYMS, COLORS), DeltaDecoder()
+    labels = np.zeros(10, dtype=np.int32)
+    _sync(encoder, decoder, encoder.encode("A", labels))
+    assert encoder.encode("A", labels) is None
+
+
+def test_unacknowledged_message_is_resent():
+    encoder = DeltaEncoder(ACRONYMS, COLORS)
+    labels = np.zeros(10, dtype=np.int32)
+    first = encoder.encode("A", labels)
+    assert encoder.encode("A", labels) == first
+
+
+def test_revert_while_pending_round_trip():
+    encoder, decoder = DeltaEncoder(ACRONYMS, COLORS), DeltaDecoder()
+    a, b = np.zeros(960, dtype=np.int32), np.zeros(960, dtype=np.int32)
+    _sync(encoder, decoder, encoder.encode_many(["A", "B"], np.stack([a, b])))
+
+    # A changes and the delta reaches the receiver, but is not acknowledged.
+    changed = a.copy()
+    changed[100:200] = 1
+    decoder.decode(join_probes([encoder.encode("A", changed)]))
+
+    # A reverts to the acknowledged state while B changes.
+    b[700] = 1
+    message = encoder.encode_many(["A", "B"], np.stack([a, b]))
+    assert message.startswith("[~A@3;0-959,root,FFFFFF,")
+    states = _sync(encoder, decoder, message)
+    assert _acronyms(states["A"]) == ["root"] * 960
+    assert _acronyms(states["B"]) == [ACRONYMS[label] for label in b]
+    assert not decoder.resync_requests
+
+
+def test_missing_base_requests_resync():
+    encoder, decoder = DeltaEncoder(ACRONYMS, COLORS), DeltaDecoder()
+    labels = np.zeros(10, dtype=np.int32)
+    encoder.encode("A", labels)
+    encoder.acknowledge("A", 1)
+    labels[3] = 1
+    assert decoder.decode(encoder.encode("A", labels)) == []
+    assert decoder.resync_requests == {"A"}
+
+
+def test_zero_channel_probe():
+    encoder, decoder = DeltaEncoder(ACRONYMS, COLORS), DeltaDecoder()
+    message = encoder.encode_many(["A", "B"], np.zeros((2, 0), dtype=np.int32))
+    assert message == "[~A@1;,~B@1;]"
+    assert [len(probe.labels) for probe in decoder.decode(message)] == [0, 0]
@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+import pytest
+
+from probe_library.atlas import AtlasLookup
+
+tifffile = pytest.importorskip("tifffile")
+
+STRUCTURES = [
+    {"id": 997, "acronym": "root", "rgb_triplet": [255, 255, 255]},
+    {"id": 315, "acronym": "Isocortex", "rgb_triplet": [112, 255, 113]},
+]
+
+
+def _atlas(tmp_path, compression):
+    annotation = np.zeros((20, 16, 12), dtype=np.uint32)
+    annotation[2:18, 2:14, 2:10] = 997
+    annotation[2:10, 2:14, 2:10] = 315
+    folder = tmp_path / "brainglobe" / "allen_mouse_25um_v1.2"
+    folder.mkdir(parents=True)
+    tifffile.imwrite(folder / "annotation.tiff", annotation, compression=compression)
+    (folder / "structures.json").write_text(json.dumps(STRUCTURES))
+    (folder / "metadata.json").write_text(json.dumps({"orientation": "asr", "resolution": [25, 25, 25]}))
+    return folder, annotation
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_from_brainglobe(tmp_path, compression):
+    folder, annotation = _atlas(tmp_path, compression)
+    cache = tmp_path / "cache"
+    lookup = AtlasLookup.from_brainglobe("CCF", directory=tmp_path / "brainglobe", cache_dir=cache)
+    np.testing.assert_array_equal(lookup.annotation, annotation)
+    assert lookup.name == "allen_mouse_25um"
+    assert lookup.acronyms.tolist() == ["-", "Isocortex", "root"]
+    assert lookup.colors[1] == "70FF71"
+    # The BrainGlobe folder is never written to; compressed volumes are converted in the cache.
+    assert sorted(p.name for p in folder.iterdir()) == ["annotation.tiff", "metadata.json", "structures.json"]
+    assert [p.name for p in cache.glob("*.npy")] == (
+        ["allen_mouse_25um_v1.2_annotation.npy"] if compression else []
+    )
+
+
+def test_labels_match_voxel_lookup():
+    rng = np.random.default_rng(0)
+    annotation = rng.choice([0, 315, 997], size=(20, 16, 12)).astype(np.uint32)
+    lookup = AtlasLookup(annotation, STRUCTURES, 25, reference=(0.25, 0.2, 0.15))
+    points = rng.uniform(-0.5, 0.6, (500, 3))
+    voxels = np.rint((points + lookup.reference) / 0.025).astype(int)[:, [0, 2, 1]]
+    inside = np.all((voxels >= 0) & (voxels < annotation.shape), axis=1)
+    expected = np.zeros(len(points), dtype=np.int64)
+    expected[inside] = annotation[tuple(voxels[inside].T)]
+    np.testing.assert_array_equal(lookup.region_ids(points), expected)
+    np.testing.assert_array_equal(lookup.structure_ids[lookup.labels(points)], expected)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from probe_library._binary import create_arrays, decode_strings, encode_strings, read_arrays, write_arrays
+
+MAGIC = b"PLTEST\0\0"
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "arrays.bin"
+    arrays = {
+        "floats": np.arange(12, dtype=np.float32).reshape(3, 4),
+        "big_endian": np.arange(5, dtype=">i8"),
+        "scalar_rows": np.zeros((0, 3)),
+        "bytes": np.frombuffer(b"abc", dtype=np.uint8),
+    }
+    write_arrays(path, MAGIC, 3, arrays)
+    loaded, offsets = read_arrays(path, MAGIC, 3)
+    assert list(loaded) == list(arrays)
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(loaded[name], array)
+        assert loaded[name].dtype == array.dtype.newbyteorder("<")
+        assert offsets[name] % 64 == 0
+    assert not loaded["floats"].flags.writeable
+
+
+def test_create_arrays(tmp_path):
+    path = tmp_path / "arrays.bin"
+    with create_arrays(path, MAGIC, 1, {"grid": ((4, 3), np.float64)}) as arrays:
+        assert not path.exists()
+        arrays["grid"][:] = np.arange(12).reshape(4, 3)
+    np.testing.assert_array_equal(read_arrays(path, MAGIC, 1)[0]["grid"], np.arange(12).reshape(4, 3))
+
+
+def test_create_arrays_interrupted(tmp_path):
+    path = tmp_path / "arrays.bin"
+    with pytest.raises(RuntimeError):
+        with create_arrays(path, MAGIC, 1, {"grid": ((4, 3), np.float64)}):
+            raise RuntimeError
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_rejects_wrong_format_and_truncation(tmp_path):
+    path = tmp_path / "arrays.bin"
+    write_arrays(path, MAGIC, 1, {"values": np.arange(100.0)})
+    with pytest.raises(ValueError, match="unsupported format"):
+        read_arrays(path, MAGIC, 2)
+    with pytest.raises(ValueError, match="unsupported format"):
+        read_arrays(path, b"PLOTHER\0", 1)
+    data = path.read_bytes()
+    for size, message in [(10, "truncated header"), (40, "truncated array table"), (200, "past end of file")]:
+        path.write_bytes(data[:size])
+        with pytest.raises(ValueError, match=message):
+            read_arrays(path, MAGIC, 1)
+
+
+@pytest.mark.parametrize("strings", [[], [""], ["default", "bank 0", "µm"]])
+def test_strings_round_trip(strings):
+    assert decode_strings(encode_strings(strings), len(strings)) == strings
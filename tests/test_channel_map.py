@@ -0,0 +1,149 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from probe_library.channel_map import ChannelMap, from_columns, load_channel_map, save_channel_map
+from probe_library.channel_map_cache import load_cached_channel_map, sidecar_path
+
+
+def _rows(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_matches_row_by_row(np1_csv):
+    path = np1_csv(n_channels=100)
+    channel_map = load_channel_map(path)
+    rows = _rows(path)
+    assert len(channel_map) == 100
+    assert channel_map.layer_names == ("bank0", "bank1", "bank2")
+    np.testing.assert_array_equal(channel_map.index, [int(row["index"]) for row in rows])
+    for name in ("x", "y", "z", "w", "h", "d"):
+        np.testing.assert_array_equal(getattr(channel_map, name), [float(row[name]) for row in rows])
+    for name in channel_map.layer_names:
+        np.testing.assert_array_equal(channel_map.layer(name), [row[name] == "1" for row in rows])
+
+
+def test_save_round_trip(np1_csv, tmp_path):
+    path = np1_csv(n_channels=50)
+    out = tmp_path / "saved.csv"
+    save_channel_map(out, load_channel_map(path))
+    assert out.read_text() == path.read_text()
+
+    fractional = ChannelMap(
+        np.arange(3, dtype=np.int32),
+        np.array([[0.1, 15.3, -7.25]] * 6, dtype=np.float32),
+        ["default"],
+        np.packbits([True, False, True], bitorder="little")[None],
+    )
+    save_channel_map(out, fractional)
+    loaded = load_channel_map(out)
+    np.testing.assert_array_equal(loaded.geometry, fractional.geometry)
+    np.testing.assert_array_equal(loaded.layer("default"), [True, False, True])
+
+
+def test_missing_columns_and_ragged_rows(tmp_path):
+    path = tmp_path / "channel_map.csv"
+    path.write_text("index,x,y,z,w,h\n0,0,0,0,12,12\n")
+    with pytest.raises(ValueError, match="missing required columns"):
+        load_channel_map(path)
+    path.write_text("index,x,y,z,w,h,d,default\n0,0,0,0,12,12,24\n")
+    with pytest.raises(ValueError, match="header has 8 columns"):
+        load_channel_map(path)
+
+
+def test_with_layer(np1_csv):
+    channel_map = load_channel_map(np1_csv(n_channels=20))
+    mask = np.arange(20) % 3 == 0
+    added = channel_map.with_layer("selected", mask)
+    np.testing.assert_array_equal(added.layer("selected"), mask)
+    replaced = added.with_layer("bank0", ~mask)
+    assert replaced.layer_names == added.layer_names
+    np.testing.assert_array_equal(replaced.layer("bank0"), ~mask)
+    # The original map is not modified.
+    assert channel_map.layer_names == ("bank0", "bank1", "bank2")
+    with pytest.raises(ValueError, match="has 3 values for 20 channels"):
+        channel_map.with_layer("short", mask[:3])
+
+
+def test_shank_ids_split_widest_gaps():
+    x = np.array([0, 32, 250, 282, 500, 532, 0, 250], dtype=float)
+    table = np.column_stack([np.arange(8), x, np.zeros((8, 5))])
+    channel_map = from_columns(table, ["index", "x", "y", "z", "w", "h", "d"])
+    np.testing.assert_array_equal(channel_map.shank_ids(3), [0, 0, 1, 1, 2, 2, 0, 1])
+    np.testing.assert_array_equal(channel_map.shank_ids(1), np.zeros(8))
+    with pytest.raises(ValueError, match="distinct x positions"):
+        channel_map.shank_ids(7)
+
+
+def test_lattice_backed_map(np1_csv):
+    path = np1_csv()
+    explicit = load_channel_map(path)
+    compressed = load_channel_map(path, lattice=True)
+    assert compressed.lattice.nbytes < explicit.index.nbytes + explicit.geometry.nbytes
+    sites = np.array([0, 1, 2, 3, 500, 959])
+    np.testing.assert_array_equal(compressed.site_geometry(sites), explicit.geometry[:, sites].T)
+    np.testing.assert_array_equal(compressed.index, explicit.index)
+    np.testing.assert_array_equal(compressed.geometry, explicit.geometry)
+
+
+def test_sidecar_round_trip(np1_csv):
+    path = np1_csv()
+    expected = load_channel_map(path)
+    first = load_cached_channel_map(path)
+    assert os.path.exists(sidecar_path(path))
+    second = load_cached_channel_map(path)
+    for channel_map in (first, second):
+        np.testing.assert_array_equal(channel_map.index, expected.index)
+        np.testing.assert_array_equal(channel_map.geometry, expected.geometry)
+        np.testing.assert_array_equal(channel_map.layer_bits, expected.layer_bits)
+        assert channel_map.layer_names == expected.layer_names
+    assert second.lattice is not None
+
+
+def test_sidecar_rebuilt_when_stale(np1_csv):
+    path = np1_csv(seed=0)
+    load_cached_channel_map(path)
+    # Same size, different layers: only the content hash tells them apart.
+    np1_csv(seed=1)
+    os.utime(path, ns=(0, 0))
+    np.testing.assert_array_equal(load_cached_channel_map(path).layer_bits, load_channel_map(path).layer_bits)
+
+
+def test_sidecar_touched_but_unchanged(np1_csv):
+    path = np1_csv()
+    load_cached_channel_map(path)
+    os.utime(path, ns=(0, 0))
+    load_cached_channel_map(path)
+    stamp = os.stat(sidecar_path(path)).st_mtime_ns
+    np.testing.assert_array_equal(load_cached_channel_map(path).layer_bits, load_channel_map(path).layer_bits)
+    # The refreshed stat makes the next load a plain stat comparison.
+    assert os.stat(sidecar_path(path)).st_mtime_ns == stamp
+
+
+def test_truncated_sidecar_is_rebuilt(np1_csv):
+    path = np1_csv()
+    load_cached_channel_map(path)
+    cache = sidecar_path(path)
+    with open(cache, "r+b") as f:
+        f.truncate(os.path.getsize(cache) // 2)
+    np.testing.assert_array_equal(load_cached_channel_map(path).geometry, load_channel_map(path).geometry)
+
+
+def test_neighbors_saved_in_sidecar(np1_csv):
+    path = np1_csv()
+    channel_map = load_cached_channel_map(path)
+    expected = channel_map.neighbors.adjacency(40.0)
+    channel_map.neighbors.save()
+    reloaded = load_cached_channel_map(path).neighbors
+    assert 40.0 in reloaded._adjacency
+    for saved, built in zip(reloaded.adjacency(40.0), expected):
+        np.testing.assert_array_equal(saved, built)
+
+
+def test_from_columns_without_layers():
+    table = np.array([[0, 1, 2, 3, 4, 5, 6]], dtype=float)
+    channel_map = from_columns(table, ["index", "x", "y", "z", "w", "h", "d"])
+    assert channel_map.layer_names == () and channel_map.layer_bits.shape == (0, 1)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from probe_library.channel_neighbors import SiteNeighbors
+
+
+def _positions(seed=0, n=500):
+    rng = np.random.default_rng(seed)
+    grid = np.column_stack([np.tile([-14, 18, -30, 2], n // 4), 20 * (np.arange(n) // 2), np.zeros(n)])
+    scattered = rng.uniform([-100, 0, -5], [100, 3000, 5], (n, 3))
+    return {"grid": grid.astype(float), "scattered": scattered, "duplicates": np.repeat(grid[:10], 3, axis=0)}
+
+
+POSITIONS = _positions()
+
+
+def _distances(points, positions):
+    return np.linalg.norm(points[:, None] - positions[None], axis=2)
+
+
+@pytest.mark.parametrize("name", list(POSITIONS))
+@pytest.mark.parametrize("radius", [0.0, 15.0, 40.0, 5000.0])
+def test_within_matches_brute_force(name, radius):
+    positions = POSITIONS[name]
+    points = np.random.default_rng(1).uniform(positions.min(axis=0) - 50, positions.max(axis=0) + 50, (60, 3))
+    points = np.concatenate([points, positions[:5]])
+    indptr, indices, distances = SiteNeighbors(positions).within(points, radius)
+    brute = _distances(points, positions)
+    for q in range(len(points)):
+        expected = np.flatnonzero(brute[q] <= radius)
+        np.testing.assert_array_equal(indices[indptr[q]:indptr[q + 1]], expected)
+        np.testing.assert_allclose(distances[indptr[q]:indptr[q + 1]], brute[q, expected], rtol=1e-6)
+
+
+def test_within_per_query_radius_and_2d_points():
+    positions = POSITIONS["grid"]
+    neighbors = SiteNeighbors(positions)
+    radii = np.array([0.0, 25.0, 100.0])
+    points = positions[[0, 10, 20], :2]
+    indptr, indices, _ = neighbors.within(points, radii)
+    brute = _distances(positions[[0, 10, 20]], positions)
+    for q, radius in enumerate(radii):
+        np.testing.assert_array_equal(indices[indptr[q]:indptr[q + 1]], np.flatnonzero(brute[q] <= radius))
+
+
+@pytest.mark.parametrize("name", list(POSITIONS))
+@pytest.mark.parametrize("k", [1, 4, 25])
+def test_nearest_matches_brute_force(name, k):
+    positions = POSITIONS[name]
+    points = np.random.default_rng(2).uniform(positions.min(axis=0) - 500, positions.max(axis=0) + 500, (40, 3))
+    distances, sites = SiteNeighbors(positions).nearest(points, k)
+    expected = np.sort(_distances(points, positions), axis=1)[:, :k]
+    np.testing.assert_allclose(distances, expected, rtol=1e-6)
+    np.testing.assert_allclose(np.linalg.norm(positions[sites] - points[:, None], axis=2), expected, rtol=1e-6)
+
+
+def test_nearest_more_than_available():
+    positions = POSITIONS["grid"][:3]
+    distances, sites = SiteNeighbors(positions).nearest(np.zeros((1, 3)), k=5)
+    assert sorted(sites[0, :3].tolist()) == [0, 1, 2]
+    assert sites[0, 3:].tolist() == [-1, -1] and np.all(np.isinf(distances[0, 3:]))
+    distances, sites = SiteNeighbors(np.empty((0, 3))).nearest(np.zeros((2, 3)), k=2)
+    assert np.all(sites == -1) and np.all(np.isinf(distances))
+
+
+@pytest.mark.parametrize("radius", [20.0, 45.0])
+def test_adjacency_matches_brute_force(radius):
+    positions = POSITIONS["scattered"]
+    neighbors = SiteNeighbors(positions)
+    indptr, indices, distances = neighbors.adjacency(radius)
+    brute = _distances(positions, positions)
+    np.fill_diagonal(brute, np.inf)
+    for site in range(len(positions)):
+        np.testing.assert_array_equal(indices[indptr[site]:indptr[site + 1]], np.flatnonzero(brute[site] <= radius))
+    owner = np.repeat(np.arange(len(positions)), np.diff(indptr))
+    np.testing.assert_allclose(distances, brute[owner, indices], rtol=1e-6)
+    assert neighbors.adjacency(radius)[1] is indices
+
+
+def test_arrays_round_trip():
+    positions = POSITIONS["scattered"]
+    neighbors = SiteNeighbors(positions)
+    graphs = [neighbors.adjacency(radius) for radius in (10.0, 30.0)]
+    stored = []
+    neighbors.store = stored.append
+    neighbors.save()
+    assert stored == [neighbors]
+
+    restored = SiteNeighbors(positions, arrays=neighbors.to_arrays())
+    for radius, graph in zip((10.0, 30.0), graphs):
+        for restored_array, array in zip(restored.adjacency(radius), graph):
+            np.testing.assert_array_equal(restored_array, array)
+    points = positions[:20] + 3.0
+    for restored_array, array in zip(restored.within(points, 50.0), neighbors.within(points, 50.0)):
+        np.testing.assert_array_equal(restored_array, array)
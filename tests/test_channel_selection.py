@@ -0,0 +1,121 @@
+import json
+
+import numpy as np
+import pytest
+
+from probe_library.channel_map import from_columns, load_channel_map
+from probe_library.channel_selection import load_selection, site_scores, solve_selection, write_selection_layer
+from probe_library.schema import SelectionConstraints
+
+
+def _channel_map(n, layers=()):
+    i = np.arange(n)
+    table = np.column_stack([i, 32 * (i % 2), 20 * (i // 2), np.zeros((n, 4)), *layers])
+    return from_columns(table, ["index", "x", "y", "z", "w", "h", "d"] + [f"layer{k}" for k in range(len(layers))])
+
+
+def _blocks(channel_map, constraints):
+    return channel_map.index // constraints.block_size
+
+
+def _check_valid(channel_map, constraints, selection, selectable):
+    index = channel_map.index[selection.mask]
+    channels = index % constraints.channels
+    assert len(np.unique(channels)) == len(channels)
+    assert not np.any(selection.mask & ~selectable)
+    # Blocks are switched whole.
+    blocks = _blocks(channel_map, constraints)
+    chosen = np.unique(blocks[selection.mask])
+    np.testing.assert_array_equal(selection.mask, np.isin(blocks, chosen))
+
+
+def _brute_force(channel_map, constraints, scores, selectable):
+    blocks = _blocks(channel_map, constraints)
+    ids = [b for b in np.unique(blocks) if selectable[blocks == b].all()]
+    channels = {b: set((channel_map.index[blocks == b] % constraints.channels).tolist()) for b in ids}
+    ids = [b for b in ids if len(channels[b]) == np.sum(blocks == b)]
+    block_scores = {b: scores[blocks == b].sum() for b in ids}
+
+    # Every set of blocks with disjoint channels, by depth-first search.
+    def best(i, used):
+        if i == len(ids):
+            return 0.0
+        skip = best(i + 1, used)
+        if channels[ids[i]] & used:
+            return skip
+        return max(skip, block_scores[ids[i]] + best(i + 1, used | channels[ids[i]]))
+
+    return best(0, frozenset())
+
+
+@pytest.mark.parametrize(
+    "n, channels, block_size",
+    [(24, 8, 1), (24, 8, 4), (24, 8, 3), (30, 7, 2), (20, 6, 4), (18, 5, 5)],
+)
+@pytest.mark.parametrize("seed", range(3))
+def test_optimal_and_valid(n, channels, block_size, seed):
+    rng = np.random.default_rng(seed)
+    channel_map = _channel_map(n)
+    constraints = SelectionConstraints(channels, block_size, "")
+    scores = rng.choice([0.0, 0.5, 1.0, 2.0], n)
+    selection = solve_selection(channel_map, constraints, scores)
+    selectable = np.ones(n, dtype=bool)
+    _check_valid(channel_map, constraints, selection, selectable)
+    assert selection.optimal
+    assert selection.score == pytest.approx(scores[selection.mask].sum())
+    assert selection.score == pytest.approx(_brute_force(channel_map, constraints, scores, selectable))
+
+
+def test_fill_uses_every_channel_it_can():
+    channel_map = _channel_map(24)
+    constraints = SelectionConstraints(8, 2, "")
+    scores = np.zeros(24)
+    scores[5] = 1.0
+    selection = solve_selection(channel_map, constraints, scores)
+    assert selection.count == 8 and selection.mask[5]
+    assert solve_selection(channel_map, constraints, scores, fill=False).count == 2
+
+
+def test_sites_constraint():
+    rng = np.random.default_rng(0)
+    allowed = rng.integers(0, 2, 24)
+    channel_map = _channel_map(24, [allowed])
+    constraints = SelectionConstraints(8, 3, "layer0 and y < 200")
+    scores = rng.uniform(0, 1, 24)
+    selectable = (allowed == 1) & (channel_map.y < 200)
+    selection = solve_selection(channel_map, constraints, scores)
+    _check_valid(channel_map, constraints, selection, selectable)
+    assert selection.score == pytest.approx(_brute_force(channel_map, constraints, scores, selectable))
+
+
+def test_node_limit_reports_non_optimal():
+    channel_map = _channel_map(60)
+    constraints = SelectionConstraints(11, 3, "")
+    scores = np.random.default_rng(3).uniform(0.5, 1.0, 60)
+    selection = solve_selection(channel_map, constraints, scores, max_nodes=5)
+    assert not selection.optimal
+    _check_valid(channel_map, constraints, selection, np.ones(60, dtype=bool))
+
+
+def test_score_count_mismatch():
+    with pytest.raises(ValueError, match="got 3 scores for 24 sites"):
+        solve_selection(_channel_map(24), SelectionConstraints(8, 1, ""), np.ones(3))
+
+
+def test_site_scores():
+    labels = np.array([5, 7, 0, 5, 9])
+    np.testing.assert_array_equal(site_scores(labels, [5, 9]), [1, 0, 0, 1, 1])
+    np.testing.assert_array_equal(site_scores(labels, {7: 2.0, 9: 0.5}), [0, 2, 0, 0, 0.5])
+    np.testing.assert_array_equal(site_scores(labels, []), np.zeros(5))
+
+
+def test_write_selection_layer(np1_csv, tmp_path):
+    path = np1_csv(n_channels=40)
+    (tmp_path / "selection.json").write_text(json.dumps({"channels": 16, "block-size": 2}))
+    constraints = load_selection(tmp_path / "selection.json")
+    assert constraints == SelectionConstraints(16, 2, "")
+    selection = solve_selection(load_channel_map(path), constraints, np.arange(40.0))
+    write_selection_layer(path, "chosen", selection)
+    reloaded = load_channel_map(path)
+    assert reloaded.layer_names[-1] == "chosen"
+    np.testing.assert_array_equal(reloaded.layer("chosen"), selection.mask)
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+from probe_library.collision import CollisionScene, MeshBVH, mesh_distance, segment_distances, triangle_distances
+
+
+def _sphere(n_lat=8, n_lon=12, radius=1.0):
+    lat = np.linspace(0, np.pi, n_lat + 1)[1:-1]
+    lon = np.linspace(0, 2 * np.pi, n_lon, endpoint=False)
+    lat, lon = np.meshgrid(lat, lon, indexing="ij")
+    ring = np.stack([np.sin(lat) * np.cos(lon), np.sin(lat) * np.sin(lon), np.cos(lat)], axis=-1).reshape(-1, 3)
+    vertices = np.concatenate([[[0, 0, 1]], ring, [[0, 0, -1]]]) * radius
+    faces = []
+    for j in range(n_lon):
+        k = (j + 1) % n_lon
+        faces.append([0, 1 + j, 1 + k])
+        last = 1 + (n_lat - 2) * n_lon
+        faces.append([len(vertices) - 1, last + k, last + j])
+        for i in range(n_lat - 2):
+            a, b = 1 + i * n_lon + j, 1 + i * n_lon + k
+            faces += [[a, a + n_lon, b], [b, a + n_lon, b + n_lon]]
+    return vertices, np.array(faces)
+
+
+def _box(size=(0.2, 3.0, 0.05)):
+    corners = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)], dtype=float) * size
+    faces = [[0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5], [0, 4, 5], [0, 5, 1],
+             [2, 3, 7], [2, 7, 6], [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3]]
+    return corners, np.array(faces)
+
+
+def _placement(rng, scale=1.0, spread=3.0):
+    q, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+    matrix = np.eye(4)
+    matrix[:3, :3] = q * scale
+    matrix[:3, 3] = rng.uniform(-spread, spread, 3)
+    return matrix
+
+
+def _world_triangles(vertices, faces, matrix):
+    return (vertices @ matrix[:3, :3].T + matrix[:3, 3])[faces]
+
+
+def _brute_force(mesh_a, matrix_a, mesh_b, matrix_b):
+    tri_a, tri_b = _world_triangles(*mesh_a, matrix_a), _world_triangles(*mesh_b, matrix_b)
+    i, j = np.meshgrid(np.arange(len(tri_a)), np.arange(len(tri_b)), indexing="ij")
+    return triangle_distances(tri_a[i.ravel()], tri_b[j.ravel()]).min()
+
+
+def _sample(tri, n=40):
+    u, v = np.meshgrid(np.linspace(0, 1, n), np.linspace(0, 1, n))
+    keep = u + v <= 1
+    u, v = u[keep], v[keep]
+    return tri[0] + u[:, None] * (tri[1] - tri[0]) + v[:, None] * (tri[2] - tri[0])
+
+
+def test_segment_distances_match_sampling():
+    rng = np.random.default_rng(0)
+    p1, q1, p2, q2 = rng.normal(size=(4, 200, 3))
+    # Segments that are points, on either side.
+    q1[:10] = p1[:10]
+    q2[10:20] = p2[10:20]
+    t = np.linspace(0, 1, 201)
+    expected = [
+        np.linalg.norm((a + t[:, None] * (b - a))[:, None] - (c + t[:, None] * (d - c))[None], axis=2).min()
+        for a, b, c, d in zip(p1, q1, p2, q2)
+    ]
+    distances = segment_distances(p1, q1, p2, q2)
+    assert np.all(distances <= np.array(expected) + 1e-12)
+    np.testing.assert_allclose(distances, expected, atol=0.02)
+
+
+def test_triangle_distances_match_sampling():
+    rng = np.random.default_rng(1)
+    tri_a = rng.normal(size=(30, 3, 3))
+    tri_b = rng.normal(size=(30, 3, 3)) + rng.normal(scale=1.5, size=(30, 1, 3))
+    distances = triangle_distances(tri_a, tri_b)
+    for a, b, distance in zip(tri_a, tri_b, distances):
+        sampled = np.linalg.norm(_sample(a)[:, None] - _sample(b)[None], axis=2).min()
+        assert distance <= sampled + 1e-12
+        assert distance == pytest.approx(sampled, abs=0.15)
+    # Crossing triangles touch.
+    crossing = np.array([[[0, 0, -1], [1, 0, 1], [-1, 0, 1]], [[0, -1, 0], [0, 1, 0], [0, 0, 3]]], dtype=float)
+    assert triangle_distances(crossing[:1], crossing[1:])[0] == 0.0
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_mesh_distance_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    sphere, box = _sphere(), _box()
+    bvh_sphere, bvh_box = MeshBVH.build(*sphere, leaf_size=4), MeshBVH.build(*box, leaf_size=2)
+    for _ in range(4):
+        matrix_a, matrix_b = _placement(rng, scale=rng.uniform(0.5, 2.0)), _placement(rng)
+        expected = _brute_force(sphere, matrix_a, box, matrix_b)
+        assert mesh_distance(bvh_sphere, matrix_a, bvh_box, matrix_b) == pytest.approx(expected, abs=1e-9)
+        assert mesh_distance(bvh_box, matrix_b, bvh_sphere, matrix_a) == pytest.approx(expected, abs=1e-9)
+        limited = mesh_distance(bvh_sphere, matrix_a, bvh_box, matrix_b, max_distance=expected / 2)
+        assert limited == (0.0 if expected == 0 else np.inf)
+
+
+def test_bvh_covers_every_triangle():
+    vertices, faces = _sphere()
+    bvh = MeshBVH.build(vertices, faces, leaf_size=3)
+    leaves = bvh.is_leaf
+    assert np.all(bvh.count[leaves] <= 3)
+    held = [bvh.triangles[first:first + count] for first, count in zip(bvh.first[leaves], bvh.count[leaves])]
+    assert sorted(np.concatenate(held)) == list(range(len(faces)))
+    corners = vertices[faces]
+    for node in np.flatnonzero(leaves):
+        tri = corners[bvh.triangles[bvh.first[node]:bvh.first[node] + bvh.count[node]]].reshape(-1, 3)
+        assert np.all(tri >= bvh.bounds[node, 0] - 1e-12) and np.all(tri <= bvh.bounds[node, 1] + 1e-12)
+    with pytest.raises(ValueError, match="without faces"):
+        MeshBVH.build(vertices, np.empty((0, 3), dtype=int))
+
+
+def test_scene_clearances():
+    rng = np.random.default_rng(7)
+    sphere, box = _sphere(), _box()
+    bvhs = {"sphere": MeshBVH.build(*sphere), "box": MeshBVH.build(*box)}
+    meshes = {"sphere": sphere, "box": box}
+    scene = CollisionScene()
+    placements = {}
+    # The first two objects share a group and are never compared.
+    for k in range(6):
+        kind = ["sphere", "box"][k % 2]
+        placements[f"{kind}{k}"] = (kind, _placement(rng, spread=4.0))
+        scene.add(f"{kind}{k}", bvhs[kind], placements[f"{kind}{k}"][1], group="rig" if k < 2 else None)
+
+    clearances = scene.clearances(max_distance=2.0)
+    names = list(placements)
+    for i, first in enumerate(names):
+        for second in names[i + 1:]:
+            (kind_a, matrix_a), (kind_b, matrix_b) = placements[first], placements[second]
+            expected = _brute_force(meshes[kind_a], matrix_a, meshes[kind_b], matrix_b)
+            if i < 2 and names.index(second) < 2:
+                assert (first, second) not in clearances
+            elif expected <= 2.0:
+                assert clearances[first, second] == pytest.approx(expected, abs=1e-9)
+            else:
+                assert (first, second) not in clearances
+
+    scene.move("box5", placements["sphere4"][1])
+    assert ("sphere4", "box5") in scene.collisions()
+    scene.remove("box5")
+    assert all("box5" not in pair for pair in scene.clearances())
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from probe_library.deformation import DeformationField, write_deformation_field
+
+SHAPE = (11, 9, 7)
+ORIGIN = np.array([-0.5, 0.2, 1.0])
+SPACING = np.array([0.1, 0.1, 0.2])
+# A linear field is reproduced exactly by trilinear interpolation.
+GRADIENT = np.array([[0.02, -0.01, 0.0], [0.0, 0.03, 0.01], [-0.02, 0.0, 0.01]])
+OFFSET = np.array([0.01, -0.02, 0.005])
+
+
+def _linear(points):
+    return points @ GRADIENT.T + OFFSET
+
+
+def _grid_points(window=(slice(None),) * 3):
+    axes = [np.arange(n)[w] * s + o for n, w, s, o in zip(SHAPE, window, SPACING, ORIGIN)]
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1)
+
+
+@pytest.fixture(params=["array", "callable"])
+def field(request, tmp_path):
+    path = tmp_path / "field.deform"
+    if request.param == "array":
+        write_deformation_field(path, _linear(_grid_points()), origin=ORIGIN, spacing=SPACING, chunk=4)
+    else:
+        blocks = lambda window: _linear(_grid_points(window))  # noqa: E731
+        write_deformation_field(path, blocks, shape=SHAPE, origin=ORIGIN, spacing=SPACING, chunk=4)
+    return DeformationField(path)
+
+
+def test_grid_values_round_trip(field):
+    points = _grid_points()
+    np.testing.assert_allclose(field.displacement(points), _linear(points), atol=1e-7)
+    np.testing.assert_array_equal(field.shape, SHAPE)
+    assert field.chunk == 4
+
+
+def test_trilinear_between_voxels(field):
+    rng = np.random.default_rng(0)
+    high = ORIGIN + SPACING * (np.array(SHAPE) - 1)
+    points = rng.uniform(ORIGIN, high, (500, 3))
+    np.testing.assert_allclose(field.displacement(points), _linear(points), atol=1e-6)
+    # The upper faces of the grid are inside.
+    np.testing.assert_allclose(field.displacement(high), _linear(high), atol=1e-6)
+
+
+def test_outside_is_not_displaced(field):
+    outside = np.array([ORIGIN - 0.01, ORIGIN + SPACING * np.array(SHAPE), [10.0, 10.0, 10.0]])
+    np.testing.assert_array_equal(field.displacement(outside), np.zeros((3, 3)))
+    np.testing.assert_array_equal(field.to_transformed(outside), outside)
+
+
+def test_to_atlas_inverts(field):
+    points = np.random.default_rng(1).uniform(ORIGIN + 0.1, ORIGIN + SPACING * (np.array(SHAPE) - 1) - 0.1, (4, 50, 3))
+    transformed = field.to_transformed(points)
+    assert transformed.shape == points.shape
+    np.testing.assert_allclose(field.to_atlas(transformed), points, atol=1e-5)
+
+
+def test_callable_requires_shape(tmp_path):
+    with pytest.raises(ValueError, match="shape is required"):
+        write_deformation_field(tmp_path / "field.deform", lambda window: None)
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from probe_library.collision import segment_distances
+from probe_library.insertion_index import InsertionIndex, trajectory_segments
+from probe_library.insertion_table import InsertionTable
+
+pytest.importorskip("scipy")
+
+
+def _table(n, seed):
+    rng = np.random.default_rng(seed)
+    return InsertionTable.from_records(
+        [
+            {
+                "AP": rng.uniform(-3, 3), "ML": rng.uniform(-3, 3), "DV": rng.uniform(-4, 0),
+                "Yaw": rng.uniform(-30, 30), "Pitch": rng.uniform(0, 60), "Roll": 0.0,
+                "AtlasName": "allen_mouse_25um", "TransformName": ["", "Qiu2018"][rng.integers(2)],
+            }
+            for _ in range(n)
+        ]
+    )
+
+
+@pytest.fixture(scope="module")
+def table():
+    return _table(300, seed=0)
+
+
+@pytest.fixture(scope="module")
+def points():
+    return np.random.default_rng(1).uniform([-4, -4, -6], [4, 4, 4], (25, 3))
+
+
+def _point_distances(index, points):
+    return segment_distances(points[:, None], points[:, None], index.tips[None], index.ends[None])
+
+
+def test_trajectory_segments(table):
+    tips, ends = trajectory_segments(table, length_um=2000.0)
+    np.testing.assert_allclose(tips, table.world_tips(), atol=1e-9)
+    # Qiu2018 scales the axes, so only untransformed trajectories keep their length.
+    untransformed = table.select(transform_name="")
+    np.testing.assert_allclose(np.linalg.norm(ends - tips, axis=1)[untransformed], 2.0)
+
+
+def test_tips_match_brute_force(table, points):
+    index = InsertionIndex(table)
+    brute = np.linalg.norm(points[:, None] - index.tips[None], axis=2)
+    distances, ids = index.nearest_tips(points, k=5)
+    np.testing.assert_allclose(distances, np.sort(brute, axis=1)[:, :5])
+    np.testing.assert_allclose(np.take_along_axis(brute, ids, axis=1), distances)
+    for q, found in enumerate(index.tips_within(points, 1.5)):
+        np.testing.assert_array_equal(np.sort(found), np.flatnonzero(brute[q] <= 1.5))
+
+
+def test_trajectories_within_points(table, points):
+    index = InsertionIndex(table, length_um=4000.0)
+    brute = _point_distances(index, points)
+    for q, found in enumerate(index.trajectories_within(points, 0.8)):
+        expected = np.flatnonzero(brute[q] <= 0.8)
+        np.testing.assert_array_equal(np.sort(found), expected)
+        assert np.all(np.diff(brute[q, found]) >= 0)
+
+
+def test_trajectories_within_segments(table, points):
+    index = InsertionIndex(table, length_um=4000.0)
+    ends = points + np.random.default_rng(2).normal(scale=1.5, size=points.shape)
+    brute = segment_distances(points[:, None], ends[:, None], index.tips[None], index.ends[None])
+    for q, found in enumerate(index.trajectories_within(points, 0.5, end=ends)):
+        np.testing.assert_array_equal(np.sort(found), np.flatnonzero(brute[q] <= 0.5))
+
+
+def test_nearest_trajectories(table, points):
+    index = InsertionIndex(table, length_um=4000.0)
+    distances, ids = index.nearest_trajectories(points, k=4)
+    brute = _point_distances(index, points)
+    np.testing.assert_allclose(distances, np.sort(brute, axis=1)[:, :4], atol=1e-12)
+    np.testing.assert_allclose(np.take_along_axis(brute, ids, axis=1), distances, atol=1e-12)
+
+
+def test_incremental_add_matches_batch(table, points):
+    batch = InsertionIndex(table)
+    incremental = InsertionIndex(table[:200])
+    # Small additions stay pending; a large one triggers a rebuild.
+    for start, stop in [(200, 210), (210, 230), (230, 300)]:
+        ids = incremental.add(table[start:stop])
+        np.testing.assert_array_equal(ids, np.arange(start, stop))
+    assert len(incremental) == len(batch)
+    for a, b in zip(incremental.nearest_tips(points, k=3), batch.nearest_tips(points, k=3)):
+        np.testing.assert_array_equal(a, b)
+    for a, b in zip(incremental.nearest_trajectories(points, k=3), batch.nearest_trajectories(points, k=3)):
+        np.testing.assert_allclose(a, b)
+    for a, b in zip(incremental.trajectories_within(points, 1.0), batch.trajectories_within(points, 1.0)):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_fewer_insertions_than_k():
+    index = InsertionIndex(_table(2, seed=3))
+    distances, ids = index.nearest_trajectories(np.zeros((1, 3)), k=4)
+    assert ids[0, 2:].tolist() == [-1, -1] and np.all(np.isinf(distances[0, 2:]))
+    distances, ids = InsertionIndex().nearest_tips(np.zeros((1, 3)), k=2)
+    assert ids.tolist() == [[-1, -1]]
@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+import pytest
+
+from probe_library.atlas_transform import get_transform
+from probe_library.insertion_table import InsertionTable, load_table, save_table
+from probe_library.schema import parse_insertions
+from probe_library.transforms import apply_matrix, insertion_matrices
+
+SITES = np.array([[0.0, 0.0, 0.0], [0.0, 1000.0, 0.0], [32.0, 0.0, 5.0]])
+
+
+def random_records(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    atlases = ["allen_mouse_25um", "allen_mouse_10um", "waxholm_rat_39um"]
+    return [
+        {
+            "AP": rng.uniform(-4, 4), "ML": rng.uniform(-3, 3), "DV": rng.uniform(-5, 0),
+            "Yaw": rng.uniform(-180, 180), "Pitch": rng.uniform(0, 90), "Roll": rng.uniform(-180, 180),
+            "AtlasName": atlases[rng.integers(3)], "TransformName": ["", "Qiu2018"][rng.integers(2)],
+            "RefAP": 5.4, "RefML": 5.7, "RefDV": 0.33, "ProbeName": f"NP{rng.integers(1, 4)}",
+        }
+        for _ in range(n)
+    ]
+
+
+@pytest.fixture(scope="module")
+def table():
+    return InsertionTable.from_records(random_records())
+
+
+def test_matches_parsed_insertions(table):
+    insertions = parse_insertions(random_records())
+    assert table.insertions() == insertions
+    assert table.records() == [insertion.to_json() for insertion in insertions]
+    assert table.column("atlas_name").tolist() == [insertion.atlas_name for insertion in insertions]
+    np.testing.assert_array_equal(table.column("pitch"), [insertion.pitch for insertion in insertions])
+    with pytest.raises(KeyError):
+        table.column("depth")
+
+
+def test_save_load_round_trip(table, tmp_path):
+    path = tmp_path / "log.insertions"
+    save_table(path, table)
+    loaded = load_table(path)
+    assert loaded.insertions() == table.insertions()
+    assert loaded.names == table.names
+    empty = InsertionTable.from_records([])
+    save_table(path, empty)
+    assert len(load_table(path)) == 0
+
+
+def test_select_matches_row_filter(table):
+    insertions = table.insertions()
+    mask = table.select(atlas_name=["allen_mouse_25um", "unknown"], ap=(1.0, None), pitch=(10.0, 45.0))
+    expected = [
+        i.atlas_name == "allen_mouse_25um" and i.ap >= 1.0 and 10.0 <= i.pitch <= 45.0 for i in insertions
+    ]
+    np.testing.assert_array_equal(mask, expected)
+    assert table.filter(atlas_name="allen_mouse_25um", ap=(1.0, None), pitch=(10.0, 45.0)).insertions() == [
+        i for i, keep in zip(insertions, expected) if keep
+    ]
+    assert not table.select(probe_name="NP9").any()
+    with pytest.raises(KeyError):
+        table.select(depth=(0, 1))
+
+
+def test_groups_and_concat(table):
+    groups = table.group_by("probe_name")
+    assert sorted(groups) == sorted(set(table.column("probe_name")))
+    assert sum(len(group) for group in groups.values()) == len(table)
+    for name, group in groups.items():
+        assert set(group.column("probe_name")) == {name}
+
+    other = InsertionTable.from_records(random_records(n=20, seed=1) + [{**random_records(1)[0], "AtlasName": "new"}])
+    combined = table.concat(other)
+    assert combined.insertions() == table.insertions() + other.insertions()
+    assert combined.names[0][-1] == "new"
+
+
+def test_world_coordinates(table):
+    matrices = table.world_matrices()
+    np.testing.assert_allclose(matrices[:, :3, 3], table.world_tips(), atol=1e-9)
+    for row, insertion in enumerate(table.insertions()[:20]):
+        transform = get_transform(insertion.transform_name)
+        local = insertion_matrices(*table.values[:6, row])
+        reference = [insertion.ref_ap, insertion.ref_ml, insertion.ref_dv]
+        expected = transform.to_atlas(apply_matrix(local, SITES)) + reference
+        np.testing.assert_allclose(apply_matrix(matrices[row], SITES), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("form", ["array", "lines"])
+def test_load_log(tmp_path, form):
+    records = random_records(n=10)
+    path = tmp_path / "log.json"
+    path.write_text(json.dumps(records) if form == "array" else "\n".join(map(json.dumps, records)) + "\n")
+    assert InsertionTable.load_log(path).insertions() == parse_insertions(records)
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from probe_library.lattice import ARRAY_NAMES, SiteLattice
+
+
+def _np1(n=960):
+    i = np.arange(n)
+    x = np.tile([-14, 18, -30, 2], n // 4 + 1)[:n]
+    return np.stack([x, 200 + 20 * (i // 2), np.zeros(n), np.full(n, 12), np.full(n, 12), np.full(n, 24)]).astype(
+        np.float32
+    )
+
+
+def _multi_shank():
+    # Four shanks of 48 sites, 250 µm apart, with 15.3 µm vertical pitch.
+    shanks = []
+    for shank in range(4):
+        i = np.arange(48)
+        x, y = shank * 250 + 32 * (i % 2), 15.3 * (i // 2)
+        shanks.append(np.stack([x, y, np.zeros(48), np.full(48, 12), np.full(48, 12), np.zeros(48)]))
+    return np.concatenate(shanks, axis=1).astype(np.float32)
+
+
+def _mixed(seed=0):
+    # A regular run, a few irregular sites, then another regular run.
+    rng = np.random.default_rng(seed)
+    irregular = rng.uniform(-100, 100, (6, 7)).astype(np.float32)
+    return np.concatenate([_np1(40), irregular, _np1(24) + np.float32(3.7)], axis=1)
+
+
+GEOMETRIES = {
+    "np1": _np1(),
+    "multi_shank": _multi_shank(),
+    "mixed": _mixed(),
+    "random": np.random.default_rng(1).normal(size=(6, 30)).astype(np.float32),
+    "single": _np1(1),
+    "empty": np.zeros((6, 0), dtype=np.float32),
+}
+
+
+@pytest.mark.parametrize("name", list(GEOMETRIES))
+def test_expand_is_exact(name):
+    geometry = GEOMETRIES[name]
+    index = np.arange(geometry.shape[1], dtype=np.int32)
+    lattice = SiteLattice.fit(index, geometry)
+    expanded_index, expanded = lattice.expand()
+    np.testing.assert_array_equal(expanded, geometry)
+    np.testing.assert_array_equal(expanded_index, index)
+    assert expanded.dtype == np.float32 and expanded_index.dtype == np.int32
+
+
+@pytest.mark.parametrize("name", list(GEOMETRIES))
+def test_site_geometry_matches_expand(name):
+    geometry = GEOMETRIES[name]
+    lattice = SiteLattice.fit(np.arange(geometry.shape[1]), geometry)
+    sites = np.random.default_rng(0).permutation(geometry.shape[1])
+    np.testing.assert_array_equal(lattice.site_geometry(sites), geometry[:, sites].T)
+
+
+def test_regular_geometry_is_compact():
+    lattice = SiteLattice.fit(np.arange(960), GEOMETRIES["np1"])
+    assert len(lattice.periods) == 1 and lattice.periods[0] == 4
+    assert len(lattice.index) == 1
+    assert lattice.nbytes < 400
+
+    lattice = SiteLattice.fit(np.arange(192), GEOMETRIES["multi_shank"])
+    assert np.all(lattice.periods > 0)
+    # Decimal pitches are stored as written, not as float32 roundings.
+    assert 15.3 in lattice.rows[:, 1]
+
+
+def test_irregular_sites_stay_explicit():
+    lattice = SiteLattice.fit(np.arange(71), GEOMETRIES["mixed"])
+    assert lattice.periods.tolist() == [4, 0, 4]
+    assert lattice.starts.tolist() == [0, 40, 47, 71]
+
+
+def test_non_consecutive_index():
+    index = np.arange(960, dtype=np.int32)[::-1].copy()
+    lattice = SiteLattice.fit(index, GEOMETRIES["np1"])
+    np.testing.assert_array_equal(lattice.expand()[0], index)
+    np.testing.assert_array_equal(lattice.site_index([0, 5]), [959, 954])
+
+
+def test_arrays_round_trip():
+    lattice = SiteLattice.fit(np.arange(71), GEOMETRIES["mixed"])
+    arrays = lattice.to_arrays()
+    assert tuple(arrays) == ARRAY_NAMES
+    restored = SiteLattice.from_arrays({name: np.array(array) for name, array in arrays.items()})
+    np.testing.assert_array_equal(restored.expand()[1], GEOMETRIES["mixed"])
+    assert restored.nbytes == lattice.nbytes
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from probe_library.channel_map import load_channel_map
+from probe_library.layer_query import QuerySyntaxError, SiteSelector
+
+
+@pytest.fixture
+def selector(np1_csv):
+    # 1000 sites: not a multiple of 64, so the last word is partial.
+    channel_map = load_channel_map(np1_csv(n_channels=1000, n_layers=4))
+    return SiteSelector(channel_map.with_layer("bank 0", channel_map.layer("bank0")), n_shanks=2)
+
+
+CASES = {
+    "bank0": lambda s: s["bank0"],
+    "not bank0": lambda s: ~s["bank0"],
+    "~bank0 & bank1": lambda s: ~s["bank0"] & s["bank1"],
+    "bank0 and not bank1 or bank2": lambda s: (s["bank0"] & ~s["bank1"]) | s["bank2"],
+    "bank0 | bank1 & bank2": lambda s: s["bank0"] | (s["bank1"] & s["bank2"]),
+    "bank0 ^ bank1 | bank2 ^ bank3": lambda s: (s["bank0"] ^ s["bank1"]) | (s["bank2"] ^ s["bank3"]),
+    "bank0 xor bank1 and bank2": lambda s: s["bank0"] ^ (s["bank1"] & s["bank2"]),
+    "(bank0 | bank1) & ~(bank2 & bank3)": lambda s: (s["bank0"] | s["bank1"]) & ~(s["bank2"] & s["bank3"]),
+    "not not bank3": lambda s: s["bank3"],
+    "200 <= y < 2000": lambda s: (s["y"] >= 200) & (s["y"] < 2000),
+    "y >= 1e3 and x != -14": lambda s: (s["y"] >= 1000) & (s["x"] != -14),
+    "index > 10 & index <= 20": lambda s: (s["index"] > 10) & (s["index"] <= 20),
+    "shank == 1 and bank1": lambda s: (s["shank"] == 1) & s["bank1"],
+    '"bank 0" & x < 0': lambda s: s["bank0"] & (s["x"] < 0),
+    "x > 100": lambda s: s["x"] > 100,
+}
+
+
+@pytest.mark.parametrize("expression", list(CASES))
+def test_matches_numpy_masks(selector, expression):
+    channel_map = selector.channel_map
+    sites = {
+        **channel_map.layers(),
+        "x": channel_map.x,
+        "y": channel_map.y,
+        "index": channel_map.index,
+        "shank": channel_map.shank_ids(2),
+    }
+    expected = CASES[expression](sites)
+    np.testing.assert_array_equal(selector.mask(expression), expected)
+    np.testing.assert_array_equal(selector.indices(expression), np.flatnonzero(expected))
+    assert selector.count(expression) == expected.sum()
+    np.testing.assert_array_equal(selector.packed(expression), np.packbits(expected, bitorder="little"))
+
+
+def test_packed_matches_layer_bits(selector):
+    np.testing.assert_array_equal(selector.packed("bank2"), selector.channel_map.packed_layer("bank2"))
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["", "bank0 and", "(bank0", "bank0)", "bank0 bank1", "y <", "y < bank0", "z == 1 ==", "bank0 $ bank1", "5"],
+)
+def test_syntax_errors(selector, expression):
+    with pytest.raises(QuerySyntaxError):
+        selector.mask(expression)
+
+
+def test_unknown_layer(selector):
+    with pytest.raises(KeyError, match="unknown layer 'bank9'"):
+        selector.mask("bank0 | bank9")
@@ -0,0 +1,110 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from probe_library.library import INDEX_FILE, ProbeLibrary
+from probe_library.mesh_cache import MeshCache
+
+TRIANGLE = "v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n"
+
+
+def _probe_folder(root, folder, name, producer="imec", shanks=1, channels=16):
+    path = root / folder
+    path.mkdir()
+    metadata = {
+        "name": name,
+        "type": 1,
+        "producer": producer,
+        "channels": channels,
+        "shanks": shanks,
+        "hardware-files": ["holder"],
+    }
+    (path / "metadata.json").write_text(json.dumps(metadata))
+    (path / "model.obj").write_text(TRIANGLE)
+    (path / "holder.obj").write_text(TRIANGLE.replace("v 0 1 0", "v 0 2 0"))
+    (path / "selection.json").write_text(json.dumps({"channels": channels // 2, "block-size": 2}))
+    rows = ["index,x,y,z,w,h,d,default"]
+    rows += [f"{i},{32 * (i % 2)},{20 * (i // 2)},0,12,12,0,{int(i < channels // 2)}" for i in range(channels)]
+    (path / "channel_map.csv").write_text("\n".join(rows) + "\n")
+    return path
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "library"
+    root.mkdir()
+    _probe_folder(root, "np1", "Neuropixels 1.0")
+    _probe_folder(root, "np2_4s", "Neuropixels 2.0 4-shank", shanks=4, channels=32)
+    _probe_folder(root, "cn", "Cambridge H2", producer="Cambridge NeuroTech")
+    return root
+
+
+def test_index_written_and_reused(root):
+    library = ProbeLibrary(root)
+    assert sorted(library.names()) == ["Cambridge H2", "Neuropixels 1.0", "Neuropixels 2.0 4-shank"]
+    index = json.loads((root / INDEX_FILE).read_text())
+    assert [record["folder"] for record in index["probes"]] == ["cn", "np1", "np2_4s"]
+    assert set(index["probes"][1]["files"]) == {
+        "metadata.json", "model.obj", "holder.obj", "selection.json", "channel_map.csv"
+    }
+
+    # Reopening reads only the index, so an unrefreshed edit is not seen.
+    (root / "np1" / "metadata.json").write_text(json.dumps({"name": "Renamed", "type": 1, "channels": 16}))
+    reopened = ProbeLibrary(root)
+    assert [entry.name for entry in reopened] == [entry.name for entry in library]
+    assert reopened.refresh()
+    assert "Renamed" in reopened.names()
+    assert not reopened.refresh()
+
+
+def test_refresh_adds_removes_and_rehashes(root):
+    library = ProbeLibrary(root)
+    hashes = dict(library.entry("np1").files)
+    _probe_folder(root, "new", "New probe")
+    for path in (root / "cn").iterdir():
+        path.unlink()
+    (root / "cn").rmdir()
+    (root / "np1" / "model.obj").write_text(TRIANGLE + "# edited\n")
+    assert library.refresh()
+    assert sorted(entry.folder for entry in library) == ["new", "np1", "np2_4s"]
+    files = library.entry("np1").files
+    assert [name for name in files if files[name] != hashes[name]] == ["model.obj"]
+
+
+def test_search_and_lookup(root):
+    library = ProbeLibrary(root)
+    assert [entry.folder for entry in library.search("neuropixels")] == ["np1", "np2_4s"]
+    assert [entry.folder for entry in library.search(producer="Cambridge NeuroTech")] == ["cn"]
+    assert [entry.folder for entry in library.search("neuro", shanks=4)] == ["np2_4s"]
+    assert library.entry("np1") == library.entry("Neuropixels 1.0")
+    with pytest.raises(KeyError, match="no probe named"):
+        library.entry("missing")
+
+
+def test_probe_files(root, tmp_path):
+    library = ProbeLibrary(root, mesh_cache=MeshCache(tmp_path / "meshes"))
+    probe = library.probe("Neuropixels 2.0 4-shank")
+    assert probe.model.faces.tolist() == [[0, 1, 2]]
+    assert probe.hardware("holder").vertices[2].tolist() == [0, 2, 0]
+    with pytest.raises(KeyError, match="no hardware file"):
+        probe.hardware_path("stage")
+    compiled = probe.compiled_mesh("holder")
+    np.testing.assert_array_equal(compiled.bounds, [[0, 0, 0], [1, 2, 0]])
+    assert os.listdir(tmp_path / "meshes") == [probe.entry.files["holder.obj"] + ".mesh"]
+
+    assert len(probe.channel_map) == 32
+    assert os.path.exists(root / "np2_4s" / "channel_map.cmap")
+    assert probe.sites.count("default and y < 100") == 10
+    selection = probe.select_channels(np.arange(32.0))
+    assert selection.count == 16 and selection.optimal
+    assert selection.mask[16:].all()
+
+
+def test_stale_index_hash_is_not_trusted(root, tmp_path):
+    library = ProbeLibrary(root, mesh_cache=MeshCache(tmp_path / "meshes"))
+    (root / "np1" / "model.obj").write_text(TRIANGLE.replace("v 1 0 0", "v 15 0 0"))
+    # Not refreshed: the recorded hash no longer matches the file, so it is rehashed.
+    compiled = library.probe("np1").compiled_mesh()
+    np.testing.assert_array_equal(compiled.bounds, [[0, 0, 0], [15, 1, 0]])
@@ -0,0 +1,118 @@
+import os
+import re
+
+import numpy as np
+import pytest
+
+from probe_library.channel_map_cache import file_digest
+from probe_library.mesh_cache import MeshCache, compile_mesh
+from probe_library.obj import load_obj
+
+CUBE = """v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0 0 1
+v 1 0 1
+v 1 1 1
+v 0 1 1
+vn 0 0 -1
+vn 0 0 1
+vn 0 -1 0
+vn 0 1 0
+vn -1 0 0
+vn 1 0 0
+f 1//1 3//1 2//1
+f 1//1 4//1 3//1
+f 5//2 6//2 7//2
+f 5//2 7//2 8//2
+f 1//3 2//3 6//3
+f 1//3 6//3 5//3
+f 4//4 7//4 3//4
+f 4//4 8//4 7//4
+f 1//5 5//5 8//5
+f 1//5 8//5 4//5
+f 2//6 3//6 7//6
+f 2//6 7//6 6//6
+"""
+
+
+def _write(tmp_path, text=CUBE, name="cube.obj"):
+    path = tmp_path / name
+    path.write_text(text)
+    return path
+
+
+def test_hard_edges_split_vertices(tmp_path):
+    mesh = load_obj(_write(tmp_path))
+    compiled = compile_mesh(mesh)
+    # Each cube corner is used with three face normals.
+    assert compiled.vertices.shape == (24, 6) and compiled.indices.shape == (12, 3)
+    np.testing.assert_array_equal(compiled.bounds, [[0, 0, 0], [1, 1, 1]])
+    corners = compiled.positions[compiled.indices]
+    np.testing.assert_array_equal(corners, mesh.vertices[mesh.faces])
+    np.testing.assert_array_equal(compiled.normals[compiled.indices], mesh.normals[mesh.face_normals])
+
+
+def test_smooth_normals(tmp_path):
+    mesh = load_obj(_write(tmp_path, re.sub(r"//\d+", "", CUBE)))
+    compiled = compile_mesh(mesh)
+    assert compiled.vertices.shape == (8, 6)
+    expected = np.zeros((8, 3))
+    for face in mesh.faces:
+        a, b, c = mesh.vertices[face].astype(np.float64)
+        expected[face] += np.cross(b - a, c - a)
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    np.testing.assert_allclose(compiled.normals, expected, atol=1e-6)
+    # Every normal points out of the cube.
+    assert np.all(np.sum(compiled.normals * (compiled.positions - 0.5), axis=1) > 0)
+
+
+def test_cache_round_trip(tmp_path):
+    path = _write(tmp_path)
+    cache = MeshCache(tmp_path / "cache")
+    first = cache.get(path)
+    digest = file_digest(path).hex()
+    assert os.listdir(cache.directory) == [f"{digest}.mesh"]
+    second = cache.get(path, digest)
+    expected = compile_mesh(load_obj(path))
+    for compiled in (first, second):
+        np.testing.assert_array_equal(compiled.vertices, expected.vertices)
+        np.testing.assert_array_equal(compiled.indices, expected.indices)
+        np.testing.assert_array_equal(compiled.bounds, expected.bounds)
+    assert isinstance(second.vertices, np.memmap)
+
+
+def test_corrupt_entry_is_rebuilt(tmp_path):
+    path = _write(tmp_path)
+    cache = MeshCache(tmp_path / "cache")
+    cache.get(path)
+    entry = os.path.join(cache.directory, os.listdir(cache.directory)[0])
+    with open(entry, "r+b") as f:
+        f.truncate(100)
+    np.testing.assert_array_equal(cache.get(path).indices, compile_mesh(load_obj(path)).indices)
+
+
+def test_eviction_keeps_recent_entries(tmp_path):
+    cache = MeshCache(tmp_path / "cache")
+    paths = [_write(tmp_path, CUBE + f"# {i}\n", f"cube{i}.obj") for i in range(3)]
+    cache.get(paths[0])
+    entry_size = cache.size()
+    cache.max_bytes = 2 * entry_size
+    for i, path in enumerate(paths):
+        cache.get(path)
+        os.utime(os.path.join(cache.directory, file_digest(path).hex() + ".mesh"), ns=(i, i))
+    assert cache.size() <= 2 * entry_size
+    cache.get(paths[0])
+    names = set(os.listdir(cache.directory))
+    assert file_digest(paths[0]).hex() + ".mesh" in names
+    assert file_digest(paths[2]).hex() + ".mesh" in names
+    assert len(names) == 2
+    cache.clear()
+    assert cache.size() == 0
+
+
+def test_face_normal_range_checked(tmp_path):
+    path = _write(tmp_path, "v 0 0 0\nv 1 0 0\nv 1 1 0\nvn 0 0 1\nf 1//1 2//1 3//2\n")
+    with pytest.raises(ValueError, match="face normal index out of range"):
+        MeshCache(tmp_path / "cache").get(path)
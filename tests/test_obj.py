@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from probe_library.obj import load_obj
+
+
+def _reference(text):
+    """Line-by-line parse of vertices, faces and face normals."""
+    vertices, normals, faces, face_normals = [], [], [], []
+    for line in text.splitlines():
+        parts = line.split("#")[0].split()
+        if not parts:
+            continue
+        if parts[0] == "v":
+            vertices.append([float(p) for p in parts[1:4]])
+        elif parts[0] == "vn":
+            normals.append([float(p) for p in parts[1:4]])
+        elif parts[0] == "f":
+            polygon, polygon_normals = [], []
+            for corner in parts[1:]:
+                fields = corner.split("/")
+                i = int(fields[0])
+                polygon.append(i - 1 if i > 0 else len(vertices) + i)
+                if len(fields) == 3:
+                    n = int(fields[2])
+                    polygon_normals.append(n - 1 if n > 0 else len(normals) + n)
+            for j in range(1, len(polygon) - 1):
+                faces.append([polygon[0], polygon[j], polygon[j + 1]])
+                if polygon_normals:
+                    face_normals.append([polygon_normals[0], polygon_normals[j], polygon_normals[j + 1]])
+    return np.array(vertices, np.float32), np.array(faces, np.uint32), np.array(face_normals, np.uint32)
+
+
+def _write(tmp_path, text, name="model.obj"):
+    path = tmp_path / name
+    path.write_text(text)
+    return path
+
+
+def _random_obj(seed=0, n_vertices=300, n_faces=400):
+    rng = np.random.default_rng(seed)
+    lines = ["# generated", "o probe"]
+    lines += [f"v {x:.6f} {y:.6f} {z:.6f}" for x, y, z in rng.normal(size=(n_vertices, 3))]
+    lines += [f"vn {x:.4f} {y:.4f} {z:.4f}" for x, y, z in rng.normal(size=(20, 3))]
+    lines += ["vt 0.5 0.5"]
+    for _ in range(n_faces):
+        corners = rng.integers(1, n_vertices + 1, rng.integers(3, 7))
+        normals = rng.integers(1, 21, len(corners))
+        form = rng.integers(2)
+        tokens = [f"{v}//{n}" if form else f"{v}/1/{n}" for v, n in zip(corners, normals)]
+        lines.append("f " + " ".join(tokens) + (" # note" if rng.random() < 0.1 else ""))
+    return "\n".join(lines) + "\n"
+
+
+@pytest.mark.parametrize("chunk_size", [64, 1000, 1 << 22])
+def test_matches_line_by_line(tmp_path, chunk_size):
+    text = _random_obj()
+    mesh = load_obj(_write(tmp_path, text), chunk_size=chunk_size)
+    vertices, faces, face_normals = _reference(text)
+    np.testing.assert_array_equal(mesh.vertices, vertices)
+    np.testing.assert_array_equal(mesh.faces, faces)
+    np.testing.assert_array_equal(mesh.face_normals, face_normals)
+    assert mesh.normals.shape == (20, 3)
+
+
+def test_mixed_corner_forms_and_negative_indices(tmp_path):
+    text = "v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\nvn 0 0 1\nf 1 2/1 3//1\nf -4 -3 -2 -1\n"
+    mesh = load_obj(_write(tmp_path, text))
+    np.testing.assert_array_equal(mesh.faces, [[0, 1, 2], [0, 1, 2], [0, 2, 3]])
+    assert mesh.face_normals is None
+
+
+def test_indented_records(tmp_path):
+    text = "  v 0 0 0\n\tv 1 0 0\n v 1 1 0\n   vn 0 0 1\n\n  f 1//1 2//1 3//1\r\n"
+    mesh = load_obj(_write(tmp_path, text))
+    assert len(mesh.vertices) == 3 and len(mesh.normals) == 1
+    np.testing.assert_array_equal(mesh.faces, [[0, 1, 2]])
+    np.testing.assert_array_equal(mesh.face_normals, [[0, 0, 0]])
+
+
+@pytest.mark.parametrize(
+    "text, line",
+    [
+        ("v 0 0 0\nv 1 0 0\nv 1 x 0\nf 1 2 3\n", 3),
+        ("v 0 0 0\nv 1 0 0\nv 1 1 0\nf 1 2\n", 4),
+        ("v 0 0 0\nv 1 0 0\nv 1 1 0\n\nf 1 2 3/\n", 5),
+        ("v 0 0 0\nv 1 0 0\nv 1 1 0\nf 1 2 3 junk\n", 4),
+    ],
+)
+def test_parse_error_names_line(tmp_path, text, line):
+    with pytest.raises(ValueError, match=f"line {line}: malformed OBJ record"):
+        load_obj(_write(tmp_path, text))
+
+
+def test_parse_error_line_across_chunks(tmp_path):
+    text = "v 0 0 0\n" * 50 + "v 0 0 zero\n"
+    with pytest.raises(ValueError, match="line 51:"):
+        load_obj(_write(tmp_path, text), chunk_size=64)
+
+
+def test_index_range_checks(tmp_path):
+    with pytest.raises(ValueError, match="face index out of range"):
+        load_obj(_write(tmp_path, "v 0 0 0\nv 1 0 0\nv 1 1 0\nf 1 2 4\n"))
+    with pytest.raises(ValueError, match="face normal index out of range"):
+        load_obj(_write(tmp_path, "v 0 0 0\nv 1 0 0\nv 1 1 0\nvn 0 0 1\nf 1//1 2//1 3//2\n"))
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from probe_library.atlas import AtlasLookup
+from probe_library.planning import InsertionGrid, score_insertions, search
+
+STRUCTURES = [
+    {"id": 1, "acronym": "A", "rgb_triplet": [255, 0, 0]},
+    {"id": 2, "acronym": "B", "rgb_triplet": [0, 255, 0]},
+]
+
+
+@pytest.fixture(scope="module")
+def lookup():
+    annotation = np.zeros((40, 40, 40), dtype=np.uint32)
+    annotation[10:30, 5:25, 10:20] = 1
+    annotation[10:30, 5:25, 20:35] = 2
+    return AtlasLookup(annotation, STRUCTURES, 100, reference=(2.0, 2.0, 2.0))
+
+
+@pytest.fixture(scope="module")
+def sites():
+    return np.column_stack([np.zeros(20), np.zeros(20), np.arange(20) * 100.0])
+
+
+GRID = InsertionGrid(
+    ap=np.linspace(-1.5, 1.5, 7), ml=np.linspace(-1.5, 1.5, 7), dv=np.linspace(-1.0, 1.0, 5), pitch=(0.0, 30.0)
+)
+
+
+def test_matches_exhaustive_scores(lookup, sites):
+    scores = score_insertions(lookup, sites.astype(np.float32), GRID.parameters(np.arange(GRID.size)), np.array([1]))
+    order = np.lexsort((np.arange(GRID.size), -scores))[:25]
+    best = search(lookup, sites, GRID, np.array([1]), top_k=25, processes=0, chunk_size=17)
+    assert [candidate.score for candidate in best] == scores[order].tolist()
+    np.testing.assert_allclose([candidate[1:] for candidate in best], GRID.parameters(order))
+
+
+def test_process_pool_matches_serial(lookup, sites):
+    serial = search(lookup, sites, GRID, np.array([1, 2]), top_k=10, processes=0, chunk_size=50)
+    pooled = search(lookup, sites, GRID, np.array([1, 2]), top_k=10, processes=2, chunk_size=50)
+    assert pooled == serial
+
+
+def test_top_k_must_be_positive(lookup, sites):
+    with pytest.raises(ValueError, match="top_k"):
+        search(lookup, sites, GRID, np.array([1]), top_k=0, processes=0)
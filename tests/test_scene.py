@@ -0,0 +1,116 @@
+import json
+
+import numpy as np
+import pytest
+
+from probe_library.atlas_transform import IDENTITY, get_transform
+from probe_library.scene import Scene
+
+# Strings that trip up naive scanners: escaped quotes, backslash runs and brackets.
+TRICKY = ['a "quoted" ] word', "ends with a backslash \\", "\\\\\\\"}{", "[[[", "µm ✓", "x" * 300 + "\\\"]"]
+
+
+def _probe(rng, i):
+    return {
+        "AP": f"{rng.uniform(-4, 4):.3f}",
+        "ML": round(float(rng.uniform(-3, 3)), 3),
+        "DV": 0,
+        "Yaw": None,
+        "AtlasName": "allen_mouse_25um",
+        "ProbeName": TRICKY[i % len(TRICKY)],
+        "Channels": rng.integers(0, 1000, 20).tolist(),
+    }
+
+
+def _document(seed=0, embedded=False):
+    rng = np.random.default_rng(seed)
+    data = []
+    for i in range(12):
+        probe = _probe(rng, i)
+        if i % 3 == 0:
+            data.append({"type": "probes", **probe})
+        else:
+            data.append({"probes": json.dumps(probe) if embedded else probe})
+        if i % 5 == 0:
+            data.append({"settings": {"Camera": [0, 1, {"zoom": TRICKY[i % len(TRICKY)]}]}})
+    transform = get_transform("Qiu2018").to_json()
+    return {
+        "AtlasName": "allen_mouse_25um",
+        "Note": TRICKY,
+        "AtlasTransform": json.dumps(transform) if embedded else transform,
+        "Data": data,
+        "Version": 3,
+    }
+
+
+def _expected_entries(document):
+    entries = []
+    for entry in document["Data"]:
+        if "type" in entry:
+            entries.append((entry["type"], {k: v for k, v in entry.items() if k != "type"}))
+        else:
+            ((key, value),) = entry.items()
+            entries.append((key, json.loads(value) if isinstance(value, str) else value))
+    return entries
+
+
+@pytest.mark.parametrize("embedded", [False, True])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_matches_json_loads(embedded, indent):
+    document = _document(embedded=embedded)
+    scene = Scene.loads(json.dumps(document, indent=indent, ensure_ascii=False))
+    assert scene.fields() == list(document)
+    for name in document:
+        assert scene.get(name) == document[name]
+    assert scene.get("Missing", 7) == 7
+    assert scene.atlas_name == "allen_mouse_25um"
+    assert scene.transform == get_transform("Qiu2018")
+
+    expected = _expected_entries(document)
+    assert list(scene.items()) == expected
+    assert scene.types() == ["probes", "settings"]
+    probes = [entry for type, entry in expected if type == "probes"]
+    assert scene.count("probes") == len(probes) == len(scene.probes)
+    assert list(scene.probes) == probes
+    assert scene.probes[-1] == probes[-1] and scene.probes[2:5] == probes[2:5]
+    assert scene.settings == expected[1][1]
+
+
+def test_lazy_access_reads_only_what_it_needs():
+    scene = Scene.loads('{"AtlasName": "CCF", "Data": [{"probes": {"AP": 1}}], oops}')
+    # The malformed tail is never scanned.
+    assert scene.atlas_name == "CCF"
+    assert scene.probes[0] == {"AP": 1}
+    with pytest.raises(ValueError):
+        scene.fields()
+
+
+def test_without_transform_or_data():
+    scene = Scene.loads('{"AtlasName": "CCF"}')
+    assert scene.transform == IDENTITY
+    assert scene.types() == [] and len(scene.probes) == 0 and scene.settings is None
+
+
+def test_open_memory_maps(tmp_path):
+    document = _document(seed=1)
+    path = tmp_path / "scene.json"
+    path.write_text(json.dumps(document))
+    scene = Scene.open(path)
+    assert list(scene.items()) == _expected_entries(document)
+    (tmp_path / "empty.json").write_text("")
+    with pytest.raises(ValueError, match="empty scene file"):
+        Scene.open(tmp_path / "empty.json")
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"Data": [{"a": 1, "b": 2}]}',
+        '{"Data": {"probes": []}}',
+        '{"Data": [{"probes": {"AP": "1}]}',
+        '["not an object"]',
+    ],
+)
+def test_malformed(text):
+    with pytest.raises(ValueError):
+        Scene.loads(text).types()
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from probe_library.atlas_transform import get_transform
+from probe_library.insertion_table import InsertionTable
+from probe_library.schema import (
+    Insertion,
+    SchemaError,
+    parse_insertions,
+    parse_metadata,
+    parse_selection,
+    parse_transform,
+)
+
+RECORD = {
+    "AP": "2.000",
+    "ML": "-1.250",
+    "Dv": "0.5",
+    "Yaw": 0,
+    "Pitch": 45.0,
+    "Roll": "0.000",
+    "ReferenceAtlasName": "allen_mouse_25um",
+    "RefAP": "5.400",
+}
+
+
+def test_insertion_strings_and_aliases():
+    (insertion,) = parse_insertions([RECORD])
+    assert insertion == Insertion(2.0, -1.25, 0.5, 0.0, 45.0, 0.0, "allen_mouse_25um", ref_ap=5.4)
+    assert type(insertion.yaw) is float
+
+
+def test_insertion_json_round_trip():
+    insertions = parse_insertions([RECORD, {**RECORD, "AP": "-3.1", "ProbeName": "NP2"}])
+    assert parse_insertions([insertion.to_json() for insertion in insertions]) == insertions
+
+
+def test_accepts_numpy_scalars():
+    table = InsertionTable.from_insertions(parse_insertions([RECORD, {**RECORD, "AP": "1.5"}]))
+    names = ("AP", "ML", "DV", "Yaw", "Pitch", "Roll", "RefAP", "RefML", "RefDV")
+    records = [
+        {**{name: table.values[row, i] for row, name in enumerate(names)}, "AtlasName": np.str_("allen_mouse_25um")}
+        for i in range(len(table))
+    ]
+    assert isinstance(records[0]["AP"], np.float64)
+    assert parse_insertions(records) == table.insertions()
+    metadata = parse_metadata({"name": "NP1", "type": np.int64(1), "channels": np.int32(960)})
+    assert metadata.channels == 960 and type(metadata.channels) is int
+
+
+@pytest.mark.parametrize("value", [True, np.bool_(True), None, [1.0], "2.0mm", float("nan")])
+def test_rejects_non_numbers(value):
+    with pytest.raises(SchemaError, match="'AP'"):
+        parse_insertions([{**RECORD, "AP": value}])
+
+
+def test_errors_name_record_and_field():
+    with pytest.raises(SchemaError, match="record 1: missing required field 'ML'"):
+        parse_insertions([RECORD, {k: v for k, v in RECORD.items() if k != "ML"}])
+    with pytest.raises(SchemaError, match="unknown fields"):
+        parse_insertions([{**RECORD, "Depth": 1}])
+    with pytest.raises(SchemaError, match="must be an integer"):
+        parse_metadata({"name": "NP1", "type": 1, "channels": "960.5"})
+
+
+def test_metadata_and_selection():
+    metadata = parse_metadata(
+        {"name": "NP1", "type": "1", "producer": "imec", "channels": "960", "hardware-files": ["holder"]}
+    )
+    assert (metadata.channels, metadata.shanks, metadata.hardware_files) == (960, 1, ("holder",))
+    with pytest.raises(SchemaError):
+        parse_metadata({"name": "NP1", "type": 1, "channels": 960, "shanks": 2, "reference-shank": 2})
+    assert parse_selection({"channels": 384, "block-size": "32"}).block_size == 32
+
+
+def test_transform_round_trip():
+    transform = get_transform("Qiu2018")
+    assert parse_transform(transform.to_json()) == transform
+    with pytest.raises(SchemaError):
+        parse_transform({**transform.to_json(), "SignX": 2})
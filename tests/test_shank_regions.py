@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from probe_library.atlas import AtlasLookup
+from probe_library.channel_map import from_columns
+from probe_library.shank_regions import _voxel_crossings, label_channels, shank_profile
+from probe_library.transforms import apply_matrix, insertion_matrices
+
+STRUCTURES = [{"id": i, "acronym": f"r{i}", "rgb_triplet": [i, i, i]} for i in range(1, 6)]
+
+
+def _lookup(seed=0):
+    # Random blocks of 3 voxels, so shanks cross many boundaries.
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 6, size=(12, 12, 12))
+    annotation = np.repeat(np.repeat(np.repeat(blocks, 3, 0), 3, 1), 3, 2).astype(np.uint32)
+    return AtlasLookup(annotation, STRUCTURES, 25, reference=(0.45, 0.45, 0.45))
+
+
+def _shanks(n_shanks, per_shank=60):
+    # One column of sites per shank, so each site lies on its shank's axis.
+    shank = np.repeat(np.arange(n_shanks), per_shank)
+    rows = np.column_stack([
+        np.arange(len(shank)),
+        250.0 * shank,
+        np.tile(np.arange(per_shank) * 13.7, n_shanks),
+        np.zeros(len(shank)),
+        np.full(len(shank), 12.0),
+        np.full(len(shank), 12.0),
+        np.zeros(len(shank)),
+    ])
+    return from_columns(rows, ["index", "x", "y", "z", "w", "h", "d"])
+
+
+def test_voxel_crossings():
+    t = _voxel_crossings(np.array([0.2, 0.0, 0.0]), np.array([2.2, 1.0, 0.0]))
+    np.testing.assert_allclose(t, [0, 0.15, 0.5, 0.65, 1])
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("n_shanks", [1, 4])
+def test_labels_match_site_lookup(seed, n_shanks):
+    lookup = _lookup(seed)
+    channel_map = _shanks(n_shanks)
+    rng = np.random.default_rng(seed)
+    insertion = rng.uniform(-0.2, 0.2, 3).tolist() + rng.uniform(-40, 40, 3).tolist()
+    expected = lookup.labels(apply_matrix(insertion_matrices(*insertion), channel_map.position))
+    np.testing.assert_array_equal(label_channels(lookup, channel_map, n_shanks, *insertion), expected)
+
+
+def test_profile_outside_volume():
+    lookup = _lookup()
+    matrix = lookup.voxel_transform() @ insertion_matrices(5.0, 0, 0, 0, 0, 0)
+    profile = shank_profile(lookup, matrix, 0.0, 1000.0)
+    assert profile.starts.tolist() == [0.0] and profile.ids.tolist() == [0]
+    assert profile.ids_at(np.array([-5.0, 500.0, 2000.0])).tolist() == [0, 0, 0]
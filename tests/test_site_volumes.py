@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from probe_library.atlas import AtlasLookup
+from probe_library.channel_map import from_columns
+from probe_library.site_volumes import site_region_fractions
+from probe_library.transforms import apply_matrix, insertion_matrices
+
+STRUCTURES = [{"id": i * 10, "acronym": f"r{i}", "rgb_triplet": [i, i, i]} for i in range(1, 5)]
+
+
+def _lookup(seed=0):
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 5, size=(8, 8, 8)) * 10
+    annotation = np.repeat(np.repeat(np.repeat(blocks, 2, 0), 2, 1), 2, 2).astype(np.uint32)
+    return AtlasLookup(annotation, STRUCTURES, 25, reference=(0.2, 0.2, 0.2))
+
+
+def _channel_map(n, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.column_stack([
+        np.arange(n),
+        rng.uniform(-40, 40, n),
+        rng.uniform(0, 300, n),
+        rng.uniform(-10, 10, n),
+        rng.uniform(5, 60, n),
+        rng.uniform(5, 60, n),
+        rng.uniform(0, 30, n),
+    ])
+    return from_columns(rows, ["index", "x", "y", "z", "w", "h", "d"])
+
+
+def _reference(lookup, matrices, channel_maps, samples):
+    """Dense (n_sites, n_labels) fractions, one site at a time."""
+    axes = [(np.arange(samples) + 0.5) / samples - 0.5] * 3
+    offsets = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+    rows = []
+    for matrix, channel_map in zip(matrices, channel_maps):
+        for center, size in zip(channel_map.position, channel_map.size):
+            labels = lookup.labels(apply_matrix(matrix, center + offsets * size))
+            rows.append(np.bincount(labels, minlength=len(lookup.structure_ids)) / len(offsets))
+    return np.array(rows)
+
+
+@pytest.mark.parametrize("samples", [1, 3])
+def test_fractions_match_per_site_loop(samples):
+    lookup = _lookup()
+    rng = np.random.default_rng(1)
+    matrices = insertion_matrices(*rng.uniform(-0.1, 0.1, (3, 3)).T, *rng.uniform(-30, 30, (3, 3)).T)
+    channel_maps = [_channel_map(n, seed) for seed, n in enumerate([40, 0, 25])]
+    fractions = site_region_fractions(lookup, matrices, channel_maps, samples=samples)
+    assert len(fractions) == 65 and fractions.probe_starts.tolist() == [0, 40, 40, 65]
+
+    dense = np.zeros((len(fractions), fractions.n_labels))
+    row = np.repeat(np.arange(len(fractions)), np.diff(fractions.indptr))
+    dense[row, fractions.labels] = fractions.fractions
+    np.testing.assert_allclose(dense, _reference(lookup, matrices, channel_maps, samples), atol=1e-6)
+    np.testing.assert_allclose(dense.sum(axis=1), 1, atol=1e-6)
+    np.testing.assert_allclose(fractions.to_scipy().toarray(), dense)
+
+    # Largest share, lowest label on ties.
+    largest = dense >= dense.max(axis=1, keepdims=True) - 1e-6
+    np.testing.assert_array_equal(fractions.majority(), np.argmax(largest, axis=1))
+    assert [len(part) for part in fractions.per_probe(fractions.majority())] == [40, 0, 25]
+
+
+def test_shared_channel_map_and_errors():
+    lookup = _lookup()
+    matrices = insertion_matrices([0.0, 0.05], 0, 0, 0, 0, 0)
+    channel_map = _channel_map(10)
+    shared = site_region_fractions(lookup, matrices, channel_map)
+    separate = site_region_fractions(lookup, matrices, [channel_map, channel_map])
+    np.testing.assert_array_equal(shared.labels, separate.labels)
+    with pytest.raises(ValueError, match="channel maps for"):
+        site_region_fractions(lookup, matrices, [channel_map])
+    with pytest.raises(ValueError, match="at least 1"):
+        site_region_fractions(lookup, matrices, channel_map, samples=(2, 0, 2))
+    empty = site_region_fractions(lookup, matrices[:0], [])
+    assert len(empty) == 0 and empty.majority().tolist() == []
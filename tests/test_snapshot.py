@@ -0,0 +1,94 @@
+import json
+
+import numpy as np
+import pytest
+
+from probe_library.atlas_transform import get_transform
+from probe_library.scene import Scene
+from probe_library.snapshot import (
+    FLOAT,
+    INTEGER,
+    NULL,
+    QUOTED,
+    SceneSnapshot,
+    load_snapshot,
+    save_snapshot,
+)
+
+
+def _probe(**fields):
+    probe = {
+        "AP": "2.000",
+        "ML": "-1.250",
+        "DV": "0.000",
+        "Yaw": "0.000",
+        "Pitch": "45.000",
+        "Roll": "0.000",
+        "RefAP": "5.400",
+        "RefML": "5.700",
+        "RefDV": "0.330",
+        "AtlasName": "allen_mouse_25um",
+        "TransformName": "qiu2018",
+        "ProbeName": "NP1",
+    }
+    probe.update(fields)
+    return {key: value for key, value in probe.items() if value is not ...}
+
+
+@pytest.fixture
+def scene():
+    return {
+        "AtlasName": "allen_mouse_25um",
+        "AtlasTransform": json.dumps(get_transform("Qiu2018").to_json()),
+        "Data": [
+            {"settings": '{"showLabels": true}'},
+            {"type": "probes", **_probe()},
+            {"type": "probes", **_probe(AP=2.243, ML=-90, DV=None, Yaw="1e-5", color="#FF0000")},
+            {"probes": _probe(Roll=..., ProbeName="NP2")},
+            {"probes": json.dumps(_probe(AP="3.5"), separators=(",", ":"))},
+            {"probes": json.dumps(_probe(AP="3.5")).replace(", ", ",  ")},
+            {"notes": ["a", "b"]},
+            {"type": "probes", **_probe(AP=True, DV=1 << 60, AtlasName=None)},
+        ],
+    }
+
+
+def test_json_round_trip(scene):
+    snapshot = SceneSnapshot.from_json(scene)
+    assert len(snapshot) == 5
+    assert snapshot.to_json() == scene
+
+
+def test_field_formats(scene):
+    snapshot = SceneSnapshot.from_json(scene)
+    assert snapshot.formats[:3, 1].tolist() == [FLOAT, INTEGER, NULL]
+    assert snapshot.formats[0, 0] == QUOTED + 3
+    assert snapshot.probe(1)["AP"] == 2.243
+    assert snapshot.probe(1)["ML"] == -90 and isinstance(snapshot.probe(1)["ML"], int)
+    assert snapshot.probe(1)["DV"] is None
+    # Values without a format code stay exact as JSON text.
+    assert json.loads(snapshot.extras[1]) == {"Yaw": "1e-5", "color": "#FF0000"}
+    assert np.isnan(snapshot.insertions[2, 1])
+
+
+def test_save_load_round_trip(scene, tmp_path):
+    path = tmp_path / "scene.scene"
+    snapshot = SceneSnapshot.from_json(scene)
+    save_snapshot(path, snapshot)
+    loaded = load_snapshot(path)
+    assert loaded.transform == snapshot.transform
+    np.testing.assert_array_equal(loaded.insertions, snapshot.insertions)
+    assert loaded.to_json() == scene
+
+
+def test_from_scene_keeps_entry_order(scene):
+    snapshot = SceneSnapshot.from_scene(Scene.loads(json.dumps(scene)))
+    types = [entry.get("type") or next(iter(entry)) for entry in snapshot.to_json()["Data"]]
+    assert types == ["settings", "probes", "probes", "probes", "probes", "probes", "notes", "probes"]
+    assert snapshot.probe(1) == SceneSnapshot.from_json(scene).probe(1)
+
+
+def test_empty_scene(tmp_path):
+    snapshot = SceneSnapshot.from_json({"AtlasName": "", "AtlasTransform": "", "Data": []})
+    save_snapshot(tmp_path / "empty.scene", snapshot)
+    assert load_snapshot(tmp_path / "empty.scene").to_json() == {"AtlasName": "", "AtlasTransform": "", "Data": []}
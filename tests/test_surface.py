@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from probe_library.atlas import AtlasLookup
+from probe_library.surface import BrainSurface
+from probe_library.transforms import insertion_rotation
+
+pytest.importorskip("scipy")
+
+STRUCTURES = [{"id": 997, "acronym": "root", "rgb_triplet": [255, 255, 255]}]
+RESOLUTION_MM = 0.025
+CENTER_MM = np.array([0.6, 0.6, 0.6])
+RADIUS_MM = 0.4
+
+
+def _lookup():
+    # A ball of brain in the middle of a 49^3 volume; reference at its center.
+    grid = np.indices((49, 49, 49)) * RESOLUTION_MM
+    annotation = (np.linalg.norm(grid - CENTER_MM[:, None, None, None], axis=0) <= RADIUS_MM) * 997
+    return AtlasLookup(annotation.astype(np.uint32), STRUCTURES, 25, reference=CENTER_MM, name="ball_25um")
+
+
+def test_distance_to_ball(tmp_path):
+    surface = BrainSurface.load(_lookup(), tmp_path)
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-0.55, 0.55, (200, 3))
+    expected = np.linalg.norm(points, axis=1) - RADIUS_MM
+    np.testing.assert_allclose(surface.distance(points), expected, atol=RESOLUTION_MM)
+
+
+def test_entry_points_match_ray_ball_intersection(tmp_path):
+    lookup = _lookup()
+    surface = BrainSurface.load(lookup, tmp_path)
+    rng = np.random.default_rng(1)
+    n = 50
+    tips = rng.uniform(-0.2, 0.2, (n, 3))
+    yaw, pitch, roll = rng.uniform(-60, 60, (3, n))
+    entry, depth = surface.entry_points(*tips.T, yaw, pitch, roll)
+
+    # tip + s * up meets the sphere at the larger root of |tip + s * up| = R.
+    up = insertion_rotation(yaw, pitch, roll)[:, :, 1]
+    b = np.sum(tips * up, axis=1)
+    expected = -b + np.sqrt(b**2 - np.sum(tips**2, axis=1) + RADIUS_MM**2)
+    np.testing.assert_allclose(depth, expected, atol=RESOLUTION_MM)
+    np.testing.assert_allclose(entry, tips + depth[:, None] * up)
+
+
+def test_missed_insertions_give_nan(tmp_path):
+    surface = BrainSurface.load(_lookup(), tmp_path)
+    # Tips outside the ball, with the axis pointing away from it.
+    entry, depth = surface.entry_points([0.0, 0.0], [0.5, 0.0], [0.0, 2.0], 0, 0, 0)
+    assert np.isnan(depth[1]) and np.isnan(entry[1]).all()
+
+
+def test_cache_is_reused(tmp_path):
+    lookup = _lookup()
+    first = BrainSurface.load(lookup, tmp_path)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["ball_25um_sdf.npy"]
+    second = BrainSurface.load(lookup, tmp_path)
+    assert isinstance(second.sdf, np.memmap)
+    np.testing.assert_array_equal(first.sdf, second.sdf)
+    lookup.name = ""
+    with pytest.raises(ValueError, match="needs a name"):
+        BrainSurface.load(lookup, tmp_path)
@@ -0,0 +1,65 @@
+import numpy as np
+
+from probe_library.atlas_transform import QIU2018
+from probe_library.insertion_table import InsertionTable
+from probe_library.schema import parse_insertions
+from probe_library.transforms import apply_matrix, channel_positions, insertion_matrices
+
+SITES = np.array([[0.0, 0.0, 0.0], [0.0, 1000.0, 0.0], [32.0, 20.0, 0.0], [0.0, 0.0, 10.0]])
+
+
+def _insertions(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        rng.uniform(-3, 3, n),
+        rng.uniform(-3, 3, n),
+        rng.uniform(-4, 0, n),
+        rng.uniform(-180, 180, n),
+        rng.uniform(0, 90, n),
+        rng.uniform(-180, 180, n),
+    ]
+
+
+def test_zero_angles_axes():
+    # x -> +ML, y -> +DV, z -> +AP, in mm.
+    positions = channel_positions(1.0, 2.0, -3.0, 0, 0, 0, SITES)
+    np.testing.assert_allclose(
+        positions, [[1.0, 2.0, -3.0], [1.0, 2.0, -2.0], [1.0, 2.032, -2.98], [1.01, 2.0, -3.0]], atol=1e-6
+    )
+
+
+def test_batched_matches_per_insertion():
+    parameters = _insertions()
+    positions = channel_positions(*parameters, SITES)
+    for i, row in enumerate(zip(*parameters)):
+        np.testing.assert_allclose(positions[i], apply_matrix(insertion_matrices(*row), SITES), atol=1e-5)
+
+
+def test_reference_offset_and_transform_give_world_coordinates():
+    ap, ml, dv, yaw, pitch, roll = _insertions(n=20)
+    reference = (5.4, 5.7, 0.33)
+    records = [
+        {
+            "AP": a, "ML": m, "DV": d, "Yaw": y, "Pitch": p, "Roll": r, "AtlasName": "CCF",
+            "TransformName": "Qiu2018", "RefAP": reference[0], "RefML": reference[1], "RefDV": reference[2],
+        }
+        for a, m, d, y, p, r in zip(ap, ml, dv, yaw, pitch, roll)
+    ]
+    world = InsertionTable.from_insertions(parse_insertions(records)).world_matrices()
+    positions = channel_positions(ap, ml, dv, yaw, pitch, roll, SITES, None, *reference, transform=QIU2018)
+    for i in range(len(ap)):
+        np.testing.assert_allclose(positions[i], apply_matrix(world[i], SITES), atol=1e-5)
+
+    relative = channel_positions(ap, ml, dv, yaw, pitch, roll, SITES)
+    shifted = channel_positions(
+        ap, ml, dv, yaw, pitch, roll, SITES, ref_ap=reference[0], ref_ml=reference[1], ref_dv=reference[2]
+    )
+    np.testing.assert_allclose(shifted - relative, np.broadcast_to(reference, shifted.shape), atol=1e-5)
+
+
+def test_out_buffer():
+    parameters = _insertions(n=5)
+    out = np.empty((5, len(SITES), 3), dtype=np.float32)
+    result = channel_positions(*parameters, SITES, out=out)
+    assert result is out
+    np.testing.assert_allclose(out, channel_positions(*parameters, SITES))